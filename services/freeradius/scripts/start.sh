@@ -28,6 +28,12 @@ sed -i "s/radius_db = .*/radius_db = \"$DB_NAME\"/" /etc/freeradius/3.0/mods-ava
 # Enable SQL module
 ln -sf /etc/freeradius/3.0/mods-available/sql /etc/freeradius/3.0/mods-enabled/sql
 
+# Redis module for the accounting stream (used when ACCOUNTING_SOURCE=stream)
+sed -i "s/server = .*/server = \"${REDIS_HOST:-redis}\"/" /etc/freeradius/3.0/mods-available/redis
+sed -i "s/port = .*/port = ${REDIS_PORT:-6379}/" /etc/freeradius/3.0/mods-available/redis
+ln -sf /etc/freeradius/3.0/mods-available/redis /etc/freeradius/3.0/mods-enabled/redis
+export ACCOUNTING_SOURCE="${ACCOUNTING_SOURCE:-radacct}"
+
 # Enable CoA site
 ln -sf /etc/freeradius/3.0/sites-available/coa /etc/freeradius/3.0/sites-enabled/coa
 
@@ -0,0 +1,341 @@
+"""
+HaroonNet ISP Platform - Accounting Stream Ingestion
+Applies FreeRADIUS accounting events from a Redis Stream to hourly usage
+buckets and subscription quotas in batches
+
+With ACCOUNTING_SOURCE=stream, FreeRADIUS adds one stream entry per
+Accounting-Request (see services/freeradius/config/sites-available/default)
+instead of the worker polling radacct. Accounting counters are cumulative per
+session. The consumer therefore keeps each open session's last counters in
+Redis and applies only the difference. A Stop leaves the final counters
+behind as a short-lived tombstone, so a retransmitted Stop or a late
+Interim-Update for that session adds nothing. Deltas are summed per
+subscription and hour into usage_hourly (app/usage_buckets.py) in one
+transaction, and update_usage_aggregates rolls the daily usage_aggregates up
+from it. After the commit, the new session counters are saved and the batch's
+entries acknowledged in one Redis transaction.
+Entries of a failed batch stay pending in the consumer group and are read
+first on the next run. The batch's last entry id is committed with its
+usage (accounting_checkpoints), so after a crash between the commit and the
+acknowledgement the replayed entries only rebuild their session counters.
+Create the table with:
+    python -m app.accounting --print-ddl
+"""
+
+import argparse
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import redis
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.usage_buckets import hour_number
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'haroonnet:accounting:session:{session_id}'
+CHECKPOINT_TABLE_DDL = """
+CREATE TABLE accounting_checkpoints (
+    stream VARCHAR(64) NOT NULL,
+    consumer_group VARCHAR(64) NOT NULL,
+    last_entry_id VARCHAR(32) NOT NULL,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (stream, consumer_group)
+)
+"""
+
+QUOTA_ACTION_KEY = 'haroonnet:quota:{action}:{subscription_id}:{month}'
+QUOTA_ACTION_TTL = 32 * 86400  # Cleanup only; the month in the key starts a new quota cycle
+
+# (username, hour number) -> [input octets, output octets, session time, closed sessions]
+UsageDeltas = Dict[Tuple[str, int], List[int]]
+# Session id -> (input octets, output octets, session time, stopped)
+SessionCounters = Dict[str, Tuple[int, int, int, bool]]
+
+_redis_client = None
+
+
+def get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.redis_url)
+    return _redis_client
+
+
+@dataclass
+class AccountingEvent:
+    """One Accounting-Request as published by FreeRADIUS"""
+    entry_id: str
+    status: str
+    username: str
+    session_id: str
+    input_octets: int
+    output_octets: int
+    session_time: int
+    event_time: datetime
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else (value or '')
+
+
+def entry_key(entry_id: str) -> Tuple[int, int]:
+    """Sort key of a stream entry id ('<ms>-<seq>')"""
+    ms, _, seq = entry_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+def parse_event(entry_id, fields: Dict) -> Optional[AccountingEvent]:
+    """Decode a stream entry; None if it is not a usable accounting event"""
+    fields = {_text(key): _text(value) for key, value in (fields or {}).items()}
+    try:
+        status = fields['status']
+        if status in ('Accounting-On', 'Accounting-Off'):
+            # NAS reboots carry no session counters
+            username = session_id = ''
+        else:
+            username, session_id = fields['username'], fields['session_id']
+            if not username or not session_id:
+                return None
+        return AccountingEvent(
+            entry_id=_text(entry_id),
+            status=status,
+            username=username,
+            session_id=session_id,
+            input_octets=(int(fields.get('input_gigawords') or 0) << 32) + int(fields.get('input_octets') or 0),
+            output_octets=(int(fields.get('output_gigawords') or 0) << 32) + int(fields.get('output_octets') or 0),
+            session_time=int(fields.get('session_time') or 0),
+            event_time=datetime.fromtimestamp(int(fields['event_time'])),
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+def compute_deltas(events: Iterable[AccountingEvent], counters: SessionCounters,
+                   applied: str = None) -> Tuple[UsageDeltas, SessionCounters]:
+    """Usage deltas per (username, hour) and each session's new counters
+
+    counters holds the last applied counters of the sessions in events (absent
+    for unknown sessions). Deltas go to the hour of the event, so a long
+    session adds to every hour it sent interim updates in. A counter lower
+    than the last one (NAS restart, counter wrap) is taken as counted from zero.
+    Events for a stopped session (duplicate Stop, late Interim-Update) add
+    nothing. Events at or before the applied entry id were committed by an
+    unacknowledged batch: they move the session counters on but add no usage.
+    """
+    applied_key = entry_key(applied) if applied else None
+    usage: UsageDeltas = {}
+    updated: SessionCounters = {}
+
+    for event in events:
+        if not event.session_id:
+            continue
+        last = updated.get(event.session_id) or counters.get(event.session_id)
+        if last and last[3]:
+            continue
+        current = (event.input_octets, event.output_octets, event.session_time)
+        last = last or (0, 0, 0, False)
+        delta = [now - before if now >= before else now for now, before in zip(current, last)]
+        stopped = event.status == 'Stop'
+        updated[event.session_id] = current + (stopped,)
+        if applied_key and entry_key(event.entry_id) <= applied_key:
+            continue
+
+        sums = usage.setdefault((event.username, hour_number(event.event_time)), [0, 0, 0, 0])
+        for index, value in enumerate(delta):
+            sums[index] += value
+        if stopped:
+            sums[3] += 1
+
+    return usage, updated
+
+
+def quota_crossings(before: int, added: int, quota: Optional[int]) -> List[str]:
+    """Quota thresholds ('warning', 'exceeded') a subscription passed by using added octets"""
+    if not quota or added <= 0:
+        return []
+    crossed = []
+    for name, threshold in (('warning', settings.QUOTA_WARNING_THRESHOLD), ('exceeded', 1.0)):
+        if before < quota * threshold <= before + added:
+            crossed.append(name)
+    return crossed
+
+
+def _quota_action_key(subscription_id: int, action: str, today: Optional[date]) -> str:
+    month = (today or datetime.now().date()).strftime('%Y%m')
+    return QUOTA_ACTION_KEY.format(action=action, subscription_id=subscription_id, month=month)
+
+
+def claim_quota_action(subscription_id: int, action: str, client: redis.Redis = None,
+                       today: date = None) -> bool:
+    """Claim a subscription's quota action for this quota month; False if it was already taken
+
+    Quota checks run from the half-hourly scan and after every crossing, so
+    each warning, FUP or suspension is claimed before it is sent.
+    """
+    key = _quota_action_key(subscription_id, action, today)
+    return bool((client or get_redis()).set(key, 1, nx=True, ex=QUOTA_ACTION_TTL))
+
+
+def release_quota_action(subscription_id: int, action: str, client: redis.Redis = None,
+                         today: date = None):
+    """Give back a claim whose action failed, so the next check retries it"""
+    (client or get_redis()).delete(_quota_action_key(subscription_id, action, today))
+
+
+def apply_usage(db: Session, usage: UsageDeltas) -> Tuple[Dict[str, int], List[int]]:
+    """Add usage deltas to usage_hourly and used_quota (in the caller's transaction)
+
+    Returns the stats and the ids of the subscriptions that crossed a quota
+    threshold.
+    """
+    usernames = sorted({username for username, _ in usage})
+    stats = {'usage_rows': 0, 'subscriptions': 0, 'unknown_users': 0, 'quota_crossings': 0}
+    crossed: List[int] = []
+    if not usernames:
+        return stats, crossed
+
+    subscription_query = f"""
+    SELECT id, customer_id, username, monthly_quota, used_quota
+    FROM subscriptions
+    WHERE username IN ({', '.join(['%s'] * len(usernames))})
+    """
+    subscriptions = {row.username: row for row in db.execute(subscription_query, tuple(usernames)).fetchall()}
+
+    upsert_query = """
+    INSERT INTO usage_hourly (
+        hour, subscription_id, input_octets, output_octets,
+        session_time, session_count
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        input_octets = input_octets + VALUES(input_octets),
+        output_octets = output_octets + VALUES(output_octets),
+        session_time = session_time + VALUES(session_time),
+        session_count = session_count + VALUES(session_count)
+    """
+
+    added: Dict[str, int] = {}
+    # Hour-first, like the table's key
+    for (username, hour), (input_octets, output_octets, session_time, session_count) in sorted(
+            usage.items(), key=lambda item: (item[0][1], item[0][0])):
+        subscription = subscriptions.get(username)
+        if not subscription:
+            logger.warning(f"No subscription found for username: {username}")
+            stats['unknown_users'] += 1
+            continue
+        if not (input_octets or output_octets or session_time or session_count):
+            continue
+
+        db.execute(upsert_query, (hour, subscription.id, input_octets, output_octets, session_time, session_count))
+        stats['usage_rows'] += 1
+        added[username] = added.get(username, 0) + input_octets + output_octets
+
+    quota_query = """
+    UPDATE subscriptions
+    SET used_quota = COALESCE(used_quota, 0) + %s
+    WHERE id = %s
+    """
+    for username, octets in added.items():
+        subscription = subscriptions[username]
+        if not octets:
+            continue
+        db.execute(quota_query, (octets, subscription.id))
+        stats['subscriptions'] += 1
+        if quota_crossings(subscription.used_quota or 0, octets, subscription.monthly_quota):
+            stats['quota_crossings'] += 1
+            crossed.append(subscription.id)
+
+    return stats, crossed
+
+
+class AccountingStream:
+    """Consumer group reader with per-session counters and batch acknowledgement"""
+
+    def __init__(self, client: redis.Redis = None, stream: str = None, group: str = None,
+                 consumer: str = None):
+        self.client = client or get_redis()
+        self.stream = stream or settings.ACCOUNTING_STREAM
+        self.group = group or settings.ACCOUNTING_GROUP
+        self.consumer = consumer or settings.ACCOUNTING_CONSUMER
+        # Entries delivered to this consumer but never acknowledged are read first
+        self.pending = True
+
+    def ensure_group(self):
+        try:
+            self.client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read(self, count: int, block_ms: int) -> List[Tuple[str, Dict]]:
+        """Next batch of (entry id, fields): pending entries, then new ones"""
+        if self.pending:
+            entries = self._read('0', count, None)
+            if entries:
+                return entries
+            self.pending = False
+        return self._read('>', count, block_ms)
+
+    def _read(self, start: str, count: int, block_ms: Optional[int]) -> List[Tuple[str, Dict]]:
+        response = self.client.xreadgroup(self.group, self.consumer, {self.stream: start},
+                                          count=count, block=block_ms)
+        return [(_text(entry_id), fields) for _, entries in response or [] for entry_id, fields in entries]
+
+    def last_applied(self, db: Session) -> Optional[str]:
+        """Id of the last entry whose usage was committed"""
+        query = """
+        SELECT last_entry_id
+        FROM accounting_checkpoints
+        WHERE stream = %s AND consumer_group = %s
+        """
+        row = db.execute(query, (self.stream, self.group)).fetchone()
+        return row.last_entry_id if row else None
+
+    def record_applied(self, db: Session, entry_id: str):
+        """Record a batch's last entry id in the transaction applying its usage"""
+        query = """
+        INSERT INTO accounting_checkpoints (stream, consumer_group, last_entry_id, updated_at)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            last_entry_id = VALUES(last_entry_id),
+            updated_at = VALUES(updated_at)
+        """
+        db.execute(query, (self.stream, self.group, entry_id, datetime.now()))
+
+    def load_counters(self, session_ids: Iterable[str]) -> SessionCounters:
+        session_ids = sorted(set(session_ids))
+        if not session_ids:
+            return {}
+        values = self.client.mget([SESSION_KEY.format(session_id=session_id) for session_id in session_ids])
+        counters: SessionCounters = {}
+        for session_id, value in zip(session_ids, values):
+            if value is None:
+                continue
+            parts = [int(part) for part in _text(value).split(',')]
+            counters[session_id] = (parts[0], parts[1], parts[2], len(parts) > 3 and bool(parts[3]))
+        return counters
+
+    def acknowledge(self, entry_ids: List[str], counters: SessionCounters):
+        """Save the batch's session counters and acknowledge its entries atomically"""
+        pipe = self.client.pipeline(transaction=True)
+        for session_id, (input_octets, output_octets, session_time, stopped) in counters.items():
+            ttl = settings.ACCOUNTING_STOPPED_TTL if stopped else settings.ACCOUNTING_SESSION_TTL
+            pipe.set(SESSION_KEY.format(session_id=session_id),
+                     f"{input_octets},{output_octets},{session_time},{int(stopped)}", ex=ttl)
+        if entry_ids:
+            pipe.xack(self.stream, self.group, *entry_ids)
+        pipe.execute()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accounting stream checkpoint table')
+    parser.add_argument('--print-ddl', action='store_true', help='Print CREATE TABLE DDL')
+    args = parser.parse_args()
+
+    if args.print_ddl:
+        print(f"{CHECKPOINT_TABLE_DDL.strip()};")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+HaroonNet ISP Platform - Columnar Analytics
+In-worker analytics stage for monthly plan and usage analysis
+"""
+
+from datetime import date
+from typing import Dict, List, Any, Optional
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Rows pulled per round trip when streaming fact tables into column arrays
+FETCH_CHUNK_SIZE = 50000
+
+USAGE_PERCENTILES = (50, 95, 99)
+
+USAGE_COLUMNS = {
+    'subscription_id': np.int64,
+    'customer_id': np.int64,
+    'total_octets': np.int64,
+    'session_time': np.int64,
+}
+
+SUBSCRIPTION_COLUMNS = {
+    'subscription_id': np.int64,
+    'customer_id': np.int64,
+    'plan_id': np.int64,
+    'username': object,
+    'is_active': np.bool_,
+}
+
+PLAN_COLUMNS = {
+    'plan_id': np.int64,
+    'plan_name': object,
+    'monthly_fee': np.float64,
+}
+
+
+def fetch_columns(db: Session, query: str, params: tuple, columns: Dict[str, Any],
+                  chunk_size: int = FETCH_CHUNK_SIZE) -> pd.DataFrame:
+    """Stream a query result into typed column arrays
+
+    Rows are fetched in chunks and converted column by column, so the full
+    result is never held as a list of Python row objects.
+    """
+    result = db.execute(query, params)
+    names = list(columns)
+    chunks = {name: [] for name in names}
+
+    while True:
+        rows = result.fetchmany(chunk_size)
+        if not rows:
+            break
+
+        for index, name in enumerate(names):
+            values = [row[index] for row in rows]
+            dtype = columns[name]
+            if dtype is object:
+                chunks[name].append(np.array(values, dtype=object))
+            else:
+                # NULL sums from the database arrive as None
+                chunks[name].append(np.array([value or 0 for value in values], dtype=dtype))
+
+    data = {
+        name: np.concatenate(parts) if parts else np.empty(0, dtype=columns[name])
+        for name, parts in chunks.items()
+    }
+    return pd.DataFrame(data)
+
+
+def load_usage(db: Session, start_date: date, end_date: date) -> pd.DataFrame:
+    """Load the period's usage aggregates as a columnar frame"""
+    query = """
+    SELECT subscription_id, customer_id, total_octets, session_time
+    FROM usage_aggregates
+    WHERE date BETWEEN %s AND %s
+    """
+    return fetch_columns(db, query, (start_date, end_date), USAGE_COLUMNS)
+
+
+def load_subscriptions(db: Session) -> pd.DataFrame:
+    """Load the subscription dimension table"""
+    query = """
+    SELECT id as subscription_id, customer_id, plan_id, username,
+           status = 'active' as is_active
+    FROM subscriptions
+    """
+    return fetch_columns(db, query, (), SUBSCRIPTION_COLUMNS)
+
+
+def load_plans(db: Session) -> pd.DataFrame:
+    """Load the service plan dimension table"""
+    query = """
+    SELECT id as plan_id, name as plan_name, monthly_fee
+    FROM service_plans
+    """
+    return fetch_columns(db, query, (), PLAN_COLUMNS)
+
+
+def analyze_plans(usage: pd.DataFrame, subscriptions: pd.DataFrame, plans: pd.DataFrame,
+                  top_n: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """Compute per-plan revenue, usage percentiles and top users
+
+    Usage is first reduced to one row per subscription, so revenue is summed
+    over subscriptions rather than over the daily usage fan-out.
+    """
+    per_subscription = usage.groupby('subscription_id', sort=False).agg(
+        total_octets=('total_octets', 'sum'),
+        session_time=('session_time', 'sum'),
+    )
+
+    subs = subscriptions.merge(plans, on='plan_id', how='inner')
+    subs = subs.join(per_subscription, on='subscription_id')
+    subs['has_usage'] = subs['total_octets'].notna()
+    subs['total_octets'] = subs['total_octets'].fillna(0).astype(np.int64)
+    subs['session_time'] = subs['session_time'].fillna(0).astype(np.int64)
+    subs['active_fee'] = np.where(subs['is_active'], subs['monthly_fee'], 0.0)
+
+    by_plan = subs.groupby('plan_id', sort=False).agg(
+        total_subscribers=('subscription_id', 'size'),
+        active_subscribers=('is_active', 'sum'),
+        monthly_revenue=('active_fee', 'sum'),
+        total_usage=('total_octets', 'sum'),
+    )
+
+    users = subs[subs['has_usage']]
+    usage_by_plan = users.groupby('plan_id', sort=False)['total_octets']
+    by_plan['avg_usage_per_user'] = usage_by_plan.mean()
+    for pct in USAGE_PERCENTILES:
+        by_plan[f'p{pct}_usage'] = usage_by_plan.quantile(pct / 100)
+
+    # Plans without subscribers still appear, as with the old LEFT JOIN
+    plan_analysis = plans.join(by_plan, on='plan_id')
+    plan_analysis = plan_analysis.fillna({
+        'total_subscribers': 0,
+        'active_subscribers': 0,
+        'monthly_revenue': 0.0,
+        'total_usage': 0,
+    })
+    plan_analysis = plan_analysis.astype({
+        'total_subscribers': np.int64,
+        'active_subscribers': np.int64,
+        'total_usage': np.int64,
+    })
+    plan_analysis = plan_analysis.sort_values('monthly_revenue', ascending=False, kind='stable')
+
+    top_users = users.nlargest(top_n, 'total_octets')[[
+        'subscription_id', 'customer_id', 'username', 'plan_name',
+        'total_octets', 'session_time',
+    ]]
+
+    return {
+        'plan_analysis': _to_records(plan_analysis.drop(columns=['plan_id'])),
+        'top_users': _to_records(top_users),
+    }
+
+
+def monthly_plan_analysis(db: Session, start_date: date, end_date: date,
+                          top_n: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """Run the columnar plan analysis for a reporting period"""
+    usage = load_usage(db, start_date, end_date)
+    subscriptions = load_subscriptions(db)
+    plans = load_plans(db)
+
+    logger.info(
+        f"Plan analysis: {len(usage)} usage rows, {len(subscriptions)} subscriptions, {len(plans)} plans"
+    )
+
+    return analyze_plans(usage, subscriptions, plans, top_n=top_n)
+
+
+def _to_records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a frame to JSON-friendly records"""
+    records = []
+    for row in frame.to_dict(orient='records'):
+        records.append({key: _to_python(value) for key, value in row.items()})
+    return records
+
+
+def _to_python(value) -> Optional[Any]:
+    """Convert NumPy scalars and NaN to plain Python values"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
@@ -0,0 +1,248 @@
+"""
+HaroonNet ISP Platform - Incremental RADIUS Archival
+Exports append-only accounting history as compressed id-range chunks
+
+Each run archives complete chunks first, then dumps the base: the mutable
+tables, the archived tables' schema and each archived table's tail past its
+last archived id (open sessions and recent rows). A base plus the chunks up to
+its tail restores the database as of that run.
+"""
+
+import json
+import os
+from dataclasses import replace
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+import logging
+from sqlalchemy.orm import Session
+from app.backup import BackupEngine, DumpResult, default_targets, file_extension
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+
+# Append-only tables archived by primary key range
+ARCHIVE_TABLES = {
+    'radacct': 'radacctid',
+    'radpostauth': 'id',
+}
+
+
+class ArchiveManifest:
+    """JSON manifest of base dumps and archived chunks"""
+
+    def __init__(self, path: str, data: Dict[str, Any] = None):
+        self.path = path
+        self.data = data or {
+            'database': settings.RADIUS_DB_NAME,
+            'tables': {table: {'key': key, 'last_id': 0, 'horizon': 0} for table, key in ARCHIVE_TABLES.items()},
+            'bases': [],
+            'chunks': [],
+        }
+
+    @classmethod
+    def load(cls, path: str) -> 'ArchiveManifest':
+        if os.path.exists(path):
+            with open(path) as f:
+                return cls(path, json.load(f))
+        return cls(path)
+
+    def save(self):
+        """Write the manifest atomically"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def last_id(self, table: str) -> int:
+        return self.data['tables'][table]['last_id']
+
+    def horizon(self, table: str) -> int:
+        """Highest id allocated when the previous run started"""
+        return self.data['tables'][table].get('horizon', 0)
+
+    def set_horizon(self, table: str, horizon: int):
+        self.data['tables'][table]['horizon'] = horizon
+
+    def add_chunk(self, table: str, first_id: int, last_id: int, dump: DumpResult):
+        self.data['chunks'].append({
+            'table': table,
+            'first_id': first_id,
+            'last_id': last_id,
+            'file': os.path.basename(dump.file_path),
+            'checksum': dump.checksum,
+            'raw_size': dump.raw_size,
+            'file_size': dump.file_size,
+            'created_at': datetime.now().isoformat(),
+        })
+        self.data['tables'][table]['last_id'] = last_id
+
+    def add_base(self, timestamp: str, dumps: List[DumpResult], after_ids: Dict[str, int]):
+        self.data['bases'].append({
+            'timestamp': timestamp,
+            # The base's tails hold each table's rows past these ids
+            'after_ids': after_ids,
+            'files': [
+                {'file': dump.file_path, 'checksum': dump.checksum, 'backup_type': dump.backup_type}
+                for dump in dumps
+            ],
+        })
+
+    def prune_missing_bases(self):
+        """Drop base entries whose files were removed by backup retention"""
+        self.data['bases'] = [
+            base for base in self.data['bases']
+            if all(os.path.exists(entry['file']) for entry in base['files'])
+        ]
+
+    def latest_base(self) -> Optional[Dict[str, Any]]:
+        bases = [
+            base for base in self.data['bases']
+            if all(os.path.exists(entry['file']) for entry in base['files'])
+        ]
+        return bases[-1] if bases else None
+
+    def chunks(self) -> List[Dict[str, Any]]:
+        """Archived chunks in replay order"""
+        return sorted(self.data['chunks'], key=lambda chunk: (chunk['table'], chunk['first_id']))
+
+
+class RadiusArchiver:
+    """Nightly RADIUS backup that dumps mutable tables in full and only
+    appends new radacct/radpostauth rows to the archive."""
+
+    def __init__(self, engine: BackupEngine = None, archive_dir: str = None, chunk_rows: int = None):
+        self.engine = engine or BackupEngine()
+        self.archive_dir = archive_dir or os.path.join(self.engine.backup_dir, 'archive')
+        self.chunk_rows = chunk_rows or settings.RADIUS_ARCHIVE_CHUNK_ROWS
+        self.manifest = ArchiveManifest.load(os.path.join(self.archive_dir, MANIFEST_NAME))
+        self.target = next(target for target in default_targets() if target.backup_type == 'radius')
+
+    def allocated_id(self, radius_db: Session, table: str) -> int:
+        key = ARCHIVE_TABLES[table]
+        result = radius_db.execute(f"SELECT MAX({key}) as max_id FROM {table}")
+        return result.fetchone().max_id or 0
+
+    def archive_upper_bound(self, radius_db: Session, table: str) -> int:
+        """Highest id safe to archive
+
+        Ids are only archived up to the previous run's horizon. An id allocated
+        by a transaction that had not committed then has committed (or rolled
+        back) since, so no row lands behind the archive. Open radacct rows still
+        receive Interim-Update and Stop writes, so the archive also stops below
+        the oldest open session. Sessions left open past
+        RADIUS_ARCHIVE_STALE_SESSION_DAYS are treated as closed.
+        """
+        upper = self.manifest.horizon(table)
+
+        if table == 'radacct':
+            stale_cutoff = datetime.now() - timedelta(days=settings.RADIUS_ARCHIVE_STALE_SESSION_DAYS)
+            open_query = """
+            SELECT MIN(radacctid) as first_open
+            FROM radacct
+            WHERE acctstoptime IS NULL
+            AND acctstarttime > %s
+            """
+            result = radius_db.execute(open_query, (stale_cutoff,))
+            first_open = result.fetchone().first_open
+            if first_open:
+                upper = min(upper, first_open - 1)
+
+        return upper
+
+    def dump_base(self, timestamp: str) -> List[DumpResult]:
+        """Full dump of the mutable tables, the archived tables' schema and
+        their rows past the last archived id"""
+        ignored = [f"--ignore-table={self.target.database}.{table}" for table in ARCHIVE_TABLES]
+        mutable = replace(
+            self.target,
+            backup_type='radius',
+            file_prefix='radius_base',
+            extra_args=self.target.extra_args + ignored,
+        )
+        schema = replace(
+            self.target,
+            backup_type='radius_schema',
+            file_prefix='radius_archive_schema',
+            tables=list(ARCHIVE_TABLES),
+            extra_args=['--no-data'],
+        )
+        tails = [
+            replace(
+                self.target,
+                backup_type=f'{table}_tail',
+                file_prefix=f'{table}_tail',
+                tables=[table],
+                extra_args=[
+                    '--no-create-info',
+                    '--skip-triggers',
+                    f'--where={key} > {int(self.manifest.last_id(table))}',
+                ],
+            )
+            for table, key in ARCHIVE_TABLES.items()
+        ]
+        return self.engine.run([schema, mutable] + tails, timestamp)
+
+    def dump_chunk(self, table: str, first_id: int, last_id: int, timestamp: str) -> DumpResult:
+        """Export rows with first_id <= key <= last_id"""
+        key = ARCHIVE_TABLES[table]
+        target = replace(
+            self.target,
+            backup_type=f'{table}_chunk',
+            tables=[table],
+            extra_args=[
+                '--no-create-info',
+                '--skip-triggers',
+                f'--where={key} BETWEEN {int(first_id)} AND {int(last_id)}',
+            ],
+        )
+        path = os.path.join(
+            self.archive_dir,
+            f"{table}_{first_id:012d}_{last_id:012d}{file_extension(self.engine.compression)}",
+        )
+        return self.engine.dump(target, timestamp, path=path)
+
+    def archive_table(self, radius_db: Session, table: str, timestamp: str) -> List[DumpResult]:
+        """Export every complete chunk past the last archived id"""
+        allocated = self.allocated_id(radius_db, table)
+        upper = self.archive_upper_bound(radius_db, table)
+        first_id = self.manifest.last_id(table) + 1
+        results = []
+
+        while first_id <= upper:
+            last_id = min(first_id + self.chunk_rows - 1, upper)
+            dump = self.dump_chunk(table, first_id, last_id, timestamp)
+            results.append(dump)
+
+            if dump.status != 'completed':
+                logger.error(f"Archive chunk {table} {first_id}-{last_id} failed: {dump.error}")
+                break
+
+            self.manifest.add_chunk(table, first_id, last_id, dump)
+            self.manifest.save()
+            first_id = last_id + 1
+
+        self.manifest.set_horizon(table, max(allocated, self.manifest.horizon(table)))
+        self.manifest.save()
+        return results
+
+    def run(self, radius_db: Session, timestamp: str = None) -> Dict[str, List[DumpResult]]:
+        """Append new accounting chunks, then dump the base with the tails"""
+        timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        chunks = []
+        for table in ARCHIVE_TABLES:
+            chunks.extend(self.archive_table(radius_db, table, timestamp))
+
+        after_ids = {table: self.manifest.last_id(table) for table in ARCHIVE_TABLES}
+        base = self.dump_base(timestamp)
+        if all(dump.status == 'completed' for dump in base):
+            self.manifest.add_base(timestamp, base, after_ids)
+
+        self.manifest.prune_missing_bases()
+        self.manifest.save()
+
+        return {'base': base, 'chunks': chunks}
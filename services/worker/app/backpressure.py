@@ -0,0 +1,214 @@
+"""
+HaroonNet ISP Platform - Notification Backpressure
+Shared token buckets and queue-depth checks between notification producers
+and the notifications queue
+
+Producers call notify() instead of send_*_notification.delay(). A message is
+enqueued only while the notifications queue is below NOTIFY_MAX_QUEUE_DEPTH
+and the channel's token bucket has a token; otherwise it is spilled into
+notification_queue with a scheduled_at, and send_pending_notifications drains
+it at the bucket's pace. The bucket rate adapts to the SMTP/SMS error rate
+(multiplicative decrease, additive increase).
+"""
+
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import logging
+import redis
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.metrics import NOTIFICATIONS_DISPATCHED
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_QUEUE = 'notifications'
+
+BUCKET_KEY = 'haroonnet:ratelimit:{channel}'
+RATE_KEY = 'haroonnet:ratelimit:{channel}:rate'
+WINDOW_KEY = 'haroonnet:ratelimit:{channel}:window'
+ADAPT_KEY = 'haroonnet:ratelimit:{channel}:adapted'
+
+# KEYS: bucket, rate; ARGV: default rate, burst seconds
+# Returns "0" when a token was taken, else the seconds until one is available
+TAKE_SCRIPT = """
+local now = redis.call('time')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate = tonumber(redis.call('get', KEYS[2]) or ARGV[1])
+local capacity = math.max(1, rate * tonumber(ARGV[2]))
+local state = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('expire', KEYS[1], 3600)
+return tostring(wait)
+"""
+
+_redis_client = None
+_broker_client = None
+_depth_cache: Dict[str, tuple] = {}
+
+
+def get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.redis_url)
+    return _redis_client
+
+
+def get_broker() -> redis.Redis:
+    global _broker_client
+    if _broker_client is None:
+        _broker_client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=2)
+    return _broker_client
+
+
+def channel_limits(channel: str) -> tuple:
+    """(starting/maximum rate, minimum rate) in messages per second"""
+    if channel == 'sms':
+        return settings.NOTIFY_SMS_RATE, settings.NOTIFY_MIN_RATE
+    return settings.NOTIFY_EMAIL_RATE, settings.NOTIFY_MIN_RATE
+
+
+def current_rate(channel: str, client: redis.Redis = None) -> float:
+    value = (client or get_redis()).get(RATE_KEY.format(channel=channel))
+    return float(value) if value is not None else channel_limits(channel)[0]
+
+
+class TokenBucket:
+    """Token bucket shared by every producer and worker through Redis"""
+
+    def __init__(self, channel: str, client: redis.Redis = None):
+        self.channel = channel
+        self.client = client or get_redis()
+        self._take = self.client.register_script(TAKE_SCRIPT)
+
+    def take(self) -> float:
+        """Take a token; returns 0 on success, else seconds until one is free"""
+        wait = self._take(
+            keys=[BUCKET_KEY.format(channel=self.channel), RATE_KEY.format(channel=self.channel)],
+            args=[channel_limits(self.channel)[0], settings.NOTIFY_BURST_SECONDS],
+        )
+        return float(wait)
+
+
+def queue_depth(queue: str = NOTIFICATIONS_QUEUE, client: redis.Redis = None) -> int:
+    """Broker queue length, cached for a second per process"""
+    cached = _depth_cache.get(queue)
+    if cached and time.monotonic() - cached[0] < 1:
+        return cached[1]
+    try:
+        depth = (client or get_broker()).llen(queue)
+    except Exception as e:
+        logger.warning(f"Failed to read {queue} queue depth: {str(e)}")
+        depth = 0
+    _depth_cache[queue] = (time.monotonic(), depth)
+    return depth
+
+
+def admit(channel: str, client: redis.Redis = None, broker: redis.Redis = None) -> float:
+    """0 if a message may be enqueued now, else the suggested delay in seconds"""
+    depth = queue_depth(client=broker)
+    if depth >= settings.NOTIFY_MAX_QUEUE_DEPTH:
+        # Let the queue drain below the limit at the current send rate
+        excess = depth - settings.NOTIFY_MAX_QUEUE_DEPTH + 1
+        return max(1.0, excess / current_rate(channel, client))
+    return TokenBucket(channel, client).take()
+
+
+def _send_task(channel: str):
+    from app.tasks.notifications import send_email_notification, send_sms_notification
+    return send_sms_notification if channel == 'sms' else send_email_notification
+
+
+def spill(db: Session, channel: str, recipient: str, template: str,
+          context: Dict[str, Any], scheduled_at: datetime = None):
+    """Park a notification in notification_queue (in the caller's transaction)"""
+    query = """
+    INSERT INTO notification_queue (
+        recipient, type, template, context, status,
+        scheduled_at, created_at
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+    db.execute(query, (
+        recipient, channel, template, json.dumps(context, default=str),
+        'pending', scheduled_at, datetime.now()
+    ))
+
+
+def notify(db: Session, channel: str, recipient: str, template: str, context: Dict[str, Any],
+           client: redis.Redis = None, broker: redis.Redis = None) -> str:
+    """Enqueue a notification if the queue and rate allow, else spill it; returns the outcome"""
+    wait = admit(channel, client, broker)
+    if not wait:
+        _send_task(channel).delay(recipient, template, context)
+        NOTIFICATIONS_DISPATCHED.labels(channel, 'enqueued').inc()
+        return 'enqueued'
+
+    spill(db, channel, recipient, template, context, datetime.now() + timedelta(seconds=wait))
+    NOTIFICATIONS_DISPATCHED.labels(channel, 'spilled').inc()
+    return 'spilled'
+
+
+def wait_for_slot(channel: str, deadline: float, client: redis.Redis = None,
+                  broker: redis.Redis = None) -> bool:
+    """Block until a message may be enqueued; False if that is after the deadline"""
+    while True:
+        wait = admit(channel, client, broker)
+        if not wait:
+            return True
+        if time.monotonic() + wait > deadline:
+            return False
+        time.sleep(wait)
+
+
+def record_send(channel: str, ok: bool, client: redis.Redis = None):
+    """Count a send outcome and adapt the channel rate at most once per interval"""
+    client = client or get_redis()
+    try:
+        window = WINDOW_KEY.format(channel=channel)
+        pipe = client.pipeline(transaction=False)
+        pipe.hincrby(window, 'ok' if ok else 'error', 1)
+        pipe.expire(window, settings.NOTIFY_ADAPT_INTERVAL * 2)
+        pipe.execute()
+        if client.set(ADAPT_KEY.format(channel=channel), 1, nx=True, ex=settings.NOTIFY_ADAPT_INTERVAL):
+            adapt(channel, client)
+    except Exception as e:
+        logger.warning(f"Failed to record {channel} send outcome: {str(e)}")
+
+
+def adapt(channel: str, client: redis.Redis = None) -> Optional[float]:
+    """Apply the error rate observed since the last adaptation to the channel rate"""
+    client = client or get_redis()
+    window = WINDOW_KEY.format(channel=channel)
+    pipe = client.pipeline()
+    pipe.hgetall(window)
+    pipe.delete(window)
+    counts = {key.decode() if isinstance(key, bytes) else key: int(value)
+              for key, value in pipe.execute()[0].items()}
+
+    ok, errors = counts.get('ok', 0), counts.get('error', 0)
+    if ok + errors < settings.NOTIFY_ADAPT_MIN_SAMPLES:
+        return None
+
+    max_rate, min_rate = channel_limits(channel)
+    rate = current_rate(channel, client)
+    error_rate = errors / (ok + errors)
+    if error_rate > settings.NOTIFY_ERROR_THRESHOLD:
+        new_rate = max(min_rate, rate / 2)
+    else:
+        new_rate = min(max_rate, rate + max_rate / 10)
+
+    if new_rate != rate:
+        client.set(RATE_KEY.format(channel=channel), new_rate)
+        logger.info(f"{channel} send rate {rate:.2f}/s -> {new_rate:.2f}/s "
+                    f"(error rate {error_rate:.1%} over {ok + errors} sends)")
+    return new_rate
@@ -0,0 +1,296 @@
+"""
+HaroonNet ISP Platform - Backup Engine
+Streaming, compressed and concurrent database dumps
+"""
+
+import gzip
+import hashlib
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+from app.config import settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from mysqldump per iteration
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+BACKUP_EXTENSIONS = ('.sql', '.sql.gz', '.sql.zst')
+
+
+@dataclass
+class DumpTarget:
+    """A database to dump"""
+    backup_type: str
+    host: str
+    port: int
+    user: str
+    password: str
+    database: str
+    file_prefix: str
+    tables: List[str] = field(default_factory=list)
+    extra_args: List[str] = field(default_factory=list)
+
+
+@dataclass
+class DumpResult:
+    """Outcome of a single streamed dump"""
+    backup_type: str
+    file_path: str
+    raw_size: int = 0
+    file_size: int = 0
+    checksum: str = ''
+    duration: float = 0.0
+    status: str = 'completed'
+    error: Optional[str] = None
+
+    @property
+    def compression_ratio(self) -> float:
+        """Raw dump size divided by stored size"""
+        return self.raw_size / self.file_size if self.file_size else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Raw dump bytes per second"""
+        return self.raw_size / self.duration if self.duration else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'backup_type': self.backup_type,
+            'file_path': self.file_path,
+            'raw_size': self.raw_size,
+            'file_size': self.file_size,
+            'checksum': self.checksum,
+            'duration_seconds': round(self.duration, 3),
+            'throughput_bytes_per_sec': round(self.throughput, 1),
+            'compression_ratio': round(self.compression_ratio, 3),
+            'status': self.status,
+            'error': self.error,
+        }
+
+
+def resolve_compression(requested: str) -> str:
+    """Pick the compression codec, falling back to gzip without zstandard"""
+    if requested == 'zstd' and zstandard is None:
+        logger.warning("zstandard not installed - falling back to gzip backups")
+        return 'gzip'
+    if requested not in ('zstd', 'gzip', 'none'):
+        raise ValueError(f"Unknown backup compression: {requested}")
+    return requested
+
+
+def file_extension(compression: str) -> str:
+    return {'zstd': '.sql.zst', 'gzip': '.sql.gz', 'none': '.sql'}[compression]
+
+
+def write_defaults_file(target: DumpTarget) -> str:
+    """Write a private MySQL option file so the password stays off the command line"""
+    password = target.password.replace('\\', '\\\\').replace('"', '\\"')
+    fd, path = tempfile.mkstemp(prefix='mysqldump-', suffix='.cnf')
+    try:
+        os.fchmod(fd, 0o600)
+        contents = (
+            "[client]\n"
+            f"host={target.host}\n"
+            f"port={target.port}\n"
+            f"user={target.user}\n"
+            f"password=\"{password}\"\n"
+        )
+        os.write(fd, contents.encode())
+    finally:
+        os.close(fd)
+    return path
+
+
+class _Compressor:
+    """Incremental compressor writing to an open binary file"""
+
+    def __init__(self, fileobj, compression: str, level: int):
+        self._raw = fileobj
+        self._compression = compression
+        if compression == 'zstd':
+            self._stream = zstandard.ZstdCompressor(level=level, threads=-1).stream_writer(
+                fileobj, closefd=False
+            )
+        elif compression == 'gzip':
+            self._stream = gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=level)
+        else:
+            self._stream = fileobj
+
+    def write(self, data: bytes):
+        self._stream.write(data)
+
+    def close(self):
+        if self._stream is not self._raw:
+            self._stream.close()
+
+
+class _HashingWriter:
+    """File wrapper that checksums and counts compressed bytes as they are written"""
+
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+
+class BackupEngine:
+    """Runs mysqldump for several databases concurrently, streaming each
+    dump through compression and checksumming as it is produced."""
+
+    def __init__(self, backup_dir: str = None, compression: str = None, level: int = None,
+                 max_workers: int = None):
+        self.backup_dir = backup_dir or settings.BACKUP_DIR
+        self.compression = resolve_compression(compression or settings.BACKUP_COMPRESSION)
+        self.level = level if level is not None else settings.BACKUP_COMPRESSION_LEVEL
+        self.max_workers = max_workers or settings.BACKUP_PARALLELISM
+
+    def dump_command(self, target: DumpTarget, defaults_file: str) -> List[str]:
+        # --defaults-extra-file must be the first option
+        return [
+            'mysqldump',
+            f'--defaults-extra-file={defaults_file}',
+            '--single-transaction',
+            '--quick',
+            *target.extra_args,
+            target.database,
+            *target.tables,
+        ]
+
+    def output_path(self, target: DumpTarget, timestamp: str) -> str:
+        return os.path.join(
+            self.backup_dir, f"{target.file_prefix}_{timestamp}{file_extension(self.compression)}"
+        )
+
+    def dump(self, target: DumpTarget, timestamp: str, path: str = None) -> DumpResult:
+        """Stream one database dump to a compressed file"""
+        path = path or self.output_path(target, timestamp)
+        result = DumpResult(backup_type=target.backup_type, file_path=path)
+        defaults_file = write_defaults_file(target)
+        started = time.monotonic()
+
+        try:
+            with open(path, 'wb') as raw_file:
+                writer = _HashingWriter(raw_file)
+                compressor = _Compressor(writer, self.compression, self.level)
+
+                with tempfile.TemporaryFile() as stderr_file:
+                    proc = subprocess.Popen(
+                        self.dump_command(target, defaults_file),
+                        stdout=subprocess.PIPE,
+                        stderr=stderr_file,
+                    )
+                    try:
+                        while True:
+                            chunk = proc.stdout.read(STREAM_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            result.raw_size += len(chunk)
+                            compressor.write(chunk)
+                    finally:
+                        proc.stdout.close()
+                        returncode = proc.wait()
+
+                    compressor.close()
+                    writer.flush()
+
+                    if returncode != 0:
+                        stderr_file.seek(0)
+                        stderr = stderr_file.read().decode(errors='replace')
+                        raise Exception(f"{target.backup_type} database backup failed: {stderr}")
+
+            result.file_size = writer.size
+            result.checksum = writer.digest.hexdigest()
+
+        except Exception as e:
+            result.status = 'failed'
+            result.error = str(e)
+            if os.path.exists(path):
+                os.remove(path)
+
+        finally:
+            os.remove(defaults_file)
+            result.duration = time.monotonic() - started
+
+        logger.info(
+            f"Backup {target.backup_type}: {result.status}, {result.raw_size} raw bytes, "
+            f"ratio {result.compression_ratio:.2f}, {result.throughput / 1024 / 1024:.1f} MiB/s"
+        )
+
+        return result
+
+    def run(self, targets: List[DumpTarget], timestamp: str = None) -> List[DumpResult]:
+        """Dump all targets concurrently"""
+        timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+        os.makedirs(self.backup_dir, exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(targets))) as executor:
+            futures = [executor.submit(self.dump, target, timestamp) for target in targets]
+            return [future.result() for future in futures]
+
+    def cleanup_old_backups(self, retention_days: int = None) -> List[str]:
+        """Remove backup files older than the retention period"""
+        retention_days = retention_days or settings.BACKUP_RETENTION_DAYS
+        cutoff_date = datetime.now() - timedelta(days=retention_days)
+        removed = []
+
+        try:
+            for filename in os.listdir(self.backup_dir):
+                if filename.endswith(BACKUP_EXTENSIONS):
+                    file_path = os.path.join(self.backup_dir, filename)
+                    file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
+
+                    if file_mtime < cutoff_date:
+                        os.remove(file_path)
+                        removed.append(filename)
+                        logger.info(f"Removed old backup: {filename}")
+
+        except Exception as e:
+            logger.warning(f"Failed to cleanup old backups: {str(e)}")
+
+        return removed
+
+
+def default_targets() -> List[DumpTarget]:
+    """The application and RADIUS databases"""
+    return [
+        DumpTarget(
+            backup_type='application',
+            host=settings.DB_HOST,
+            port=settings.DB_PORT,
+            user=settings.DB_USER,
+            password=settings.DB_PASSWORD,
+            database=settings.DB_NAME,
+            file_prefix='haroonnet_backup',
+            extra_args=['--routines', '--triggers'],
+        ),
+        DumpTarget(
+            backup_type='radius',
+            host=settings.RADIUS_DB_HOST,
+            port=settings.RADIUS_DB_PORT,
+            user=settings.RADIUS_DB_USER,
+            password=settings.RADIUS_DB_PASSWORD,
+            database=settings.RADIUS_DB_NAME,
+            file_prefix='radius_backup',
+            extra_args=['--routines', '--triggers'],
+        ),
+    ]
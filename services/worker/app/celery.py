@@ -7,6 +7,10 @@ import os
 from celery import Celery
 from celery.schedules import crontab
 from app.config import settings
+from app.payloads import celery_options
+from app.worker_profiles import active_profile
+
+serialization = celery_options()
 
 # Create Celery instance
 celery = Celery(
@@ -35,7 +39,9 @@ celery.conf.update(
 
     # Task execution
     task_serializer='json',
-    accept_content=['json'],
+    accept_content=serialization['accept_content'],
+    # Compact serializer for fan-out tasks under TASK_SERIALIZER_PROFILE=msgpack
+    task_annotations=serialization['task_annotations'],
     result_serializer='json',
     result_expires=3600,
     timezone='UTC',
@@ -74,10 +80,17 @@ celery.conf.update(
         'update-usage-aggregates': {
             'task': 'app.tasks.radius.update_usage_aggregates',
             'schedule': crontab(minute='*/15'),  # Every 15 minutes
+            'options': {'expires': 900},  # Drop ticks still queued at the next one
+        },
+        'consume-accounting-stream': {
+            'task': 'app.tasks.radius.consume_accounting_stream',
+            'schedule': crontab(minute='*'),  # Every minute; runs for ACCOUNTING_RUN_SECONDS
+            'options': {'expires': 60},  # Drop ticks still queued at the next one
         },
         'check-quota-limits': {
             'task': 'app.tasks.radius.check_quota_limits',
             'schedule': crontab(minute='*/30'),  # Every 30 minutes
+            'options': {'expires': 1800},  # Drop ticks still queued at the next one
         },
         'reset-monthly-quotas': {
             'task': 'app.tasks.radius.reset_monthly_quotas',
@@ -85,6 +98,10 @@ celery.conf.update(
         },
 
         # System maintenance
+        'manage-partitions': {
+            'task': 'app.tasks.system.manage_partitions',
+            'schedule': crontab(hour=2, minute=30),  # Daily at 2:30 AM
+        },
         'cleanup-old-logs': {
             'task': 'app.tasks.system.cleanup_old_logs',
             'schedule': crontab(hour=3, minute=0),  # Daily at 3 AM
@@ -96,6 +113,7 @@ celery.conf.update(
         'system-health-check': {
             'task': 'app.tasks.system.system_health_check',
             'schedule': crontab(minute='*/5'),  # Every 5 minutes
+            'options': {'expires': 300},  # Drop ticks still queued at the next one
         },
 
         # Reports
@@ -116,6 +134,7 @@ celery.conf.update(
         'send-pending-notifications': {
             'task': 'app.tasks.notifications.send_pending_notifications',
             'schedule': crontab(minute='*/5'),  # Every 5 minutes
+            'options': {'expires': 300},  # Drop ticks still queued at the next one
         },
         'cleanup-sent-notifications': {
             'task': 'app.tasks.notifications.cleanup_sent_notifications',
@@ -128,8 +147,19 @@ celery.conf.update(
     task_create_missing_queues=True,
 )
 
+# Pool, prefetch and ack settings for the queues this worker consumes
+profile = active_profile()
+if profile:
+    celery.conf.update(profile.celery_conf())
+
 # Auto-discover tasks
 celery.autodiscover_tasks()
 
+# Prometheus metrics, SQL profiling and per-process warmup
+from app import metrics, profiler, warmup  # noqa: E402
+metrics.install(celery)
+profiler.install(celery)
+warmup.install(celery)
+
 if __name__ == '__main__':
     celery.start()
@@ -0,0 +1,45 @@
+"""
+HaroonNet ISP Platform - Lazy Clients
+Heavy third-party clients, imported and built on first use
+
+Every worker imports every task module, so module-level imports of pyrad,
+twilio or jinja2 are paid by workers that never send a CoA, SMS or email.
+"""
+
+from functools import lru_cache
+import logging
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def radius_dictionary():
+    """Parsed RADIUS dictionary, shared by all CoA clients of the process"""
+    from pyrad.dictionary import Dictionary
+    return Dictionary(settings.RADIUS_DICTIONARY_PATH)
+
+
+def coa_client(server: str, secret: bytes):
+    """pyrad client for CoA/Disconnect requests to a NAS"""
+    from pyrad.client import Client
+    return Client(server=server, secret=secret, dict=radius_dictionary(), coaport=settings.COA_PORT)
+
+
+@lru_cache(maxsize=None)
+def template_env():
+    """Jinja2 environment for notification templates"""
+    from jinja2 import Environment, FileSystemLoader
+    return Environment(loader=FileSystemLoader('templates'))
+
+
+@lru_cache(maxsize=256)
+def compiled_template(template_str: str):
+    """Compiled Jinja2 template, cached by source text"""
+    return template_env().from_string(template_str)
+
+
+@lru_cache(maxsize=None)
+def twilio_client():
+    from twilio.rest import Client as TwilioClient
+    return TwilioClient(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
@@ -12,8 +12,8 @@ app_engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
     pool_recycle=300,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
     echo=False,
 )
 
@@ -25,14 +25,33 @@ radius_engine = create_engine(
     settings.radius_database_url,
     pool_pre_ping=True,
     pool_recycle=300,
-    pool_size=5,
-    max_overflow=10,
+    pool_size=settings.RADIUS_DB_POOL_SIZE,
+    max_overflow=settings.RADIUS_DB_MAX_OVERFLOW,
     echo=False,
 )
 
 RadiusSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=radius_engine)
 RadiusBase = declarative_base()
 
+# Read replicas (optional), used for reporting and statistics queries
+app_replica_engine = create_engine(
+    settings.DB_REPLICA_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    pool_size=5,
+    max_overflow=10,
+    echo=False,
+) if settings.DB_REPLICA_URL else None
+
+radius_replica_engine = create_engine(
+    settings.RADIUS_DB_REPLICA_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    pool_size=5,
+    max_overflow=10,
+    echo=False,
+) if settings.RADIUS_DB_REPLICA_URL else None
+
 def get_app_db():
     """Get application database session"""
     db = AppSessionLocal()
@@ -0,0 +1,265 @@
+"""
+HaroonNet ISP Platform - Health Subsystem
+Concurrent, time-bounded health probes with latency histograms and
+de-duplicated alerts
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Any, Optional, Tuple
+import logging
+import redis
+from app.config import settings
+from app.database import app_engine, radius_engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_KEY = 'haroonnet:health:latency:{probe}'
+ALERT_KEY = 'haroonnet:health:alert:{issue}'
+ACTIVE_ISSUES_KEY = 'haroonnet:health:active_issues'
+
+# Upper bounds (milliseconds) of the probe latency histogram buckets
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def get_redis() -> redis.Redis:
+    """Process-wide pooled Redis client"""
+    global _redis_client
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                _redis_client = redis.Redis.from_url(
+                    settings.redis_url,
+                    socket_timeout=settings.HEALTH_PROBE_TIMEOUT,
+                    socket_connect_timeout=settings.HEALTH_PROBE_TIMEOUT,
+                )
+    return _redis_client
+
+
+class CpuSampler:
+    """Non-blocking CPU utilisation
+
+    Reports utilisation since the previous sample taken in this process.
+    Without a usable previous sample (fresh worker process) it falls back
+    to the 1-minute load average per core instead of blocking to measure.
+    """
+
+    MIN_INTERVAL = 1.0
+
+    def __init__(self):
+        self._last_times = None
+        self._last_at = 0.0
+
+    def sample(self) -> Tuple[float, str]:
+        import psutil
+        now = time.monotonic()
+        times = psutil.cpu_times()
+        previous, previous_at = self._last_times, self._last_at
+        self._last_times, self._last_at = times, now
+
+        if previous is not None and now - previous_at >= self.MIN_INTERVAL:
+            busy = _busy(times) - _busy(previous)
+            total = sum(times) - sum(previous)
+            if total > 0:
+                return round(100.0 * busy / total, 1), 'interval'
+
+        load_1m = psutil.getloadavg()[0]
+        return round(min(100.0 * load_1m / (os.cpu_count() or 1), 100.0), 1), 'loadavg'
+
+
+def _busy(times) -> float:
+    return sum(times) - times.idle - getattr(times, 'iowait', 0.0)
+
+
+cpu_sampler = CpuSampler()
+
+
+@dataclass
+class ProbeResult:
+    """Outcome of a single health probe"""
+    name: str
+    status: str = 'healthy'
+    latency_ms: float = 0.0
+    value: Any = None
+    error: Optional[str] = None
+
+
+@dataclass
+class HealthReport:
+    data: Dict[str, Any] = field(default_factory=dict)
+    # (issue key, message); the key identifies the issue across checks
+    issues: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def status(self) -> str:
+        return 'healthy' if not self.issues else 'warning'
+
+    @property
+    def messages(self) -> List[str]:
+        return [message for _, message in self.issues]
+
+
+def probe_app_db():
+    with app_engine.connect() as conn:
+        conn.exec_driver_sql("SELECT 1")
+
+
+def probe_radius_db():
+    """RADIUS connectivity and the active session count on one connection"""
+    with radius_engine.connect() as conn:
+        result = conn.exec_driver_sql(
+            "SELECT COUNT(*) as active_sessions FROM radacct WHERE acctstoptime IS NULL"
+        )
+        return result.fetchone().active_sessions
+
+
+def probe_redis():
+    get_redis().ping()
+
+
+PROBES: Dict[str, Callable[[], Any]] = {
+    'database': probe_app_db,
+    'radius_database': probe_radius_db,
+    'redis': probe_redis,
+}
+
+
+def _timed(name: str, probe: Callable[[], Any]) -> ProbeResult:
+    started = time.perf_counter()
+    result = ProbeResult(name=name)
+    try:
+        result.value = probe()
+    except Exception as e:
+        result.status = 'unhealthy'
+        result.error = str(e)
+    result.latency_ms = (time.perf_counter() - started) * 1000
+    return result
+
+
+def run_probes(probes: Dict[str, Callable[[], Any]] = None, timeout: float = None) -> Dict[str, ProbeResult]:
+    """Run all probes concurrently; probes exceeding the timeout are reported as timed out
+
+    Each check gets its own executor. A hung probe thread cannot be cancelled,
+    so on a shared pool it would hold a worker and queue later checks behind it.
+    """
+    probes = probes or PROBES
+    timeout = timeout or settings.HEALTH_PROBE_TIMEOUT
+    executor = ThreadPoolExecutor(max_workers=len(probes), thread_name_prefix='health-probe')
+    try:
+        futures = {name: executor.submit(_timed, name, probe) for name, probe in probes.items()}
+        wait(futures.values(), timeout=timeout)
+    finally:
+        # Do not wait for hung probes; their threads exit when the probe returns
+        executor.shutdown(wait=False)
+
+    results = {}
+    for name, future in futures.items():
+        if future.done():
+            results[name] = future.result()
+        else:
+            future.cancel()
+            results[name] = ProbeResult(
+                name=name, status='timeout', latency_ms=timeout * 1000,
+                error=f"no response within {timeout}s",
+            )
+    return results
+
+
+def record_latency(results: Dict[str, ProbeResult], client: redis.Redis = None):
+    """Add probe latencies to cumulative Redis histograms shared by all workers"""
+    try:
+        client = client or get_redis()
+        pipe = client.pipeline(transaction=False)
+        for result in results.values():
+            bucket = next((str(le) for le in LATENCY_BUCKETS_MS if result.latency_ms <= le), '+Inf')
+            key = LATENCY_KEY.format(probe=result.name)
+            pipe.hincrby(key, bucket, 1)
+            pipe.hincrby(key, 'count', 1)
+            pipe.hincrbyfloat(key, 'sum_ms', round(result.latency_ms, 3))
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Failed to record probe latency: {str(e)}")
+
+
+def latency_histogram(probe: str, client: redis.Redis = None) -> Dict[str, float]:
+    """Cumulative latency histogram for one probe"""
+    raw = (client or get_redis()).hgetall(LATENCY_KEY.format(probe=probe))
+    return {key.decode(): float(value) for key, value in raw.items()}
+
+
+def collect() -> HealthReport:
+    """Resource usage and service probes"""
+    import psutil
+    report = HealthReport()
+
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage('/')
+    cpu_percent, cpu_source = cpu_sampler.sample()
+    disk_percent = (disk.used / disk.total) * 100
+
+    report.data['memory'] = {'total': memory.total, 'available': memory.available, 'percent': memory.percent}
+    report.data['disk'] = {'total': disk.total, 'free': disk.free, 'percent': disk_percent}
+    report.data['cpu'] = {'percent': cpu_percent, 'source': cpu_source}
+
+    if memory.percent > 90:
+        report.issues.append(('memory', f"High memory usage: {memory.percent}%"))
+    if disk_percent > 90:
+        report.issues.append(('disk', f"High disk usage: {disk_percent:.1f}%"))
+    if cpu_percent > 90:
+        report.issues.append(('cpu', f"High CPU usage: {cpu_percent}%"))
+
+    results = run_probes()
+    record_latency(results)
+    report.data['probe_latency_ms'] = {name: round(result.latency_ms, 2) for name, result in results.items()}
+
+    labels = {
+        'database': 'Database connection issue',
+        'radius_database': 'RADIUS database connection issue',
+        'redis': 'Redis connection issue',
+    }
+    for name, result in results.items():
+        report.data[name] = 'healthy' if result.status == 'healthy' else 'unhealthy'
+        if result.status != 'healthy':
+            report.issues.append((name, f"{labels.get(name, name)}: {result.error}"))
+
+    radius = results['radius_database']
+    report.data['active_sessions'] = radius.value if radius.status == 'healthy' else 0
+
+    return report
+
+
+def new_alerts(report: HealthReport, client: redis.Redis = None,
+               cooldown: int = None) -> List[Tuple[str, str]]:
+    """Issues that should trigger an alert now
+
+    An issue alerts when it first appears and again after the cooldown if it
+    persists. Resolved issues are forgotten so a recurrence alerts at once.
+    """
+    cooldown = cooldown or settings.HEALTH_ALERT_COOLDOWN
+    try:
+        client = client or get_redis()
+        current = {key for key, _ in report.issues}
+        previous = {key.decode() for key in client.smembers(ACTIVE_ISSUES_KEY)}
+
+        for resolved in previous - current:
+            client.delete(ALERT_KEY.format(issue=resolved))
+            client.srem(ACTIVE_ISSUES_KEY, resolved)
+            logger.info(f"Health issue resolved: {resolved}")
+
+        alerts = []
+        for key, message in report.issues:
+            client.sadd(ACTIVE_ISSUES_KEY, key)
+            if client.set(ALERT_KEY.format(issue=key), message, nx=True, ex=cooldown):
+                alerts.append((key, message))
+        return alerts
+
+    except Exception as e:
+        # Without Redis, alerting on every issue is better than staying silent
+        logger.warning(f"Alert de-duplication unavailable: {str(e)}")
+        return list(report.issues)
@@ -0,0 +1,242 @@
+"""
+HaroonNet ISP Platform - Task Leases
+Redis lease locks for singleton periodic tasks
+
+A lease is a Redis key holding the holder's token (a per-lock counter that
+only grows) with a TTL. The holder extends it from a heartbeat thread; if the
+worker dies the lease expires and the next tick can run. A run that loses its
+lease (heartbeat failure, expiry during a long pause) must stop before its
+side effects: tasks call ensure_lease() before committing or sending CoA.
+The token is not a fencing token: the database and the NAS never see it, so
+ensure_lease() narrows the window in which a run that just lost its lease can
+still write, but does not close it.
+
+DatabaseTask classes take a singleton task's lease (task_lease()) before
+opening their sessions, so a skipped tick holds no pool connections.
+"""
+
+import functools
+from contextlib import contextmanager
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+import logging
+import redis
+from app.config import settings
+from app.metrics import LEASE_HELD_SECONDS, SINGLETON_RUNS
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'haroonnet:lock:{name}'
+TOKEN_KEY = 'haroonnet:lock:{name}:token'
+PENDING_KEY = 'haroonnet:lock:{name}:pending'
+PENDING_TTL = 86400  # Cleanup only; the next holder clears the flag
+
+# KEYS: lock, token counter; ARGV: ttl ms. Returns the new token, or nil if held
+ACQUIRE_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return nil
+end
+local token = redis.call('incr', KEYS[2])
+redis.call('set', KEYS[1], token, 'px', ARGV[1])
+return token
+"""
+
+# KEYS: lock; ARGV: token, ttl ms. Returns 1 if still held and extended
+EXTEND_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# KEYS: lock; ARGV: token. Returns 1 if released
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_current_lease: ContextVar[Optional['Lease']] = ContextVar('haroonnet_lease', default=None)
+# Task whose lease task_lease() took for the next @singleton call
+_taken_for: ContextVar[Any] = ContextVar('haroonnet_lease_taken_for', default=None)
+
+_redis_client = None
+
+
+def get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.redis_url)
+    return _redis_client
+
+
+class LeaseLost(Exception):
+    """The lease expired or was taken over; the run must not continue"""
+
+
+class Lease:
+    """A single holder of a named lease"""
+
+    def __init__(self, name: str, ttl: float, client: redis.Redis = None):
+        self.name = name
+        self.ttl = ttl
+        self.client = client or get_redis()
+        self.key = LOCK_KEY.format(name=name)
+        self.token: Optional[int] = None
+        self.lost = False
+        self._acquire = self.client.register_script(ACQUIRE_SCRIPT)
+        self._extend = self.client.register_script(EXTEND_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @property
+    def ttl_ms(self) -> int:
+        return int(self.ttl * 1000)
+
+    def acquire(self) -> bool:
+        token = self._acquire(keys=[self.key, TOKEN_KEY.format(name=self.name)], args=[self.ttl_ms])
+        if token is None:
+            return False
+        self.token = int(token)
+        return True
+
+    def extend(self) -> bool:
+        if self.token is None or self.lost:
+            return False
+        if not self._extend(keys=[self.key], args=[self.token, self.ttl_ms]):
+            self.lost = True
+        return not self.lost
+
+    def release(self) -> bool:
+        self.stop_heartbeat()
+        if self.token is None:
+            return False
+        return bool(self._release(keys=[self.key], args=[self.token]))
+
+    def holder(self) -> Optional[int]:
+        value = self.client.get(self.key)
+        return int(value) if value is not None else None
+
+    def ensure(self):
+        """Raise LeaseLost unless this run still holds the lease"""
+        if self.lost or self.holder() != self.token:
+            self.lost = True
+            raise LeaseLost(f"Lease {self.name} (token {self.token}) is no longer held")
+
+    def start_heartbeat(self, interval: float = None):
+        interval = interval or self.ttl / 3
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    if not self.extend():
+                        logger.error(f"Lease {self.name} (token {self.token}) lost")
+                        return
+                except Exception as e:
+                    # Keep trying until the TTL runs out; ensure() has the final say
+                    logger.warning(f"Lease {self.name} heartbeat failed: {str(e)}")
+
+        self._heartbeat = threading.Thread(target=beat, name=f'lease-{self.name}', daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout=1)
+
+
+def current_lease() -> Optional[Lease]:
+    return _current_lease.get()
+
+
+def ensure_lease():
+    """Check the running singleton task still holds its lease (no-op elsewhere)"""
+    lease = current_lease()
+    if lease is not None:
+        lease.ensure()
+
+
+@contextmanager
+def singleton_scope(task, ttl: float = None, missed: str = 'skip',
+                    client: redis.Redis = None) -> Iterator[Optional[Dict[str, Any]]]:
+    """Hold a task's lease for the block; yields None, or the skip result if another run holds it"""
+    redis_client = client or get_redis()
+    lease = Lease(task.name, ttl or settings.LOCK_DEFAULT_TTL, redis_client)
+    pending_key = PENDING_KEY.format(name=task.name)
+
+    if not lease.acquire():
+        outcome = 'coalesced' if missed == 'coalesce' else 'skipped'
+        if missed == 'coalesce':
+            redis_client.set(pending_key, 1, ex=PENDING_TTL)
+        SINGLETON_RUNS.labels(task.name, outcome).inc()
+        logger.info(f"{task.name} already running; tick {outcome}")
+        yield {'status': 'skipped', 'reason': 'already_running', 'missed': missed}
+        return
+
+    SINGLETON_RUNS.labels(task.name, 'acquired').inc()
+    # A tick coalesced before this run started is covered by this run
+    redis_client.delete(pending_key)
+    lease.start_heartbeat()
+    reset = _current_lease.set(lease)
+    started = time.perf_counter()
+    try:
+        yield None
+    finally:
+        _current_lease.reset(reset)
+        LEASE_HELD_SECONDS.labels(task.name).observe(time.perf_counter() - started)
+        if not lease.release():
+            # Another run may have overlapped this one
+            SINGLETON_RUNS.labels(task.name, 'lost').inc()
+            logger.error(f"{task.name} lost its lease (token {lease.token}) before finishing")
+        if missed == 'coalesce' and redis_client.delete(pending_key):
+            task.apply_async()
+
+
+@contextmanager
+def task_lease(task) -> Iterator[Optional[Dict[str, Any]]]:
+    """Take a @singleton task's lease up front; a no-op for other tasks
+
+    Yields the skip result when another run holds the lease.
+    """
+    options = getattr(task.run, 'singleton', None)
+    if options is None:
+        yield None
+        return
+    with singleton_scope(task, **options) as skipped:
+        reset = _taken_for.set(None if skipped else task)
+        try:
+            yield skipped
+        finally:
+            _taken_for.reset(reset)
+
+
+def singleton(ttl: float = None, missed: str = 'skip', client: redis.Redis = None):
+    """Allow one run of a bound task at a time across all workers
+
+    A tick that finds the task running is skipped (missed='skip') or, with
+    missed='coalesce', folded into a single follow-up run started when the
+    current holder finishes.
+    """
+    if missed not in ('skip', 'coalesce'):
+        raise ValueError(f"missed must be 'skip' or 'coalesce', not {missed!r}")
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(task, *args, **kwargs):
+            if _taken_for.get() is task:
+                # Taken by task_lease() before the task opened its sessions
+                _taken_for.set(None)
+                return func(task, *args, **kwargs)
+            with singleton_scope(task, ttl, missed, client) as skipped:
+                if skipped:
+                    return skipped
+                return func(task, *args, **kwargs)
+
+        wrapper.singleton = {'ttl': ttl, 'missed': missed, 'client': client}
+        return wrapper
+
+    return decorator
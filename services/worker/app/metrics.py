@@ -0,0 +1,281 @@
+"""
+HaroonNet ISP Platform - Worker Metrics
+Prometheus metrics for task duration, rows processed, database queries,
+external calls and queue depth
+
+Prefork children write to PROMETHEUS_MULTIPROC_DIR; the worker's main
+process aggregates those files and serves them on METRICS_PORT.
+prometheus_client picks its value storage when it is imported, so the
+directory is set before the app is (the Dockerfile, or
+app.worker_profiles.main from PROMETHEUS_MULTIPROC_DIR in settings).
+"""
+
+import os
+import shutil
+import time
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import logging
+import redis
+from celery import current_task, signals
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, multiprocess, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TASK_DURATION = Histogram(
+    'haroonnet_worker_task_duration_seconds',
+    'Celery task run time',
+    ['task', 'state'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600),
+)
+
+ROWS_PROCESSED = Counter(
+    'haroonnet_worker_rows_processed_total',
+    'Rows processed by tasks, from the counts in task results',
+    ['task', 'kind'],
+)
+
+DB_QUERY_SECONDS = Histogram(
+    'haroonnet_worker_db_query_seconds',
+    'Database statement latency',
+    ['database', 'task'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10),
+)
+
+DB_POOL_WAIT = Histogram(
+    'haroonnet_worker_db_pool_wait_seconds',
+    'Time to obtain a pooled connection for a task session',
+    ['database', 'role'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+EXTERNAL_CALLS = Counter(
+    'haroonnet_worker_external_calls_total',
+    'CoA, SMTP and SMS attempts by outcome',
+    ['service', 'outcome'],
+)
+
+SINGLETON_RUNS = Counter(
+    'haroonnet_worker_singleton_runs_total',
+    'Singleton task ticks: acquired, skipped or coalesced while another run held the lease, or lost',
+    ['task', 'outcome'],
+)
+
+LEASE_HELD_SECONDS = Histogram(
+    'haroonnet_worker_lease_held_seconds',
+    'How long singleton tasks held their lease',
+    ['task'],
+    buckets=(0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 900, 1800, 3600),
+)
+
+NOTIFICATIONS_DISPATCHED = Counter(
+    'haroonnet_worker_notifications_dispatched_total',
+    'Notifications enqueued directly or spilled into notification_queue by backpressure',
+    ['channel', 'outcome'],
+)
+
+# Tasks whose result status is the outcome of an external call
+OUTCOME_SERVICES = {
+    'app.tasks.radius.send_coa_disconnect': 'coa',
+    'app.tasks.radius.send_coa_rate_limit': 'coa',
+    'app.tasks.notifications.send_email_notification': 'smtp',
+    'app.tasks.notifications.send_sms_notification': 'sms',
+}
+
+# Result fields that count rows a task processed; other integers in results
+# (byte sizes, gauges, table counts) are not rows
+ROW_COUNTS = {
+    'app.tasks.billing.generate_monthly_invoices': ('invoices_generated',),
+    'app.tasks.billing.process_overdue_accounts': ('processed_count', 'suspended_count'),
+    'app.tasks.billing.send_payment_reminders': ('reminders_sent',),
+    'app.tasks.notifications.send_pending_notifications': ('processed_count',),
+    'app.tasks.notifications.cleanup_sent_notifications': ('deleted_logs', 'deleted_queue'),
+    'app.tasks.radius.update_usage_aggregates': ('updated_count',),
+    'app.tasks.radius.consume_accounting_stream': ('events', 'usage_rows'),
+    'app.tasks.radius.check_quota_limits': ('quota_warnings', 'quota_exceeded', 'fup_applied'),
+    'app.tasks.radius.enforce_quota_limits': ('quota_warnings', 'quota_exceeded', 'fup_applied'),
+    'app.tasks.radius.reset_monthly_quotas': ('reset_count', 'reactivated_count'),
+    'app.tasks.system.cleanup_old_logs': ('deleted_audit_logs', 'deleted_radius_logs',
+                                          'deleted_postauth_logs', 'deleted_usage_logs'),
+}
+
+_task_started: Dict[str, float] = {}
+
+
+def current_task_name() -> str:
+    return current_task.name if current_task else 'none'
+
+
+def record_result(task_name: str, retval: Any):
+    """Count rows processed from the task's ROW_COUNTS fields of its result"""
+    if not isinstance(retval, dict):
+        return
+    for kind in ROW_COUNTS.get(task_name, ()):
+        value = retval.get(kind)
+        if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+            ROWS_PROCESSED.labels(task_name, kind).inc(value)
+
+
+def record_outcome(task_name: str, state: str, retval: Any):
+    service = OUTCOME_SERVICES.get(task_name)
+    if not service:
+        return
+    if state == 'SUCCESS' and isinstance(retval, dict):
+        outcome = retval.get('status', 'unknown')
+    else:
+        outcome = (state or 'unknown').lower()
+    EXTERNAL_CALLS.labels(service, outcome).inc()
+
+
+def on_task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def on_task_postrun(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+    record_result(task.name, retval)
+    record_outcome(task.name, state, retval)
+
+
+# Observers of each instrumented engine, called as observer(database, statement, seconds, rows)
+# after every statement; rows is None when the statement raised
+_query_observers: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def watch_queries(engine, database: str, observer: Callable[[str, str, float, Optional[int]], None]):
+    """Time every statement run through an engine and pass it to observer
+
+    The cursor listeners are registered once per engine and shared by all of its
+    observers, so metrics and the SQL profiler time each statement once.
+    """
+    observers = _query_observers.get(engine)
+    if observers is not None:
+        observers.append(observer)
+        return
+    observers = _query_observers[engine] = [observer]
+
+    def notify(statement: str, started: float, rows: Optional[int]):
+        seconds = time.perf_counter() - started
+        for observe in observers:
+            observe(database, statement, seconds, rows)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        notify(statement, conn.info['query_start'].pop(), max(cursor.rowcount, 0))
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_start'):
+            notify(exception_context.statement, conn.info['query_start'].pop(), None)
+
+
+def observe_query(database: str, statement: str, seconds: float, rows: Optional[int]):
+    DB_QUERY_SECONDS.labels(database, current_task_name()).observe(seconds)
+
+
+def instrument_engine(engine, database: str):
+    """Observe the latency of every statement run through an engine"""
+    watch_queries(engine, database, observe_query)
+
+
+def queue_names(app) -> List[str]:
+    """Queues named in the app's task routes plus the default queue"""
+    routes = app.conf.task_routes or {}
+    names = {route['queue'] for route in routes.values() if 'queue' in route}
+    names.add(app.conf.task_default_queue)
+    return sorted(names)
+
+
+class QueueDepthCollector:
+    """Reads pending message counts from the Redis broker at scrape time"""
+
+    def __init__(self, queues: Iterable[str], client: redis.Redis = None):
+        self.queues = list(queues)
+        self.client = client or redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=2)
+
+    def collect(self):
+        gauge = GaugeMetricFamily('haroonnet_worker_queue_depth', 'Messages waiting per Celery queue',
+                                  labels=['queue'])
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for queue in self.queues:
+                pipe.llen(queue)
+            for queue, depth in zip(self.queues, pipe.execute()):
+                gauge.add_metric([queue], depth)
+        except Exception as e:
+            logger.warning(f"Failed to read queue depth: {str(e)}")
+        yield gauge
+
+
+def multiprocess_dir() -> Optional[str]:
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def clear_multiprocess_dir():
+    """Create the sample directory, removing samples left by previous worker runs"""
+    path = multiprocess_dir()
+    if not path:
+        return
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        target = os.path.join(path, name)
+        if os.path.isdir(target):
+            shutil.rmtree(target, ignore_errors=True)
+        else:
+            os.remove(target)
+
+
+def start_exporter(app, port: int = None) -> CollectorRegistry:
+    """Serve aggregated metrics of all worker processes"""
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        logger.warning("PROMETHEUS_MULTIPROC_DIR is not set; serving this process's metrics only")
+        registry = REGISTRY
+    registry.register(QueueDepthCollector(queue_names(app)))
+    start_http_server(port or settings.METRICS_PORT, registry=registry)
+    logger.info(f"Metrics exporter listening on port {port or settings.METRICS_PORT}")
+    return registry
+
+
+def install(app):
+    """Connect metric collection to the Celery app and database engines"""
+    if not settings.MONITORING_ENABLED:
+        return
+
+    from app.database import app_engine, radius_engine, app_replica_engine, radius_replica_engine
+    instrument_engine(app_engine, 'app')
+    instrument_engine(radius_engine, 'radius')
+    if app_replica_engine is not None:
+        instrument_engine(app_replica_engine, 'app_replica')
+    if radius_replica_engine is not None:
+        instrument_engine(radius_replica_engine, 'radius_replica')
+
+    signals.task_prerun.connect(on_task_prerun, weak=False)
+    signals.task_postrun.connect(on_task_postrun, weak=False)
+
+    @signals.worker_init.connect(weak=False)
+    def on_worker_init(**kwargs):
+        clear_multiprocess_dir()
+
+    @signals.worker_ready.connect(weak=False)
+    def on_worker_ready(**kwargs):
+        try:
+            start_exporter(app)
+        except OSError as e:
+            logger.error(f"Metrics exporter failed to start: {str(e)}")
+
+    @signals.worker_process_shutdown.connect(weak=False)
+    def on_worker_process_shutdown(pid=None, **kwargs):
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,313 @@
+"""
+HaroonNet ISP Platform - Partition Manager
+Maintains monthly RANGE partitions so retention is a DROP PARTITION
+
+Tables must first be converted to partitioned tables in a maintenance window;
+print the conversion DDL (read from each table's current keys) with:
+    python -m app.partitions --print-ddl
+Tables with foreign keys are not converted; the output lists the keys to drop.
+"""
+
+import argparse
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+from sqlalchemy.orm import Session
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAXVALUE_PARTITION = 'pmax'
+
+
+class PartitionError(Exception):
+    """Raised when a table cannot be converted to a partitioned table"""
+
+
+@dataclass
+class PartitionSpec:
+    """Monthly partitioning rule for one table"""
+    table: str
+    column: str
+    database: str  # 'app' or 'radius'
+    retention_days: int
+    # TO_DAYS for DATE/DATETIME columns, UNIX_TIMESTAMP for TIMESTAMP columns,
+    # HOURS for integer hours since the epoch (app/usage_buckets.py)
+    function: str = 'TO_DAYS'
+
+    def bound_expression(self, month: date) -> str:
+        """VALUES LESS THAN expression for the partition ending before month"""
+        if self.function == 'UNIX_TIMESTAMP':
+            return f"UNIX_TIMESTAMP('{month:%Y-%m-%d} 00:00:00')"
+        if self.function == 'HOURS':
+            return str((month - date(1970, 1, 1)).days * 24)
+        return f"TO_DAYS('{month:%Y-%m-%d}')"
+
+    def partition_expression(self) -> str:
+        if self.function == 'HOURS':
+            return self.column
+        return f"{self.function}({self.column})"
+
+
+def partition_specs() -> List[PartitionSpec]:
+    """Partitioned tables and their retention"""
+    return [
+        PartitionSpec('radacct', 'acctstarttime', 'radius', settings.RADACCT_RETENTION_DAYS),
+        PartitionSpec('radpostauth', 'authdate', 'radius', settings.RADPOSTAUTH_RETENTION_DAYS,
+                      function='UNIX_TIMESTAMP'),
+        PartitionSpec('usage_aggregates', 'date', 'app', settings.USAGE_RETENTION_DAYS),
+        PartitionSpec('usage_hourly', 'hour', 'app', settings.USAGE_HOURLY_RETENTION_DAYS, function='HOURS'),
+        PartitionSpec('notification_logs', 'created_at', 'app', settings.NOTIFICATION_LOG_RETENTION_DAYS),
+    ]
+
+
+def month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding rows from the given month"""
+    return f"p{month:%Y%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Month held by a pYYYYMM partition"""
+    try:
+        return datetime.strptime(name, 'p%Y%m').date()
+    except ValueError:
+        return None
+
+
+class PartitionManager:
+    """Creates partitions ahead of time and drops expired ones"""
+
+    def __init__(self, months_ahead: int = None, today: date = None):
+        self.months_ahead = settings.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+        self.today = today or datetime.now().date()
+
+    def existing_partitions(self, db: Session, spec: PartitionSpec) -> List[str]:
+        query = """
+        SELECT partition_name
+        FROM information_schema.partitions
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+        AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+        """
+        result = db.execute(query, (spec.table,))
+        return [row.partition_name for row in result.fetchall()]
+
+    def plan(self, spec: PartitionSpec, existing: List[str]) -> Dict[str, Any]:
+        """Partitions to add and drop for a table"""
+        months = sorted(month for month in map(partition_month, existing) if month)
+        current = month_start(self.today)
+        last_wanted = add_months(current, self.months_ahead)
+
+        # Add every missing month up to the look-ahead horizon
+        next_month = add_months(months[-1], 1) if months else current
+        to_add = []
+        while next_month <= last_wanted:
+            to_add.append(next_month)
+            next_month = add_months(next_month, 1)
+
+        # A partition is expired once every row it can hold is past retention
+        cutoff = self.today - timedelta(days=spec.retention_days)
+        to_drop = [month for month in months if add_months(month, 1) <= cutoff]
+
+        return {'add': to_add, 'drop': to_drop}
+
+    def add_partitions_sql(self, spec: PartitionSpec, months: List[date]) -> str:
+        """Split the MAXVALUE catch-all into new monthly partitions"""
+        definitions = [
+            f"PARTITION {partition_name(month)} VALUES LESS THAN ({spec.bound_expression(add_months(month, 1))})"
+            for month in months
+        ]
+        definitions.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN MAXVALUE")
+        return (
+            f"ALTER TABLE {spec.table} REORGANIZE PARTITION {MAXVALUE_PARTITION} INTO (\n    "
+            + ",\n    ".join(definitions)
+            + "\n)"
+        )
+
+    def drop_partitions_sql(self, spec: PartitionSpec, months: List[date]) -> str:
+        names = ", ".join(partition_name(month) for month in months)
+        return f"ALTER TABLE {spec.table} DROP PARTITION {names}"
+
+    def unique_keys(self, db: Session, spec: PartitionSpec) -> Dict[str, List[str]]:
+        """The table's primary and unique keys and their columns, in key order"""
+        query = """
+        SELECT index_name, column_name
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+        AND non_unique = 0
+        ORDER BY index_name, seq_in_index
+        """
+        keys: Dict[str, List[str]] = {}
+        for row in db.execute(query, (spec.table,)).fetchall():
+            keys.setdefault(row.index_name, []).append(row.column_name)
+        return keys
+
+    def nullable_column_type(self, db: Session, spec: PartitionSpec) -> Optional[str]:
+        """The partitioning column's type if it is nullable, else None
+
+        Raises PartitionError if rows hold NULL there: they would have no
+        partition to go to.
+        """
+        query = """
+        SELECT column_type, is_nullable
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name = %s
+        AND column_name = %s
+        """
+        column = db.execute(query, (spec.table, spec.column)).fetchone()
+        if not column:
+            raise PartitionError(f"Table {spec.table} has no column {spec.column}")
+        if column.is_nullable != 'YES':
+            return None
+
+        null_query = f"SELECT COUNT(*) as null_rows FROM {spec.table} WHERE {spec.column} IS NULL"
+        null_rows = db.execute(null_query).fetchone().null_rows
+        if null_rows:
+            raise PartitionError(
+                f"{null_rows} {spec.table} rows have NULL {spec.column}; set or delete them before converting"
+            )
+        return column.column_type
+
+    def foreign_keys(self, db: Session, spec: PartitionSpec) -> List[Tuple[str, str, str]]:
+        """(table, constraint, referenced table) of foreign keys on or referencing the table"""
+        query = """
+        SELECT DISTINCT table_name, constraint_name, referenced_table_name
+        FROM information_schema.key_column_usage
+        WHERE table_schema = DATABASE()
+        AND referenced_table_name IS NOT NULL
+        AND (table_name = %s OR referenced_table_name = %s)
+        ORDER BY table_name, constraint_name
+        """
+        return [(row.table_name, row.constraint_name, row.referenced_table_name)
+                for row in db.execute(query, (spec.table, spec.table)).fetchall()]
+
+    def conversion_plan(self, db: Session, spec: PartitionSpec, months_back: int = None) -> List[str]:
+        """Conversion DDL for the table as it currently is
+
+        Raises PartitionError if foreign keys point from or to the table:
+        InnoDB cannot partition it, and dropping them is left to the operator.
+        """
+        foreign_keys = self.foreign_keys(db, spec)
+        if foreign_keys:
+            drops = '; '.join(f"ALTER TABLE {table} DROP FOREIGN KEY {name}" for table, name, _ in foreign_keys)
+            keys = ', '.join(f"{name} ({table} -> {referenced})" for table, name, referenced in foreign_keys)
+            raise PartitionError(
+                f"{spec.table} has foreign keys {keys}; partitioned InnoDB tables cannot have foreign keys. "
+                f"Drop them first: {drops}"
+            )
+        return self.conversion_ddl(spec, self.unique_keys(db, spec), self.nullable_column_type(db, spec),
+                                   months_back=months_back)
+
+    def conversion_ddl(self, spec: PartitionSpec, unique_keys: Dict[str, List[str]],
+                       nullable_type: str = None, months_back: int = None) -> List[str]:
+        """One-off DDL turning an unpartitioned table into monthly partitions
+
+        MySQL requires the partitioning column in every unique key and does not
+        allow it to be NULL. Keys without it are widened to end with it (so a
+        FreeRADIUS acctuniqueid is then unique per start time), and a nullable
+        column (nullable_type) is made NOT NULL, in one table rebuild.
+        """
+        if months_back is None:
+            months_back = -(-spec.retention_days // 30)
+        current = month_start(self.today)
+        first = add_months(current, -months_back)
+        months = []
+        month = first
+        while month <= add_months(current, self.months_ahead):
+            months.append(month)
+            month = add_months(month, 1)
+
+        definitions = [
+            f"PARTITION {partition_name(month)} VALUES LESS THAN ({spec.bound_expression(add_months(month, 1))})"
+            for month in months
+        ]
+        definitions.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN MAXVALUE")
+
+        changes = []
+        if nullable_type:
+            changes.append(f"MODIFY {spec.column} {nullable_type} NOT NULL")
+        for name, columns in sorted(unique_keys.items(), key=lambda item: item[0] != 'PRIMARY'):
+            if spec.column in columns:
+                continue
+            widened = ', '.join(columns + [spec.column])
+            if name == 'PRIMARY':
+                changes.append(f"DROP PRIMARY KEY, ADD PRIMARY KEY ({widened})")
+            else:
+                changes.append(f"DROP INDEX {name}, ADD UNIQUE KEY {name} ({widened})")
+
+        statements = []
+        if changes:
+            statements.append(f"ALTER TABLE {spec.table} " + ", ".join(changes))
+        statements.append(
+            f"ALTER TABLE {spec.table} PARTITION BY RANGE ({spec.partition_expression()}) (\n    "
+            + ",\n    ".join(definitions)
+            + "\n)"
+        )
+        return statements
+
+    def maintain(self, db: Session, spec: PartitionSpec, dry_run: bool = False) -> Dict[str, Any]:
+        """Bring one table's partitions up to date"""
+        existing = self.existing_partitions(db, spec)
+        if not existing:
+            logger.warning(f"Table {spec.table} is not partitioned - skipping")
+            return {'status': 'not_partitioned', 'added': [], 'dropped': []}
+
+        if MAXVALUE_PARTITION not in existing:
+            logger.warning(f"Table {spec.table} has no {MAXVALUE_PARTITION} partition - skipping")
+            return {'status': 'unsupported_layout', 'added': [], 'dropped': []}
+
+        plan = self.plan(spec, existing)
+        statements = []
+        if plan['add']:
+            statements.append(self.add_partitions_sql(spec, plan['add']))
+        if plan['drop']:
+            statements.append(self.drop_partitions_sql(spec, plan['drop']))
+
+        if not dry_run:
+            for statement in statements:
+                logger.info(f"Partition maintenance: {statement.splitlines()[0]}")
+                db.execute(statement)
+
+        return {
+            'status': 'dry_run' if dry_run else 'completed',
+            'added': [partition_name(month) for month in plan['add']],
+            'dropped': [partition_name(month) for month in plan['drop']],
+            'statements': statements,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monthly partition DDL for retention tables')
+    parser.add_argument('--print-ddl', action='store_true', help='Print one-off conversion DDL')
+    args = parser.parse_args()
+
+    if args.print_ddl:
+        from app.database import AppSessionLocal, RadiusSessionLocal
+        manager = PartitionManager()
+        for spec in partition_specs():
+            print(f"-- {spec.database} database: {spec.table}")
+            session = RadiusSessionLocal() if spec.database == 'radius' else AppSessionLocal()
+            try:
+                for statement in manager.conversion_plan(session, spec):
+                    print(f"{statement};\n")
+            except PartitionError as e:
+                print(f"-- Not converted: {e}\n")
+            finally:
+                session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+HaroonNet ISP Platform - Task Payloads
+Compact msgpack serialization for fan-out tasks and reference passing for
+large task arguments
+
+A reference is a small dict standing in for a context value:
+    {'$payload': key}   value stored in Redis by offload()
+    {'$report': id}     data column of a generated_reports row
+Tasks call resolve() on their context before using it.
+"""
+
+import datetime
+import decimal
+import json
+import uuid
+from typing import Any, Dict, Optional
+import logging
+import redis
+from sqlalchemy.orm import Session
+from app.config import settings
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+SERIALIZER = 'haroonnet-msgpack'
+CONTENT_TYPE = 'application/x-haroonnet-msgpack'
+
+PAYLOAD_KEY = 'haroonnet:payload:{id}'
+
+# Tasks that fan out in large numbers and use the compact serializer
+FANOUT_TASKS = [
+    'app.tasks.notifications.send_email_notification',
+    'app.tasks.notifications.send_sms_notification',
+    'app.tasks.radius.send_coa_disconnect',
+    'app.tasks.radius.send_coa_rate_limit',
+]
+
+# msgpack extension type codes
+_EXT_DATETIME = 1
+_EXT_DATE = 2
+_EXT_DECIMAL = 3
+
+
+class PayloadExpired(Exception):
+    """A referenced payload is no longer available"""
+
+
+def _default(value):
+    if isinstance(value, datetime.datetime):
+        return msgpack.ExtType(_EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, datetime.date):
+        return msgpack.ExtType(_EXT_DATE, value.isoformat().encode())
+    if isinstance(value, decimal.Decimal):
+        return msgpack.ExtType(_EXT_DECIMAL, str(value).encode())
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == _EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == _EXT_DATE:
+        return datetime.date.fromisoformat(data.decode())
+    if code == _EXT_DECIMAL:
+        return decimal.Decimal(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def pack(value: Any) -> bytes:
+    return msgpack.packb(value, default=_default, use_bin_type=True)
+
+
+def unpack(data: bytes) -> Any:
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False, strict_map_key=False)
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def register_serializer():
+    """Register the msgpack serializer with kombu; False when msgpack is missing"""
+    if msgpack is None:
+        return False
+    from kombu.serialization import register
+    register(SERIALIZER, pack, unpack, content_type=CONTENT_TYPE, content_encoding='binary')
+    return True
+
+
+def celery_options() -> Dict[str, Any]:
+    """Celery settings for the configured TASK_SERIALIZER_PROFILE"""
+    accept = ['json']
+    annotations = {}
+    if register_serializer():
+        # Always accept msgpack so mixed-profile deployments interoperate
+        accept.append(SERIALIZER)
+        if settings.TASK_SERIALIZER_PROFILE == 'msgpack':
+            annotations = {name: {'serializer': SERIALIZER} for name in FANOUT_TASKS}
+    elif settings.TASK_SERIALIZER_PROFILE == 'msgpack':
+        logger.warning("msgpack not installed - fan-out tasks stay on JSON")
+
+    return {'accept_content': accept, 'task_annotations': annotations}
+
+
+_redis_client = None
+
+
+def get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.redis_url)
+    return _redis_client
+
+
+def _encode(value: Any) -> bytes:
+    if msgpack is not None:
+        return b'm' + pack(value)
+    return b'j' + json.dumps(value, default=str).encode()
+
+
+def _decode(data: bytes) -> Any:
+    if data[:1] == b'm':
+        return unpack(data[1:])
+    return json.loads(data[1:])
+
+
+def offload(value: Any, limit: int = None, ttl: int = None, client: redis.Redis = None) -> Any:
+    """Replace a large value with a Redis reference; small values pass through"""
+    limit = settings.TASK_PAYLOAD_INLINE_LIMIT if limit is None else limit
+    encoded = _encode(value)
+    if len(encoded) <= limit:
+        return value
+
+    key = PAYLOAD_KEY.format(id=uuid.uuid4().hex)
+    (client or get_redis()).set(key, encoded, ex=ttl or settings.TASK_PAYLOAD_TTL)
+    return {'$payload': key}
+
+
+def report_ref(report_id: int) -> Dict[str, int]:
+    return {'$report': report_id}
+
+
+def _resolve_value(value: Any, db: Optional[Session], client: Optional[redis.Redis]) -> Any:
+    if not isinstance(value, dict) or len(value) != 1:
+        return value
+
+    if '$payload' in value:
+        data = (client or get_redis()).get(value['$payload'])
+        if data is None:
+            raise PayloadExpired(f"Payload {value['$payload']} has expired")
+        return _decode(data)
+
+    if '$report' in value:
+        if db is None:
+            raise ValueError("A database session is needed to resolve report references")
+        row = db.execute("SELECT data FROM generated_reports WHERE id = %s", (value['$report'],)).fetchone()
+        if not row:
+            raise PayloadExpired(f"Report {value['$report']} not found")
+        return json.loads(row.data)
+
+    return value
+
+
+def resolve(context: Any, db: Session = None, client: redis.Redis = None) -> Any:
+    """Context with references (whole or in top-level values) replaced by their data"""
+    context = _resolve_value(context, db, client)
+    if isinstance(context, dict):
+        return {key: _resolve_value(value, db, client) for key, value in context.items()}
+    return context
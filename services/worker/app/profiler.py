@@ -0,0 +1,324 @@
+"""
+HaroonNet ISP Platform - SQL Profiler
+Opt-in per-statement profiling of the worker engines with N+1 detection
+
+Enable with SQL_PROFILING_ENABLED=true. Each worker process writes its
+statistics to SQL_PROFILE_DIR; merge and print them with:
+    python -m app.profiler dump [--limit 20] [--task NAME] [--json]
+    python -m app.profiler reset
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Any, Optional, Tuple
+import logging
+from celery import current_task, signals
+from app import metrics
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FILE = 'sqlprofile-{pid}.json'
+
+# Latency histogram: bucket i holds durations up to BUCKET_BASE * BUCKET_GROWTH ** i seconds
+BUCKET_BASE = 0.0001
+BUCKET_GROWTH = 1.25
+
+# Most recent N+1 findings kept per worker process
+N_PLUS_ONE_KEPT = 1000
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+|\?")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\1)+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Statement text with literals and parameter markers replaced by ?"""
+    text = _STRING.sub('?', statement)
+    text = _NUMBER.sub('?', text)
+    text = _PLACEHOLDER.sub('?', text)
+    text = _IN_LIST.sub('IN (...)', text)
+    text = _VALUES_LIST.sub(r'VALUES \1, ...', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def bucket_index(seconds: float) -> int:
+    if seconds <= BUCKET_BASE:
+        return 0
+    return int(math.ceil(math.log(seconds / BUCKET_BASE, BUCKET_GROWTH)))
+
+
+def bucket_upper_bound(index: int) -> float:
+    return BUCKET_BASE * BUCKET_GROWTH ** index
+
+
+@dataclass
+class StatementStats:
+    """Execution figures for one statement fingerprint"""
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    rows: int = 0
+    buckets: Dict[int, int] = field(default_factory=dict)
+
+    def add(self, seconds: float, rows: int):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+        index = bucket_index(seconds)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other: 'StatementStats'):
+        self.count += other.count
+        self.total_seconds += other.total_seconds
+        self.max_seconds = max(self.max_seconds, other.max_seconds)
+        self.rows += other.rows
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the latency bucket containing the q-th percentile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(bucket_upper_bound(index), self.max_seconds)
+        return self.max_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'total_seconds': self.total_seconds,
+            'max_seconds': self.max_seconds,
+            'rows': self.rows,
+            'buckets': {str(index): count for index, count in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StatementStats':
+        return cls(
+            count=data['count'],
+            total_seconds=data['total_seconds'],
+            max_seconds=data['max_seconds'],
+            rows=data['rows'],
+            buckets={int(index): count for index, count in data['buckets'].items()},
+        )
+
+
+# (task, database, fingerprint)
+StatKey = Tuple[str, str, str]
+
+
+class SQLProfiler:
+    """Collects statement statistics per task and flags N+1 query patterns"""
+
+    def __init__(self, n_plus_one_threshold: int = None, profile_dir: str = None,
+                 flush_interval: float = 5.0):
+        self.n_plus_one_threshold = (
+            settings.SQL_PROFILE_N_PLUS_ONE_THRESHOLD if n_plus_one_threshold is None else n_plus_one_threshold
+        )
+        self.profile_dir = profile_dir or settings.SQL_PROFILE_DIR
+        self.flush_interval = flush_interval
+        self.stats: Dict[StatKey, StatementStats] = {}
+        # Fingerprint counts of the task runs in progress, by task id
+        self.task_runs: Dict[str, Counter] = {}
+        self.n_plus_one: Deque[Dict[str, Any]] = deque(maxlen=N_PLUS_ONE_KEPT)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def instrument(self, engine, database: str):
+        metrics.watch_queries(engine, database, self.observe)
+
+    def observe(self, database: str, statement: str, seconds: float, rows: Optional[int]):
+        # Failed statements are left out of the statistics
+        if rows is not None:
+            self.record(database, statement, seconds, rows)
+
+    def record(self, database: str, statement: str, seconds: float, rows: int,
+               task_name: str = None, task_id: str = None):
+        if task_name is None and current_task:
+            task_name, task_id = current_task.name, current_task.request.id
+        task_name = task_name or 'none'
+        key = (task_name, database, fingerprint(statement))
+
+        with self._lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                stats = self.stats[key] = StatementStats()
+            stats.add(seconds, rows)
+            if task_id:
+                self.task_runs.setdefault(task_id, Counter())[key] += 1
+
+    def start_task(self, task_id: str):
+        with self._lock:
+            self.task_runs[task_id] = Counter()
+
+    def finish_task(self, task_id: str) -> List[Dict[str, Any]]:
+        """Log statements repeated more than the threshold within one task run"""
+        with self._lock:
+            counts = self.task_runs.pop(task_id, Counter())
+
+        findings = []
+        for (task_name, database, statement), count in counts.most_common():
+            if count <= self.n_plus_one_threshold:
+                break
+            findings.append({'task': task_name, 'database': database, 'statement': statement,
+                             'executions': count, 'task_id': task_id})
+            logger.warning(
+                f"Possible N+1 in {task_name}: {count} executions of [{database}] {statement[:200]}"
+            )
+        with self._lock:
+            self.n_plus_one.extend(findings)
+
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return findings
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'statements': [
+                    {'task': task, 'database': database, 'statement': statement, **stats.to_dict()}
+                    for (task, database, statement), stats in self.stats.items()
+                ],
+                'n_plus_one': list(self.n_plus_one),
+            }
+
+    def flush(self):
+        """Write this process's statistics to the profile directory"""
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, PROFILE_FILE.format(pid=os.getpid()))
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(temp_path, path)
+            self._last_flush = time.monotonic()
+        except OSError as e:
+            logger.warning(f"Failed to write SQL profile: {str(e)}")
+
+
+def load_profiles(profile_dir: str) -> Tuple[Dict[StatKey, StatementStats], List[Dict[str, Any]]]:
+    """Merge the statistics written by every worker process"""
+    merged: Dict[StatKey, StatementStats] = {}
+    n_plus_one = []
+    for path in sorted(glob.glob(os.path.join(profile_dir, PROFILE_FILE.format(pid='*')))):
+        with open(path) as f:
+            data = json.load(f)
+        for entry in data['statements']:
+            key = (entry['task'], entry['database'], entry['statement'])
+            stats = StatementStats.from_dict(entry)
+            if key in merged:
+                merged[key].merge(stats)
+            else:
+                merged[key] = stats
+        n_plus_one.extend(data.get('n_plus_one', []))
+    return merged, n_plus_one
+
+
+def report(stats: Dict[StatKey, StatementStats], limit: int = 20, task: str = None) -> List[Dict[str, Any]]:
+    """Statements ranked by total time"""
+    rows = [
+        {
+            'task': key[0],
+            'database': key[1],
+            'statement': key[2],
+            'count': value.count,
+            'total_seconds': round(value.total_seconds, 4),
+            'mean_ms': round(value.total_seconds / value.count * 1000, 3) if value.count else 0.0,
+            'p99_ms': round(value.percentile(0.99) * 1000, 3),
+            'rows': value.rows,
+        }
+        for key, value in stats.items()
+        if task is None or key[0] == task
+    ]
+    rows.sort(key=lambda row: row['total_seconds'], reverse=True)
+    return rows[:limit]
+
+
+profiler: Optional[SQLProfiler] = None
+
+
+def install(app):
+    """Attach the profiler to the worker engines when SQL_PROFILING_ENABLED"""
+    global profiler
+    if not settings.SQL_PROFILING_ENABLED or profiler is not None:
+        return
+
+    from app.database import app_engine, radius_engine, app_replica_engine, radius_replica_engine
+    profiler = SQLProfiler()
+    profiler.instrument(app_engine, 'app')
+    profiler.instrument(radius_engine, 'radius')
+    if app_replica_engine is not None:
+        profiler.instrument(app_replica_engine, 'app_replica')
+    if radius_replica_engine is not None:
+        profiler.instrument(radius_replica_engine, 'radius_replica')
+
+    @signals.task_prerun.connect(weak=False)
+    def on_task_prerun(task_id=None, **kwargs):
+        profiler.start_task(task_id)
+
+    @signals.task_postrun.connect(weak=False)
+    def on_task_postrun(task_id=None, **kwargs):
+        profiler.finish_task(task_id)
+
+    @signals.worker_process_shutdown.connect(weak=False)
+    def on_worker_process_shutdown(**kwargs):
+        profiler.flush()
+
+    logger.info(f"SQL profiling enabled, writing to {profiler.profile_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker SQL profile')
+    parser.add_argument('command', choices=['dump', 'reset'])
+    parser.add_argument('--dir', default=settings.SQL_PROFILE_DIR, help='Profile directory')
+    parser.add_argument('--limit', type=int, default=20, help='Statements to show')
+    parser.add_argument('--task', help='Only statements run by this task')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+    args = parser.parse_args()
+
+    if args.command == 'reset':
+        for path in glob.glob(os.path.join(args.dir, PROFILE_FILE.format(pid='*'))):
+            os.remove(path)
+        print(f"Cleared SQL profiles in {args.dir}")
+        return
+
+    stats, n_plus_one = load_profiles(args.dir)
+    rows = report(stats, args.limit, args.task)
+
+    if args.json:
+        print(json.dumps({'statements': rows, 'n_plus_one': n_plus_one}, indent=2))
+        return
+
+    print(f"{'total s':>10} {'count':>8} {'mean ms':>9} {'p99 ms':>9} {'rows':>10}  task / statement")
+    for row in rows:
+        print(f"{row['total_seconds']:>10.3f} {row['count']:>8} {row['mean_ms']:>9.2f} "
+              f"{row['p99_ms']:>9.2f} {row['rows']:>10}  {row['task']} [{row['database']}]")
+        print(f"{'':>51}{row['statement'][:160]}")
+
+    if n_plus_one:
+        print(f"\nN+1 patterns ({len(n_plus_one)}):")
+        worst = sorted(n_plus_one, key=lambda finding: finding['executions'], reverse=True)
+        for finding in worst[:args.limit]:
+            print(f"  {finding['executions']:>6}x  {finding['task']} [{finding['database']}] "
+                  f"{finding['statement'][:120]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+HaroonNet ISP Platform - Retention Purge Engine
+Deletes expired rows in primary-key-ordered batches with throttling and
+resumable checkpoints
+"""
+
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Any, Optional, Tuple
+import logging
+import redis
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY = 'haroonnet:purge:checkpoint:{name}'
+
+
+@dataclass
+class PurgeJob:
+    """A retention rule for one table"""
+    name: str
+    table: str
+    key: str
+    date_column: str
+    cutoff: datetime
+    database: str = 'app'  # 'app' or 'radius'
+
+    @property
+    def replica_url(self) -> Optional[str]:
+        """Replica of the database the job deletes from, whose lag throttles it"""
+        return settings.RADIUS_DB_REPLICA_URL if self.database == 'radius' else settings.DB_REPLICA_URL
+
+
+@dataclass
+class PurgeResult:
+    """Outcome of a purge job run"""
+    name: str
+    deleted: int = 0
+    batches: int = 0
+    last_key: int = 0
+    throttled_seconds: float = 0.0
+    completed: bool = False
+    resumed: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'deleted': self.deleted,
+            'batches': self.batches,
+            'last_key': self.last_key,
+            'throttled_seconds': round(self.throttled_seconds, 2),
+            'completed': self.completed,
+            'resumed': self.resumed,
+        }
+
+
+class PurgeCheckpoints:
+    """Redis-backed purge progress so an interrupted run resumes where it stopped"""
+
+    def __init__(self, client: redis.Redis = None):
+        self.client = client or redis.Redis.from_url(settings.redis_url)
+
+    def load(self, name: str) -> Optional[Dict[str, Any]]:
+        data = self.client.get(CHECKPOINT_KEY.format(name=name))
+        return json.loads(data) if data else None
+
+    def save(self, name: str, cutoff: datetime, last_key: int):
+        self.client.set(
+            CHECKPOINT_KEY.format(name=name),
+            json.dumps({'cutoff': cutoff.isoformat(), 'last_key': last_key}),
+        )
+
+    def clear(self, name: str):
+        self.client.delete(CHECKPOINT_KEY.format(name=name))
+
+
+class PurgeThrottle:
+    """Backs off while replicas lag or InnoDB transactions are waiting on locks"""
+
+    def __init__(self, batch_sleep: float = None, max_lock_waits: int = None,
+                 max_replication_lag: int = None,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        self.batch_sleep = settings.PURGE_BATCH_SLEEP if batch_sleep is None else batch_sleep
+        self.max_lock_waits = settings.PURGE_MAX_LOCK_WAITS if max_lock_waits is None else max_lock_waits
+        self.max_replication_lag = (
+            settings.PURGE_MAX_REPLICATION_LAG if max_replication_lag is None else max_replication_lag
+        )
+        self.max_backoff = settings.PURGE_MAX_BACKOFF
+        self.sleep = sleep
+        self.clock = clock
+        self._replica_engines: Dict[str, Engine] = {}
+
+    def lock_waits(self, db: Session) -> int:
+        """Transactions currently blocked on a row lock"""
+        query = """
+        SELECT COUNT(*) as waiting
+        FROM information_schema.innodb_trx
+        WHERE trx_state = 'LOCK WAIT'
+        """
+        return db.execute(query).fetchone().waiting or 0
+
+    def replication_lag(self, replica_url: Optional[str]) -> Optional[int]:
+        """Replica lag in seconds, or None when no replica is configured"""
+        if not replica_url:
+            return None
+
+        engine = self._replica_engines.get(replica_url)
+        if engine is None:
+            engine = create_engine(replica_url, pool_size=1, max_overflow=0, pool_pre_ping=True)
+            self._replica_engines[replica_url] = engine
+
+        with engine.connect() as conn:
+            row = conn.exec_driver_sql("SHOW REPLICA STATUS").mappings().fetchone()
+
+        if not row:
+            return None
+        lag = row.get('Seconds_Behind_Source')
+        # NULL lag means replication is stopped; treat as maximally lagged
+        return lag if lag is not None else self.max_replication_lag + 1
+
+    def pressure(self, db: Session, replica_url: str = None) -> Optional[str]:
+        """Reason to hold off, if any"""
+        waits = self.lock_waits(db)
+        if waits > self.max_lock_waits:
+            return f"{waits} transactions waiting on locks"
+
+        lag = self.replication_lag(replica_url)
+        if lag is not None and lag > self.max_replication_lag:
+            return f"replication lag {lag}s"
+
+        return None
+
+    def wait(self, db: Session, deadline: float = None, replica_url: str = None) -> Tuple[float, bool]:
+        """Sleep between batches, backing off exponentially under pressure
+
+        Returns the seconds slept and whether the pressure cleared. Waiting stops
+        at deadline (a clock() value) so a stopped replica or lasting lock waits
+        cannot hold the run past its time budget. replica_url is the replica of
+        the database being purged.
+        """
+        slept = 0.0
+        delay = self.batch_sleep
+        self.sleep(delay)
+        slept += delay
+
+        reason = self.pressure(db, replica_url)
+        while reason:
+            delay = min(max(delay * 2, 1.0), self.max_backoff)
+            if deadline is not None:
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    logger.info(f"Purge throttled ({reason}) past its time budget")
+                    return slept, False
+                delay = min(delay, remaining)
+            logger.info(f"Purge throttled ({reason}), sleeping {delay:.1f}s")
+            self.sleep(delay)
+            slept += delay
+            reason = self.pressure(db, replica_url)
+
+        return slept, True
+
+
+class PurgeEngine:
+    """Deletes rows older than a cutoff in primary-key-ordered batches"""
+
+    def __init__(self, batch_size: int = None, max_runtime: float = None,
+                 checkpoints: PurgeCheckpoints = None, throttle: PurgeThrottle = None):
+        self.batch_size = batch_size or settings.PURGE_BATCH_SIZE
+        self.max_runtime = settings.PURGE_MAX_RUNTIME if max_runtime is None else max_runtime
+        self.checkpoints = checkpoints or PurgeCheckpoints()
+        self.throttle = throttle or PurgeThrottle()
+
+    def cutoff_key(self, db: Session, job: PurgeJob, cutoff: datetime) -> int:
+        """Highest key of an expired row; no batch needs to look past it"""
+        query = f"""
+        SELECT MAX({job.key}) as cutoff_key
+        FROM {job.table}
+        WHERE {job.date_column} < %s
+        """
+        return db.execute(query, (cutoff,)).fetchone().cutoff_key or 0
+
+    def next_batch_bounds(self, db: Session, job: PurgeJob, after_key: int, cutoff: datetime,
+                          cutoff_key: int):
+        """First and last key of the next batch of expired rows"""
+        query = f"""
+        SELECT MIN({job.key}) as first_key, MAX({job.key}) as last_key, COUNT(*) as row_count
+        FROM (
+            SELECT {job.key}
+            FROM {job.table}
+            WHERE {job.key} > %s
+            AND {job.key} <= %s
+            AND {job.date_column} < %s
+            ORDER BY {job.key}
+            LIMIT %s
+        ) batch
+        """
+        return db.execute(query, (after_key, cutoff_key, cutoff, self.batch_size)).fetchone()
+
+    def run(self, db: Session, job: PurgeJob, started: float = None) -> PurgeResult:
+        """Purge one table, resuming from a saved checkpoint"""
+        started = started or time.monotonic()
+        result = PurgeResult(name=job.name)
+        cutoff = job.cutoff
+        after_key = 0
+
+        checkpoint = self.checkpoints.load(job.name)
+        if checkpoint:
+            # Finish the interrupted run against its original cutoff
+            cutoff = datetime.fromisoformat(checkpoint['cutoff'])
+            after_key = checkpoint['last_key']
+            result.resumed = True
+            logger.info(f"Resuming purge of {job.table} after {job.key}={after_key}")
+
+        deadline = started + self.max_runtime if self.max_runtime else None
+        cutoff_key = self.cutoff_key(db, job, cutoff)
+
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                logger.info(f"Purge of {job.table} paused at {job.key}={after_key}: time budget used")
+                break
+
+            bounds = None
+            if after_key < cutoff_key:
+                bounds = self.next_batch_bounds(db, job, after_key, cutoff, cutoff_key)
+            if not bounds or not bounds.row_count:
+                result.completed = True
+                self.checkpoints.clear(job.name)
+                break
+
+            delete_query = f"""
+            DELETE FROM {job.table}
+            WHERE {job.key} BETWEEN %s AND %s
+            AND {job.date_column} < %s
+            """
+            deleted = db.execute(delete_query, (bounds.first_key, bounds.last_key, cutoff)).rowcount
+            db.commit()
+
+            after_key = bounds.last_key
+            result.deleted += deleted
+            result.batches += 1
+            result.last_key = after_key
+            self.checkpoints.save(job.name, cutoff, after_key)
+
+            slept, ready = self.throttle.wait(db, deadline, job.replica_url)
+            result.throttled_seconds += slept
+            if not ready:
+                logger.info(f"Purge of {job.table} paused at {job.key}={after_key}: throttled past time budget")
+                break
+
+        logger.info(
+            f"Purged {result.deleted} rows from {job.table} in {result.batches} batches"
+            f"{'' if result.completed else ' (incomplete)'}"
+        )
+
+        return result
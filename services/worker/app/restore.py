@@ -0,0 +1,148 @@
+"""
+HaroonNet ISP Platform - RADIUS Archive Restore
+Replays a base dump plus archived radacct/radpostauth chunks and tails into MySQL
+
+Usage:
+    python -m app.restore --manifest /app/backups/archive/manifest.json [--database radius_restore] [--dry-run]
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import subprocess
+import sys
+from dataclasses import replace
+from typing import List
+import logging
+from app.archive import ArchiveManifest
+from app.backup import STREAM_CHUNK_SIZE, default_targets, write_defaults_file
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+class RestoreError(Exception):
+    """Raised when an archive file is missing, corrupt or fails to load"""
+
+
+def open_backup(path: str):
+    """Open a backup file for streaming decompressed reads"""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RestoreError(f"zstandard is required to restore {path}")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def verify_checksum(path: str, checksum: str):
+    """Compare a stored file against its manifest checksum"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+            digest.update(block)
+    if digest.hexdigest() != checksum:
+        raise RestoreError(f"Checksum mismatch for {path}")
+
+
+def restore_plan(manifest: ArchiveManifest) -> List[dict]:
+    """Files to replay, in order: archived table schema, mutable tables, chunks, tails
+
+    Chunks archived after the base are left out: their rows are in its tails.
+    """
+    base = manifest.latest_base()
+    if not base:
+        raise RestoreError("No complete base dump found in manifest")
+
+    archive_dir = os.path.dirname(manifest.path)
+    order = {'radius_schema': 0, 'radius': 1}
+    files = sorted(base['files'], key=lambda entry: order.get(entry['backup_type'], 2))
+    plan = [entry for entry in files if not entry['backup_type'].endswith('_tail')]
+    after_ids = base.get('after_ids', {})
+
+    for chunk in manifest.chunks():
+        if chunk['last_id'] > after_ids.get(chunk['table'], chunk['last_id']):
+            continue
+        plan.append({
+            'file': os.path.join(archive_dir, chunk['file']),
+            'checksum': chunk['checksum'],
+            'backup_type': f"{chunk['table']}_chunk",
+        })
+
+    plan.extend(entry for entry in files if entry['backup_type'].endswith('_tail'))
+    return plan
+
+
+def replay(path: str, defaults_file: str, database: str):
+    """Stream one decompressed dump into the mysql client"""
+    proc = subprocess.Popen(
+        ['mysql', f'--defaults-extra-file={defaults_file}', database],
+        stdin=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        with open_backup(path) as source:
+            for block in iter(lambda: source.read(STREAM_CHUNK_SIZE), b''):
+                proc.stdin.write(block)
+    finally:
+        proc.stdin.close()
+        stderr = proc.stderr.read().decode(errors='replace')
+        returncode = proc.wait()
+
+    if returncode != 0:
+        raise RestoreError(f"Restore of {path} failed: {stderr}")
+
+
+def restore(manifest_path: str, database: str = None, dry_run: bool = False) -> int:
+    """Verify and replay the archive, returning the number of files loaded"""
+    manifest = ArchiveManifest.load(manifest_path)
+    plan = restore_plan(manifest)
+    target = next(target for target in default_targets() if target.backup_type == 'radius')
+    target = replace(target, database=database or manifest.data['database'])
+
+    for entry in plan:
+        if not os.path.exists(entry['file']):
+            raise RestoreError(f"Missing archive file: {entry['file']}")
+        verify_checksum(entry['file'], entry['checksum'])
+
+    if dry_run:
+        for entry in plan:
+            print(f"{entry['backup_type']:<20} {entry['file']}")
+        return 0
+
+    defaults_file = write_defaults_file(target)
+    try:
+        for index, entry in enumerate(plan, start=1):
+            logger.info(f"Restoring {index}/{len(plan)}: {entry['file']}")
+            replay(entry['file'], defaults_file, target.database)
+    finally:
+        os.remove(defaults_file)
+
+    return len(plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Restore RADIUS base dump and archived chunks')
+    parser.add_argument('--manifest', required=True, help='Path to the archive manifest.json')
+    parser.add_argument('--database', help='Target database (defaults to the archived database)')
+    parser.add_argument('--dry-run', action='store_true', help='Verify checksums and list files only')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    try:
+        restored = restore(args.manifest, database=args.database, dry_run=args.dry_run)
+        logger.info(f"Restore finished: {restored} files replayed")
+    except RestoreError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
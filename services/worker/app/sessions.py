@@ -0,0 +1,106 @@
+"""
+HaroonNet ISP Platform - Session Management
+Task-scoped database sessions shared across helpers, with read-replica
+routing for reporting and statistics queries
+
+Every DatabaseTask runs inside task_scope(). Within it, app_session(),
+radius_session() and read_session() return the same session for the
+whole task run, and all of them are closed when the task finishes.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+import logging
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from app.database import app_engine, radius_engine, app_replica_engine, radius_replica_engine
+from app.metrics import DB_POOL_WAIT
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_ENGINES: Dict[str, Engine] = {
+    'app': app_engine,
+    'radius': radius_engine,
+}
+
+REPLICA_ENGINES: Dict[str, Optional[Engine]] = {
+    'app': app_replica_engine,
+    'radius': radius_replica_engine,
+}
+
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+# (database, role) -> session for the task run in progress
+_scope: ContextVar[Optional[Dict[Tuple[str, str], Session]]] = ContextVar('haroonnet_db_scope', default=None)
+
+
+def engine_for(database: str, read_only: bool = False) -> Tuple[Engine, str]:
+    """Engine and role ('primary' or 'replica') serving a database"""
+    if read_only and REPLICA_ENGINES.get(database) is not None:
+        return REPLICA_ENGINES[database], 'replica'
+    return PRIMARY_ENGINES[database], 'primary'
+
+
+def open_session(database: str, read_only: bool = False) -> Session:
+    """New session with its connection checked out, recording the pool wait"""
+    engine, role = engine_for(database, read_only)
+    session = _session_factory(bind=engine)
+    started = time.perf_counter()
+    try:
+        # Includes the pre-ping round trip on a pooled connection
+        session.connection()
+    except Exception:
+        session.close()
+        raise
+    DB_POOL_WAIT.labels(database, role).observe(time.perf_counter() - started)
+    return session
+
+
+@contextmanager
+def task_scope() -> Iterator[Dict[Tuple[str, str], Session]]:
+    """Share sessions for the duration of a task; nested scopes reuse the outer one"""
+    sessions = _scope.get()
+    if sessions is not None:
+        yield sessions
+        return
+
+    sessions = {}
+    token = _scope.set(sessions)
+    try:
+        yield sessions
+    finally:
+        _scope.reset(token)
+        for session in sessions.values():
+            try:
+                session.close()
+            except Exception as e:
+                logger.warning(f"Failed to close session: {str(e)}")
+
+
+def get_session(database: str, read_only: bool = False) -> Session:
+    """The current task's session for a database, opened on first use"""
+    sessions = _scope.get()
+    if sessions is None:
+        raise RuntimeError("No task scope is active; wrap the call in task_scope()")
+
+    _, role = engine_for(database, read_only)
+    key = (database, role)
+    session = sessions.get(key)
+    if session is None:
+        session = sessions[key] = open_session(database, read_only)
+    return session
+
+
+def app_session() -> Session:
+    return get_session('app')
+
+
+def radius_session() -> Session:
+    return get_session('radius')
+
+
+def read_session(database: str = 'app') -> Session:
+    """Session for read-only reporting queries; the replica when configured"""
+    return get_session(database, read_only=True)
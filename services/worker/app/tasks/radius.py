@@ -3,16 +3,20 @@ HaroonNet ISP Platform - RADIUS Tasks
 Background tasks for CoA, usage tracking, and quota management
 """
 
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict
 import logging
-from pyrad import dictionary, packet
-from pyrad.client import Client
-from pyrad.dictionary import Dictionary
 from celery import Task
 from sqlalchemy.orm import Session
 from app.celery import celery
-from app.database import get_app_db, get_radius_db
+from app.sessions import task_scope, app_session, radius_session
+from app.clients import coa_client
+from app.accounting import (AccountingStream, apply_usage, claim_quota_action, compute_deltas, entry_key,
+                            parse_event, release_quota_action)
+from app.usage_buckets import rollup_daily
+from app.locks import LeaseLost, ensure_lease, singleton, task_lease
+from app.backpressure import notify
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -21,22 +25,28 @@ logger = logging.getLogger(__name__)
 class DatabaseTask(Task):
     """Base task class with database session management"""
 
+    # run() also takes the injected session(s), so skip signature checks at call time
+    typing = False
+
     def __call__(self, *args, **kwargs):
-        app_db = next(get_app_db())
-        radius_db = next(get_radius_db())
-        try:
-            return self.run_with_db(app_db, radius_db, *args, **kwargs)
-        finally:
-            app_db.close()
-            radius_db.close()
+        # A skipped singleton tick returns before any session is opened
+        with task_lease(self) as skipped:
+            if skipped:
+                return skipped
+            with task_scope():
+                return self.run_with_db(app_session(), radius_session(), *args, **kwargs)
 
     def run_with_db(self, app_db: Session, radius_db: Session, *args, **kwargs):
-        return self.run(*args, **kwargs)
+        return self.run(app_db, radius_db, *args, **kwargs)
 
 
 @celery.task(bind=True, base=DatabaseTask)
+@singleton(missed='coalesce')
 def update_usage_aggregates(self, app_db: Session, radius_db: Session):
     """Update usage aggregates from RADIUS accounting data"""
+    if settings.ACCOUNTING_SOURCE == 'stream':
+        return rollup_usage_aggregates(app_db)
+
     logger.info("Updating usage aggregates")
 
     try:
@@ -120,6 +130,8 @@ def update_usage_aggregates(self, app_db: Session, radius_db: Session):
                 logger.error(f"Failed to update usage for {usage.username}: {str(e)}")
                 continue
 
+        # An overlapping run would add the same accounting rows twice
+        ensure_lease()
         app_db.commit()
 
         logger.info(f"Updated {updated_count} usage aggregates")
@@ -136,130 +148,252 @@ def update_usage_aggregates(self, app_db: Session, radius_db: Session):
         raise
 
 
+def rollup_usage_aggregates(app_db: Session):
+    """Daily usage aggregates from the hourly buckets of the days still receiving deltas"""
+    logger.info("Rolling up usage aggregates from hourly buckets")
+
+    try:
+        today = datetime.now().date()
+        # Entries queued before midnight may be applied after it
+        updated_count = sum(rollup_daily(app_db, day) for day in (today - timedelta(days=1), today))
+
+        ensure_lease()
+        app_db.commit()
+
+        logger.info(f"Rolled up usage aggregates ({updated_count} rows affected)")
+
+        return {
+            'status': 'completed',
+            'source': 'usage_hourly',
+            'updated_count': updated_count
+        }
+
+    except Exception as e:
+        app_db.rollback()
+        logger.error(f"Usage aggregate rollup failed: {str(e)}")
+        raise
+
+
+@celery.task(bind=True, base=DatabaseTask)
+@singleton(missed='skip')
+def consume_accounting_stream(self, app_db: Session, radius_db: Session):
+    """Apply accounting events from the Redis stream in batches until the time budget runs out"""
+    if settings.ACCOUNTING_SOURCE != 'stream':
+        return {'status': 'skipped', 'reason': 'accounting_source_radacct'}
+
+    stream = AccountingStream()
+    stream.ensure_group()
+    deadline = time.monotonic() + settings.ACCOUNTING_RUN_SECONDS
+    totals = {'events': 0, 'batches': 0, 'invalid': 0, 'usage_rows': 0, 'subscriptions': 0,
+              'unknown_users': 0, 'quota_crossings': 0}
+
+    try:
+        # Entries up to here were applied by a run that died before acknowledging them
+        applied = stream.last_applied(app_db)
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining < 0.05:
+                break
+            # BLOCK 0 would wait forever on an idle stream
+            entries = stream.read(settings.ACCOUNTING_BATCH_SIZE, max(1, int(min(remaining, 1) * 1000)))
+            if not entries:
+                continue
+
+            events = [parse_event(entry_id, fields) for entry_id, fields in entries]
+            valid = [event for event in events if event]
+            if len(valid) < len(events):
+                logger.warning(f"Dropping {len(events) - len(valid)} malformed accounting entries")
+
+            counters = stream.load_counters(event.session_id for event in valid if event.session_id)
+            usage, counters = compute_deltas(valid, counters, applied)
+            stats, crossed = apply_usage(app_db, usage)
+            last_id = entries[-1][0]
+            if applied is None or entry_key(last_id) > entry_key(applied):
+                applied = last_id
+                stream.record_applied(app_db, applied)
+
+            # Another run would read the same pending entries
+            ensure_lease()
+            app_db.commit()
+            stream.acknowledge([entry_id for entry_id, _ in entries], counters)
+
+            if crossed:
+                # Enforce within seconds instead of at the next half-hourly check
+                enforce_quota_limits.delay(crossed)
+
+            totals['events'] += len(valid)
+            totals['invalid'] += len(events) - len(valid)
+            totals['batches'] += 1
+            for key, value in stats.items():
+                totals[key] += value
+
+        logger.info(f"Applied {totals['events']} accounting events in {totals['batches']} batches")
+
+        return {'status': 'completed', **totals}
+
+    except Exception as e:
+        app_db.rollback()
+        logger.error(f"Accounting stream consumption failed: {str(e)}")
+        raise
+
+
+QUOTA_QUERY = """
+SELECT s.id, s.customer_id, s.username, s.monthly_quota, s.used_quota,
+       p.name as plan_name, p.fup_enabled, p.fup_limit, p.fup_speed_down, p.fup_speed_up,
+       c.email, c.first_name, c.last_name
+FROM subscriptions s
+JOIN service_plans p ON s.plan_id = p.id
+JOIN customers c ON s.customer_id = c.id
+WHERE s.status = 'active'
+AND s.monthly_quota IS NOT NULL
+AND s.monthly_quota > 0
+"""
+
+
 @celery.task(bind=True, base=DatabaseTask)
+@singleton(missed='skip')
 def check_quota_limits(self, app_db: Session, radius_db: Session):
     """Check quota limits and apply FUP or suspension"""
     logger.info("Checking quota limits")
 
     try:
         # Get subscriptions with quotas
-        quota_query = """
-        SELECT s.id, s.customer_id, s.username, s.monthly_quota, s.used_quota,
-               p.name as plan_name, p.fup_enabled, p.fup_limit, p.fup_speed_down, p.fup_speed_up,
-               c.email, c.first_name, c.last_name
-        FROM subscriptions s
-        JOIN service_plans p ON s.plan_id = p.id
-        JOIN customers c ON s.customer_id = c.id
-        WHERE s.status = 'active'
-        AND s.monthly_quota IS NOT NULL
-        AND s.monthly_quota > 0
-        """
+        result = app_db.execute(QUOTA_QUERY)
+        counts = _enforce_quotas(app_db, result.fetchall())
 
-        result = app_db.execute(quota_query)
-        subscriptions = result.fetchall()
+        ensure_lease()
+        app_db.commit()
 
-        quota_warnings = 0
-        quota_exceeded = 0
-        fup_applied = 0
+        logger.info(f"Quota check completed: {counts['quota_warnings']} warnings, "
+                    f"{counts['quota_exceeded']} exceeded, {counts['fup_applied']} FUP applied")
 
-        for subscription in subscriptions:
-            try:
-                quota_used_percent = (subscription.used_quota or 0) / subscription.monthly_quota
-
-                # Check if quota warning threshold reached
-                if quota_used_percent >= settings.QUOTA_WARNING_THRESHOLD:
-                    if quota_used_percent < 1.0:  # Not yet exceeded
-                        # Send quota warning
-                        from app.tasks.notifications import send_email_notification
-                        send_email_notification.delay(
-                            subscription.email,
-                            'quota_warning',
-                            {
-                                'customer_name': subscription.first_name,
-                                'plan_name': subscription.plan_name,
-                                'used_quota': self._format_bytes(subscription.used_quota),
-                                'total_quota': self._format_bytes(subscription.monthly_quota),
-                                'percentage': int(quota_used_percent * 100)
-                            }
-                        )
-                        quota_warnings += 1
-
-                # Check if quota exceeded
-                if quota_used_percent >= 1.0:
-                    quota_exceeded += 1
-
-                    if subscription.fup_enabled and subscription.fup_limit:
-                        # Apply FUP (throttling)
-                        fup_rate_limit = f"{subscription.fup_speed_down}M/{subscription.fup_speed_up}M"
-                        send_coa_rate_limit.delay(subscription.username, fup_rate_limit)
-                        fup_applied += 1
-
-                        # Send FUP notification
-                        from app.tasks.notifications import send_email_notification
-                        send_email_notification.delay(
-                            subscription.email,
-                            'fup_applied',
-                            {
-                                'customer_name': subscription.first_name,
-                                'plan_name': subscription.plan_name,
-                                'new_speed': f"{subscription.fup_speed_down}Mbps"
-                            }
-                        )
-                    else:
-                        # Suspend service
-                        send_coa_disconnect.delay(subscription.username)
-
-                        # Update subscription status
-                        suspend_query = """
-                        UPDATE subscriptions
-                        SET status = 'suspended', suspension_date = CURDATE()
-                        WHERE id = %s
-                        """
-                        app_db.execute(suspend_query, (subscription.id,))
-
-                        # Send suspension notification
-                        from app.tasks.notifications import send_email_notification
-                        send_email_notification.delay(
-                            subscription.email,
-                            'quota_exceeded',
-                            {
-                                'customer_name': subscription.first_name,
-                                'plan_name': subscription.plan_name,
-                                'used_quota': self._format_bytes(subscription.used_quota),
-                                'total_quota': self._format_bytes(subscription.monthly_quota)
-                            }
-                        )
+        return {'status': 'completed', **counts}
 
-            except Exception as e:
-                logger.error(f"Failed to check quota for subscription {subscription.id}: {str(e)}")
-                continue
+    except Exception as e:
+        app_db.rollback()
+        logger.error(f"Quota check failed: {str(e)}")
+        raise
 
-        app_db.commit()
 
-        logger.info(f"Quota check completed: {quota_warnings} warnings, {quota_exceeded} exceeded, {fup_applied} FUP applied")
+@celery.task(bind=True, base=DatabaseTask)
+def enforce_quota_limits(self, app_db: Session, radius_db: Session, subscription_ids: List[int]):
+    """Apply quota actions to the subscriptions an accounting batch pushed over a threshold"""
+    if not subscription_ids:
+        return {'status': 'completed', 'quota_warnings': 0, 'quota_exceeded': 0, 'fup_applied': 0}
 
-        return {
-            'status': 'completed',
-            'quota_warnings': quota_warnings,
-            'quota_exceeded': quota_exceeded,
-            'fup_applied': fup_applied
-        }
+    try:
+        query = QUOTA_QUERY + f"AND s.id IN ({', '.join(['%s'] * len(subscription_ids))})"
+        result = app_db.execute(query, tuple(subscription_ids))
+        counts = _enforce_quotas(app_db, result.fetchall())
+        app_db.commit()
+
+        return {'status': 'completed', **counts}
 
     except Exception as e:
         app_db.rollback()
-        logger.error(f"Quota check failed: {str(e)}")
+        logger.error(f"Quota enforcement failed for {len(subscription_ids)} subscriptions: {str(e)}")
         raise
 
-    def _format_bytes(self, bytes_value):
-        """Format bytes to human readable format"""
-        if not bytes_value:
-            return "0 B"
 
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if bytes_value < 1024.0:
-                return f"{bytes_value:.1f} {unit}"
-            bytes_value /= 1024.0
-        return f"{bytes_value:.1f} PB"
+def _enforce_quotas(app_db: Session, subscriptions) -> Dict[str, int]:
+    """Send each subscription's quota warning, FUP or suspension once per quota month"""
+    quota_warnings = 0
+    quota_exceeded = 0
+    fup_applied = 0
+
+    for subscription in subscriptions:
+        claimed = None
+        try:
+            quota_used_percent = (subscription.used_quota or 0) / subscription.monthly_quota
+
+            # Check if quota warning threshold reached
+            if settings.QUOTA_WARNING_THRESHOLD <= quota_used_percent < 1.0:
+                if claim_quota_action(subscription.id, 'warning'):
+                    claimed = 'warning'
+                    # Send quota warning
+                    notify(
+                        app_db,
+                        'email',
+                        subscription.email,
+                        'quota_warning',
+                        {
+                            'customer_name': subscription.first_name,
+                            'plan_name': subscription.plan_name,
+                            'used_quota': _format_bytes(subscription.used_quota),
+                            'total_quota': _format_bytes(subscription.monthly_quota),
+                            'percentage': int(quota_used_percent * 100)
+                        }
+                    )
+                    quota_warnings += 1
+
+            # Check if quota exceeded
+            if quota_used_percent >= 1.0:
+                quota_exceeded += 1
+
+                if subscription.fup_enabled and subscription.fup_limit:
+                    if not claim_quota_action(subscription.id, 'fup'):
+                        continue
+                    claimed = 'fup'
+
+                    # Apply FUP (throttling)
+                    fup_rate_limit = f"{subscription.fup_speed_down}M/{subscription.fup_speed_up}M"
+                    ensure_lease()
+                    send_coa_rate_limit.delay(subscription.username, fup_rate_limit)
+                    fup_applied += 1
+
+                    # Send FUP notification
+                    notify(
+                        app_db,
+                        'email',
+                        subscription.email,
+                        'fup_applied',
+                        {
+                            'customer_name': subscription.first_name,
+                            'plan_name': subscription.plan_name,
+                            'new_speed': f"{subscription.fup_speed_down}Mbps"
+                        }
+                    )
+                else:
+                    if not claim_quota_action(subscription.id, 'suspend'):
+                        continue
+                    claimed = 'suspend'
+
+                    # Suspend service
+                    ensure_lease()
+                    send_coa_disconnect.delay(subscription.username)
+
+                    # Update subscription status
+                    suspend_query = """
+                    UPDATE subscriptions
+                    SET status = 'suspended', suspension_date = CURDATE()
+                    WHERE id = %s
+                    """
+                    app_db.execute(suspend_query, (subscription.id,))
+
+                    # Send suspension notification
+                    notify(
+                        app_db,
+                        'email',
+                        subscription.email,
+                        'quota_exceeded',
+                        {
+                            'customer_name': subscription.first_name,
+                            'plan_name': subscription.plan_name,
+                            'used_quota': _format_bytes(subscription.used_quota),
+                            'total_quota': _format_bytes(subscription.monthly_quota)
+                        }
+                    )
+
+        except LeaseLost:
+            raise
+        except Exception as e:
+            if claimed:
+                release_quota_action(subscription.id, claimed)
+            logger.error(f"Failed to check quota for subscription {subscription.id}: {str(e)}")
+            continue
+
+    return {'quota_warnings': quota_warnings, 'quota_exceeded': quota_exceeded, 'fup_applied': fup_applied}
 
 
 @celery.task(bind=True, base=DatabaseTask)
@@ -319,6 +453,27 @@ def reset_monthly_quotas(self, app_db: Session, radius_db: Session):
         raise
 
 
+def _format_bytes(bytes_value):
+    """Format bytes to human readable format"""
+    if not bytes_value:
+        return "0 B"
+
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if bytes_value < 1024.0:
+            return f"{bytes_value:.1f} {unit}"
+        bytes_value /= 1024.0
+    return f"{bytes_value:.1f} PB"
+
+
+def dispatch_coa(nas_ip: str, secret: str, code: int, attributes: Dict[str, str]) -> int:
+    """Send one CoA or Disconnect request to a NAS and return the reply code"""
+    client = coa_client(nas_ip, secret.encode())
+    req = client.CreateCoAPacket(code=code)
+    for name, value in attributes.items():
+        req[name] = value
+    return client.SendPacket(req).code
+
+
 @celery.task
 def send_coa_disconnect(username: str):
     """Send CoA Disconnect-Request to terminate user session"""
@@ -326,10 +481,9 @@ def send_coa_disconnect(username: str):
 
     try:
         # Get NAS information for the user
-        app_db = next(get_app_db())
-        radius_db = next(get_radius_db())
+        with task_scope():
+            radius_db = radius_session()
 
-        try:
             # Find active session
             session_query = """
             SELECT nasipaddress, acctsessionid, framedipaddress
@@ -358,34 +512,20 @@ def send_coa_disconnect(username: str):
                 logger.error(f"NAS not found: {session.nasipaddress}")
                 return {'status': 'nas_not_found', 'nas_ip': session.nasipaddress}
 
-            # Create RADIUS client
-            client = Client(
-                server=session.nasipaddress,
-                secret=nas.secret.encode(),
-                dict=Dictionary("dictionary")
-            )
-
-            # Create Disconnect-Request packet
-            req = client.CreateCoAPacket(code=packet.DisconnectRequest)
-            req["User-Name"] = username
-            req["Acct-Session-Id"] = session.acctsessionid
+            # Send Disconnect-Request
+            from pyrad import packet
+            attributes = {"User-Name": username, "Acct-Session-Id": session.acctsessionid}
             if session.framedipaddress:
-                req["Framed-IP-Address"] = session.framedipaddress
+                attributes["Framed-IP-Address"] = session.framedipaddress
+            reply_code = dispatch_coa(session.nasipaddress, nas.secret, packet.DisconnectRequest, attributes)
 
-            # Send CoA request
-            reply = client.SendPacket(req)
-
-            if reply.code == packet.DisconnectACK:
+            if reply_code == packet.DisconnectACK:
                 logger.info(f"CoA disconnect successful for user: {username}")
                 return {'status': 'success', 'username': username}
             else:
                 logger.error(f"CoA disconnect failed for user: {username}")
                 return {'status': 'failed', 'username': username}
 
-        finally:
-            app_db.close()
-            radius_db.close()
-
     except Exception as e:
         logger.error(f"CoA disconnect error for user {username}: {str(e)}")
         return {'status': 'error', 'username': username, 'error': str(e)}
@@ -398,10 +538,9 @@ def send_coa_rate_limit(username: str, rate_limit: str):
 
     try:
         # Get NAS information for the user
-        app_db = next(get_app_db())
-        radius_db = next(get_radius_db())
+        with task_scope():
+            radius_db = radius_session()
 
-        try:
             # Find active session
             session_query = """
             SELECT nasipaddress, acctsessionid, framedipaddress
@@ -430,33 +569,22 @@ def send_coa_rate_limit(username: str, rate_limit: str):
                 logger.error(f"NAS not found: {session.nasipaddress}")
                 return {'status': 'nas_not_found', 'nas_ip': session.nasipaddress}
 
-            # Create RADIUS client
-            client = Client(
-                server=session.nasipaddress,
-                secret=nas.secret.encode(),
-                dict=Dictionary("dictionary")
-            )
-
-            # Create CoA-Request packet
-            req = client.CreateCoAPacket(code=packet.CoARequest)
-            req["User-Name"] = username
-            req["Acct-Session-Id"] = session.acctsessionid
-            req["Mikrotik-Rate-Limit"] = rate_limit
+            # Send CoA-Request
+            from pyrad import packet
+            attributes = {
+                "User-Name": username,
+                "Acct-Session-Id": session.acctsessionid,
+                "Mikrotik-Rate-Limit": rate_limit,
+            }
+            reply_code = dispatch_coa(session.nasipaddress, nas.secret, packet.CoARequest, attributes)
 
-            # Send CoA request
-            reply = client.SendPacket(req)
-
-            if reply.code == packet.CoAACK:
+            if reply_code == packet.CoAACK:
                 logger.info(f"CoA rate limit change successful for user: {username}")
                 return {'status': 'success', 'username': username, 'rate_limit': rate_limit}
             else:
                 logger.error(f"CoA rate limit change failed for user: {username}")
                 return {'status': 'failed', 'username': username}
 
-        finally:
-            app_db.close()
-            radius_db.close()
-
     except Exception as e:
         logger.error(f"CoA rate limit error for user {username}: {str(e)}")
         return {'status': 'error', 'username': username, 'error': str(e)}
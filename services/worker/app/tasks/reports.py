@@ -10,7 +10,8 @@ import json
 from celery import Task
 from sqlalchemy.orm import Session
 from app.celery import celery
-from app.database import get_app_db, get_radius_db
+from app.sessions import task_scope, app_session, read_session
+from app.payloads import report_ref
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -19,17 +20,16 @@ logger = logging.getLogger(__name__)
 class DatabaseTask(Task):
     """Base task class with database session management"""
 
+    # run() also takes the injected session(s), so skip signature checks at call time
+    typing = False
+
     def __call__(self, *args, **kwargs):
-        app_db = next(get_app_db())
-        radius_db = next(get_radius_db())
-        try:
-            return self.run_with_db(app_db, radius_db, *args, **kwargs)
-        finally:
-            app_db.close()
-            radius_db.close()
+        # Report queries read from the replicas when configured
+        with task_scope():
+            return self.run_with_db(read_session('app'), read_session('radius'), *args, **kwargs)
 
     def run_with_db(self, app_db: Session, radius_db: Session, *args, **kwargs):
-        return self.run(*args, **kwargs)
+        return self.run(app_db, radius_db, *args, **kwargs)
 
 
 @celery.task(bind=True, base=DatabaseTask)
@@ -119,10 +119,10 @@ def generate_daily_reports(self, app_db: Session, radius_db: Session):
         reports['support'] = dict(result.fetchone())
 
         # Save daily report
-        self._save_report(app_db, 'daily', report_date, reports)
+        report_id = _save_report(app_session(), 'daily', report_date, reports)
 
         # Send report via email if configured
-        self._send_daily_report_email(reports, report_date)
+        _send_daily_report_email(reports, report_date, report_id)
 
         logger.info(f"Daily reports generated for {report_date}")
 
@@ -233,7 +233,7 @@ def generate_weekly_reports(self, app_db: Session, radius_db: Session):
         reports['network_performance'] = dict(result.fetchone())
 
         # Save weekly report
-        self._save_report(app_db, 'weekly', week_start, reports)
+        _save_report(app_session(), 'weekly', week_start, reports)
 
         logger.info(f"Weekly reports generated for week {week_start} to {week_end}")
 
@@ -313,24 +313,14 @@ def generate_monthly_reports(self, app_db: Session, radius_db: Session):
         result = app_db.execute(usage_stats_query, (first_day_previous, last_day_previous))
         reports['usage_statistics'] = dict(result.fetchone())
 
-        # Plan performance analysis
-        plan_analysis_query = """
-        SELECT
-            p.name as plan_name,
-            p.monthly_fee,
-            COUNT(s.id) as total_subscribers,
-            COUNT(CASE WHEN s.status = 'active' THEN 1 END) as active_subscribers,
-            SUM(CASE WHEN s.status = 'active' THEN p.monthly_fee ELSE 0 END) as monthly_revenue,
-            AVG(ua.total_octets) as avg_usage_per_user
-        FROM service_plans p
-        LEFT JOIN subscriptions s ON p.id = s.plan_id
-        LEFT JOIN usage_aggregates ua ON s.customer_id = ua.customer_id
-            AND ua.date BETWEEN %s AND %s
-        GROUP BY p.id, p.name, p.monthly_fee
-        ORDER BY monthly_revenue DESC
-        """
-        result = app_db.execute(plan_analysis_query, (first_day_previous, last_day_previous))
-        reports['plan_analysis'] = [dict(row) for row in result.fetchall()]
+        # Plan performance analysis (columnar, avoids the plan/usage join fan-out)
+        # numpy/pandas are only loaded by workers that build monthly reports
+        from app.analytics import monthly_plan_analysis
+        plan_stats = monthly_plan_analysis(
+            app_db, first_day_previous, last_day_previous, top_n=settings.REPORT_TOP_USERS
+        )
+        reports['plan_analysis'] = plan_stats['plan_analysis']
+        reports['top_users'] = plan_stats['top_users']
 
         # Network performance summary
         network_summary_query = """
@@ -369,13 +359,13 @@ def generate_monthly_reports(self, app_db: Session, radius_db: Session):
         reports['support_analysis'] = dict(support_data) if support_data else {}
 
         # Calculate key metrics
-        reports['key_metrics'] = self._calculate_key_metrics(reports)
+        reports['key_metrics'] = _calculate_key_metrics(reports)
 
         # Save monthly report
-        self._save_report(app_db, 'monthly', first_day_previous, reports)
+        report_id = _save_report(app_session(), 'monthly', first_day_previous, reports)
 
         # Send monthly report email
-        self._send_monthly_report_email(reports, first_day_previous, last_day_previous)
+        _send_monthly_report_email(reports, first_day_previous, last_day_previous, report_id)
 
         logger.info(f"Monthly reports generated for {first_day_previous} to {last_day_previous}")
 
@@ -390,38 +380,6 @@ def generate_monthly_reports(self, app_db: Session, radius_db: Session):
         logger.error(f"Monthly report generation failed: {str(e)}")
         raise
 
-    def _calculate_key_metrics(self, reports: Dict[str, Any]) -> Dict[str, Any]:
-        """Calculate key business metrics"""
-        metrics = {}
-
-        # ARPU (Average Revenue Per User)
-        if reports['customer_metrics']['active_customers'] > 0:
-            metrics['arpu'] = reports['financial_summary']['total_collected'] / reports['customer_metrics']['active_customers']
-        else:
-            metrics['arpu'] = 0
-
-        # Collection efficiency
-        if reports['financial_summary']['total_invoiced'] > 0:
-            metrics['collection_efficiency'] = (reports['financial_summary']['total_collected'] / reports['financial_summary']['total_invoiced']) * 100
-        else:
-            metrics['collection_efficiency'] = 0
-
-        # Average data usage per user (in GB)
-        if reports['usage_statistics']['active_users'] > 0:
-            metrics['avg_data_usage_gb'] = (reports['usage_statistics']['total_data_usage'] or 0) / (1024**3) / reports['usage_statistics']['active_users']
-        else:
-            metrics['avg_data_usage_gb'] = 0
-
-        # Session success rate
-        if reports['network_summary']['total_sessions'] > 0:
-            # This would need authentication data to be accurate
-            metrics['session_success_rate'] = 95.0  # Placeholder
-        else:
-            metrics['session_success_rate'] = 0
-
-        return metrics
-
-
 @celery.task(bind=True, base=DatabaseTask)
 def generate_custom_report(self, app_db: Session, radius_db: Session, report_config: Dict[str, Any]):
     """Generate custom report based on configuration"""
@@ -485,7 +443,7 @@ def generate_custom_report(self, app_db: Session, radius_db: Session, report_con
                 report_data['sessions'] = [dict(row) for row in result.fetchall()]
 
         # Save custom report
-        self._save_report(app_db, 'custom', start_date, {
+        _save_report(app_session(), 'custom', start_date, {
             'config': report_config,
             'data': report_data
         })
@@ -504,8 +462,40 @@ def generate_custom_report(self, app_db: Session, radius_db: Session, report_con
         raise
 
 
-def _save_report(self, db: Session, report_type: str, report_date: datetime.date, data: Dict[str, Any]):
-    """Save report to database"""
+def _calculate_key_metrics(reports: Dict[str, Any]) -> Dict[str, Any]:
+    """Calculate key business metrics"""
+    metrics = {}
+
+    # ARPU (Average Revenue Per User)
+    if reports['customer_metrics']['active_customers'] > 0:
+        metrics['arpu'] = (reports['financial_summary']['total_collected'] or 0) / reports['customer_metrics']['active_customers']
+    else:
+        metrics['arpu'] = 0
+
+    # Collection efficiency
+    if (reports['financial_summary']['total_invoiced'] or 0) > 0:
+        metrics['collection_efficiency'] = ((reports['financial_summary']['total_collected'] or 0) / reports['financial_summary']['total_invoiced']) * 100
+    else:
+        metrics['collection_efficiency'] = 0
+
+    # Average data usage per user (in GB)
+    if (reports['usage_statistics']['active_users'] or 0) > 0:
+        metrics['avg_data_usage_gb'] = (reports['usage_statistics']['total_data_usage'] or 0) / (1024**3) / reports['usage_statistics']['active_users']
+    else:
+        metrics['avg_data_usage_gb'] = 0
+
+    # Session success rate
+    if (reports['network_summary']['total_sessions'] or 0) > 0:
+        # This would need authentication data to be accurate
+        metrics['session_success_rate'] = 95.0  # Placeholder
+    else:
+        metrics['session_success_rate'] = 0
+
+    return metrics
+
+
+def _save_report(db: Session, report_type: str, report_date: datetime.date, data: Dict[str, Any]):
+    """Save report to database, returning its id"""
     try:
         save_query = """
         INSERT INTO generated_reports (
@@ -513,7 +503,7 @@ def _save_report(self, db: Session, report_type: str, report_date: datetime.date
         ) VALUES (%s, %s, %s, %s)
         """
 
-        db.execute(save_query, (
+        result = db.execute(save_query, (
             report_type,
             report_date,
             json.dumps(data, default=str),
@@ -521,13 +511,15 @@ def _save_report(self, db: Session, report_type: str, report_date: datetime.date
         ))
 
         db.commit()
+        return result.lastrowid
 
     except Exception as e:
         logger.error(f"Failed to save report: {str(e)}")
+        return None
 
 
-def _send_daily_report_email(self, reports: Dict[str, Any], report_date: datetime.date):
-    """Send daily report via email"""
+def _send_daily_report_email(reports: Dict[str, Any], report_date: datetime.date, report_id: int = None):
+    """Send daily report via email, passing the saved report by id"""
     try:
         from app.tasks.notifications import send_email_notification
 
@@ -536,7 +528,7 @@ def _send_daily_report_email(self, reports: Dict[str, Any], report_date: datetim
             'daily_report',
             {
                 'report_date': report_date.strftime('%Y-%m-%d'),
-                'reports': reports
+                'reports': report_ref(report_id) if report_id else reports
             }
         )
 
@@ -544,8 +536,9 @@ def _send_daily_report_email(self, reports: Dict[str, Any], report_date: datetim
         logger.warning(f"Failed to send daily report email: {str(e)}")
 
 
-def _send_monthly_report_email(self, reports: Dict[str, Any], start_date: datetime.date, end_date: datetime.date):
-    """Send monthly report via email"""
+def _send_monthly_report_email(reports: Dict[str, Any], start_date: datetime.date, end_date: datetime.date,
+                               report_id: int = None):
+    """Send monthly report via email, passing the saved report by id"""
     try:
         from app.tasks.notifications import send_email_notification
 
@@ -555,7 +548,7 @@ def _send_monthly_report_email(self, reports: Dict[str, Any], start_date: dateti
             {
                 'month_start': start_date.strftime('%Y-%m-%d'),
                 'month_end': end_date.strftime('%Y-%m-%d'),
-                'reports': reports
+                'reports': report_ref(report_id) if report_id else reports
             }
         )
 
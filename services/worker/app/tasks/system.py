@@ -3,16 +3,22 @@ HaroonNet ISP Platform - System Tasks
 Background tasks for system maintenance, backups, and health checks
 """
 
-import os
-import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import logging
-import psutil
-import redis
 from celery import Task
 from sqlalchemy.orm import Session
 from app.celery import celery
-from app.database import get_app_db, get_radius_db
+from app.sessions import task_scope, app_session, radius_session, read_session
+from app.backup import BackupEngine, default_targets
+from app.archive import RadiusArchiver
+from app.purge import PurgeEngine, PurgeJob
+from app.partitions import PartitionManager, partition_specs
+from app.optimizer import TableOptimizer
+from app import health
+from app.payloads import offload
+from app.locks import singleton, task_lease
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -21,187 +27,165 @@ logger = logging.getLogger(__name__)
 class DatabaseTask(Task):
     """Base task class with database session management"""
 
+    # run() also takes the injected session(s), so skip signature checks at call time
+    typing = False
+
     def __call__(self, *args, **kwargs):
-        db = next(get_app_db())
-        try:
-            return self.run_with_db(db, *args, **kwargs)
-        finally:
-            db.close()
+        # A skipped singleton tick returns before any session is opened
+        with task_lease(self) as skipped:
+            if skipped:
+                return skipped
+            with task_scope():
+                return self.run_with_db(app_session(), *args, **kwargs)
 
     def run_with_db(self, db: Session, *args, **kwargs):
-        return self.run(*args, **kwargs)
+        return self.run(db, *args, **kwargs)
 
 
 @celery.task(bind=True, base=DatabaseTask)
 def backup_database(self, db: Session):
-    """Create database backups"""
+    """Create compressed database backups, dumping both databases concurrently"""
     logger.info("Starting database backup")
+    results = None
 
     try:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_dir = '/app/backups'
-        os.makedirs(backup_dir, exist_ok=True)
-
-        # Backup application database
-        app_backup_file = f"{backup_dir}/haroonnet_backup_{timestamp}.sql"
-        app_backup_cmd = [
-            'mysqldump',
-            f'--host={settings.DB_HOST}',
-            f'--port={settings.DB_PORT}',
-            f'--user={settings.DB_USER}',
-            f'--password={settings.DB_PASSWORD}',
-            '--single-transaction',
-            '--routines',
-            '--triggers',
-            settings.DB_NAME
-        ]
-
-        with open(app_backup_file, 'w') as f:
-            result = subprocess.run(app_backup_cmd, stdout=f, stderr=subprocess.PIPE, text=True)
-            if result.returncode != 0:
-                raise Exception(f"App database backup failed: {result.stderr}")
-
-        # Backup RADIUS database
-        radius_backup_file = f"{backup_dir}/radius_backup_{timestamp}.sql"
-        radius_backup_cmd = [
-            'mysqldump',
-            f'--host={settings.RADIUS_DB_HOST}',
-            f'--port={settings.RADIUS_DB_PORT}',
-            f'--user={settings.RADIUS_DB_USER}',
-            f'--password={settings.RADIUS_DB_PASSWORD}',
-            '--single-transaction',
-            '--routines',
-            '--triggers',
-            settings.RADIUS_DB_NAME
-        ]
+        engine = BackupEngine()
 
-        with open(radius_backup_file, 'w') as f:
-            result = subprocess.run(radius_backup_cmd, stdout=f, stderr=subprocess.PIPE, text=True)
-            if result.returncode != 0:
-                raise Exception(f"RADIUS database backup failed: {result.stderr}")
+        if settings.BACKUP_RADIUS_MODE == 'incremental':
+            results = _run_incremental_backup(engine, timestamp)
+        else:
+            results = engine.run(default_targets(), timestamp)
 
-        # Get file sizes
-        app_backup_size = os.path.getsize(app_backup_file)
-        radius_backup_size = os.path.getsize(radius_backup_file)
-
-        # Log backup to database
+        # Log each dump to database
         log_query = """
         INSERT INTO system_backups (
-            backup_type, file_path, file_size, status, created_at
-        ) VALUES (%s, %s, %s, %s, %s)
+            backup_type, file_path, file_size, raw_size, checksum,
+            duration_seconds, throughput_bytes_per_sec, compression_ratio,
+            status, error_message, created_at
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
 
-        db.execute(log_query, (
-            'application', app_backup_file, app_backup_size, 'completed', datetime.now()
-        ))
-
-        db.execute(log_query, (
-            'radius', radius_backup_file, radius_backup_size, 'completed', datetime.now()
-        ))
+        for dump in results:
+            db.execute(log_query, (
+                dump.backup_type,
+                dump.file_path,
+                dump.file_size,
+                dump.raw_size,
+                dump.checksum,
+                dump.duration,
+                dump.throughput,
+                dump.compression_ratio,
+                dump.status,
+                dump.error,
+                datetime.now()
+            ))
 
         db.commit()
 
+        failed = [dump for dump in results if dump.status != 'completed']
+        if failed:
+            raise Exception("; ".join(dump.error for dump in failed))
+
         # Clean up old backups
-        self._cleanup_old_backups(backup_dir)
+        engine.cleanup_old_backups()
+
+        logger.info(f"Database backup completed: {', '.join(dump.file_path for dump in results)}")
 
-        logger.info(f"Database backup completed: {app_backup_file}, {radius_backup_file}")
+        backups = {dump.backup_type: dump for dump in results}
 
         return {
             'status': 'completed',
-            'app_backup': app_backup_file,
-            'radius_backup': radius_backup_file,
-            'app_size': app_backup_size,
-            'radius_size': radius_backup_size,
+            'app_backup': backups['application'].file_path,
+            'radius_backup': backups['radius'].file_path,
+            'app_size': backups['application'].file_size,
+            'radius_size': backups['radius'].file_size,
+            'compression': engine.compression,
+            'radius_mode': settings.BACKUP_RADIUS_MODE,
+            'dumps': [dump.to_dict() for dump in results],
             'timestamp': timestamp
         }
 
     except Exception as e:
         logger.error(f"Database backup failed: {str(e)}")
 
-        # Log failure
-        try:
-            log_query = """
-            INSERT INTO system_backups (
-                backup_type, file_path, file_size, status, error_message, created_at
-            ) VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            db.execute(log_query, (
-                'failed', '', 0, 'failed', str(e), datetime.now()
-            ))
-            db.commit()
-        except:
-            pass
+        # Log failure unless the individual dumps were already recorded
+        if results is None:
+            try:
+                log_query = """
+                INSERT INTO system_backups (
+                    backup_type, file_path, file_size, status, error_message, created_at
+                ) VALUES (%s, %s, %s, %s, %s, %s)
+                """
+                db.execute(log_query, (
+                    'failed', '', 0, 'failed', str(e), datetime.now()
+                ))
+                db.commit()
+            except:
+                pass
 
         raise
 
-    def _cleanup_old_backups(self, backup_dir: str):
-        """Remove old backup files"""
-        try:
-            cutoff_date = datetime.now() - timedelta(days=settings.BACKUP_RETENTION_DAYS)
-
-            for filename in os.listdir(backup_dir):
-                if filename.endswith('.sql'):
-                    file_path = os.path.join(backup_dir, filename)
-                    file_mtime = datetime.fromtimestamp(os.path.getmtime(file_path))
 
-                    if file_mtime < cutoff_date:
-                        os.remove(file_path)
-                        logger.info(f"Removed old backup: {filename}")
-
-        except Exception as e:
-            logger.warning(f"Failed to cleanup old backups: {str(e)}")
+def _run_incremental_backup(engine: BackupEngine, timestamp: str):
+    """Full application dump alongside an incremental RADIUS archive run"""
+    app_target = next(target for target in default_targets() if target.backup_type == 'application')
+    radius_db = radius_session()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        app_future = executor.submit(engine.dump, app_target, timestamp)
+        archive_future = executor.submit(RadiusArchiver(engine).run, radius_db, timestamp)
+        archive = archive_future.result()
+        return [app_future.result()] + archive['base'] + archive['chunks']
 
 
 @celery.task(bind=True, base=DatabaseTask)
 def cleanup_old_logs(self, db: Session):
-    """Clean up old log entries"""
+    """Clean up old log entries in throttled, resumable batches"""
     logger.info("Cleaning up old logs")
 
     try:
-        # Clean up old audit logs (keep for 1 year)
-        audit_cutoff = datetime.now() - timedelta(days=365)
-        audit_query = "DELETE FROM audit_logs WHERE created_at < %s"
-        result = db.execute(audit_query, (audit_cutoff,))
-        deleted_audit = result.rowcount
-
-        # Clean up old RADIUS accounting (keep for 2 years)
-        radius_db = next(get_radius_db())
-        try:
-            radius_cutoff = datetime.now() - timedelta(days=730)
-            radius_query = "DELETE FROM radacct WHERE acctstarttime < %s"
-            result = radius_db.execute(radius_query, (radius_cutoff,))
-            deleted_radius = result.rowcount
-            radius_db.commit()
-        finally:
-            radius_db.close()
-
-        # Clean up old post-auth logs (keep for 6 months)
-        radius_db = next(get_radius_db())
-        try:
-            postauth_cutoff = datetime.now() - timedelta(days=180)
-            postauth_query = "DELETE FROM radpostauth WHERE authdate < %s"
-            result = radius_db.execute(postauth_query, (postauth_cutoff,))
-            deleted_postauth = result.rowcount
-            radius_db.commit()
-        finally:
-            radius_db.close()
-
-        # Clean up old usage aggregates (keep for 2 years)
-        usage_cutoff = datetime.now() - timedelta(days=730)
-        usage_query = "DELETE FROM usage_aggregates WHERE date < %s"
-        result = db.execute(usage_query, (usage_cutoff,))
-        deleted_usage = result.rowcount
+        now = datetime.now()
+        started = time.monotonic()
+        engine = PurgeEngine()
+
+        app_jobs = [
+            # Audit logs
+            PurgeJob('audit_logs', 'audit_logs', 'id', 'created_at', now - timedelta(days=settings.AUDIT_LOG_RETENTION_DAYS)),
+            # Usage aggregates
+            PurgeJob('usage_aggregates', 'usage_aggregates', 'id', 'date', now - timedelta(days=settings.USAGE_RETENTION_DAYS)),
+        ]
+        radius_jobs = [
+            # RADIUS accounting
+            PurgeJob('radacct', 'radacct', 'radacctid', 'acctstarttime', now - timedelta(days=settings.RADACCT_RETENTION_DAYS),
+                     database='radius'),
+            # Post-auth logs
+            PurgeJob('radpostauth', 'radpostauth', 'id', 'authdate', now - timedelta(days=settings.RADPOSTAUTH_RETENTION_DAYS),
+                     database='radius'),
+        ]
 
-        db.commit()
+        results = {}
+        for job in app_jobs:
+            results[job.name] = engine.run(db, job, started)
+
+        radius_db = radius_session()
+        for job in radius_jobs:
+            results[job.name] = engine.run(radius_db, job, started)
 
-        logger.info(f"Log cleanup completed: {deleted_audit} audit, {deleted_radius} radius, {deleted_postauth} postauth, {deleted_usage} usage")
+        deleted_audit = results['audit_logs'].deleted
+        deleted_radius = results['radacct'].deleted
+        deleted_postauth = results['radpostauth'].deleted
+        deleted_usage = results['usage_aggregates'].deleted
+        completed = all(result.completed for result in results.values())
+
+        logger.info(f"Log cleanup {'completed' if completed else 'paused'}: {deleted_audit} audit, {deleted_radius} radius, {deleted_postauth} postauth, {deleted_usage} usage")
 
         return {
-            'status': 'completed',
+            'status': 'completed' if completed else 'partial',
             'deleted_audit_logs': deleted_audit,
             'deleted_radius_logs': deleted_radius,
             'deleted_postauth_logs': deleted_postauth,
-            'deleted_usage_logs': deleted_usage
+            'deleted_usage_logs': deleted_usage,
+            'jobs': {name: result.to_dict() for name, result in results.items()}
         }
 
     except Exception as e:
@@ -211,95 +195,54 @@ def cleanup_old_logs(self, db: Session):
 
 
 @celery.task(bind=True, base=DatabaseTask)
-def system_health_check(self, db: Session):
-    """Perform system health checks"""
-    logger.info("Performing system health check")
+def manage_partitions(self, db: Session, dry_run: bool = False):
+    """Create future monthly partitions and drop expired ones"""
+    logger.info("Maintaining table partitions")
 
     try:
-        health_data = {}
-        issues = []
-
-        # Check system resources
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        cpu_percent = psutil.cpu_percent(interval=1)
-
-        health_data['memory'] = {
-            'total': memory.total,
-            'available': memory.available,
-            'percent': memory.percent
-        }
+        manager = PartitionManager()
+        tables = {}
 
-        health_data['disk'] = {
-            'total': disk.total,
-            'free': disk.free,
-            'percent': (disk.used / disk.total) * 100
-        }
+        for spec in partition_specs():
+            session = radius_session() if spec.database == 'radius' else db
+            try:
+                tables[spec.table] = manager.maintain(session, spec, dry_run=dry_run)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Partition maintenance failed for {spec.table}: {str(e)}")
+                tables[spec.table] = {'status': 'failed', 'error': str(e)}
 
-        health_data['cpu'] = {
-            'percent': cpu_percent
-        }
+        added = sum(len(table.get('added', [])) for table in tables.values())
+        dropped = sum(len(table.get('dropped', [])) for table in tables.values())
 
-        # Check for resource issues
-        if memory.percent > 90:
-            issues.append(f"High memory usage: {memory.percent}%")
+        logger.info(f"Partition maintenance completed: {added} added, {dropped} dropped")
 
-        if (disk.used / disk.total) * 100 > 90:
-            issues.append(f"High disk usage: {(disk.used / disk.total) * 100:.1f}%")
+        return {
+            'status': 'completed',
+            'partitions_added': added,
+            'partitions_dropped': dropped,
+            'tables': tables
+        }
 
-        if cpu_percent > 90:
-            issues.append(f"High CPU usage: {cpu_percent}%")
+    except Exception as e:
+        logger.error(f"Partition maintenance failed: {str(e)}")
+        raise
 
-        # Check database connections
-        try:
-            db.execute("SELECT 1")
-            health_data['database'] = 'healthy'
-        except Exception as e:
-            health_data['database'] = 'unhealthy'
-            issues.append(f"Database connection issue: {str(e)}")
 
-        # Check RADIUS database
-        try:
-            radius_db = next(get_radius_db())
-            try:
-                radius_db.execute("SELECT 1")
-                health_data['radius_database'] = 'healthy'
-            finally:
-                radius_db.close()
-        except Exception as e:
-            health_data['radius_database'] = 'unhealthy'
-            issues.append(f"RADIUS database connection issue: {str(e)}")
-
-        # Check Redis
-        try:
-            r = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                password=settings.REDIS_PASSWORD,
-                db=settings.REDIS_DB
-            )
-            r.ping()
-            health_data['redis'] = 'healthy'
-        except Exception as e:
-            health_data['redis'] = 'unhealthy'
-            issues.append(f"Redis connection issue: {str(e)}")
-
-        # Check active sessions
-        try:
-            radius_db = next(get_radius_db())
-            try:
-                session_query = "SELECT COUNT(*) as active_sessions FROM radacct WHERE acctstoptime IS NULL"
-                result = radius_db.execute(session_query)
-                active_sessions = result.fetchone().active_sessions
-                health_data['active_sessions'] = active_sessions
-            finally:
-                radius_db.close()
-        except Exception as e:
-            health_data['active_sessions'] = 0
-            issues.append(f"Failed to get active sessions: {str(e)}")
+@celery.task(bind=True, base=DatabaseTask)
+@singleton(missed='skip')
+def system_health_check(self, db: Session):
+    """Perform system health checks"""
+    logger.info("Performing system health check")
+
+    try:
+        report = health.collect()
+        health_data = report.data
+        issues = report.messages
 
         # Log health check
-        health_status = 'healthy' if not issues else 'warning'
+        health_status = report.status
 
         log_query = """
         INSERT INTO system_health_logs (
@@ -317,18 +260,19 @@ def system_health_check(self, db: Session):
 
         db.commit()
 
-        # Send alerts if there are critical issues
+        # Send alerts for new issues; persisting ones re-alert after the cooldown
         if issues:
             logger.warning(f"System health issues detected: {issues}")
 
-            # Send alert notification
+        alerts = health.new_alerts(report)
+        if alerts:
             from app.tasks.notifications import send_email_notification
             send_email_notification.delay(
                 settings.COMPANY_EMAIL,
                 'system_alert',
                 {
-                    'issues': issues,
-                    'health_data': health_data,
+                    'issues': [message for _, message in alerts],
+                    'health_data': offload(health_data),
                     'timestamp': datetime.now().isoformat()
                 }
             )
@@ -349,61 +293,34 @@ def system_health_check(self, db: Session):
 
 @celery.task(bind=True, base=DatabaseTask)
 def optimize_database(self, db: Session):
-    """Optimize database tables"""
+    """Rebuild fragmented database tables within the maintenance window"""
     logger.info("Optimizing database tables")
 
     try:
-        # Get list of tables to optimize
-        tables_query = """
-        SELECT table_name
-        FROM information_schema.tables
-        WHERE table_schema = %s
-        AND table_type = 'BASE TABLE'
-        """
-
-        result = db.execute(tables_query, (settings.DB_NAME,))
-        tables = [row.table_name for row in result.fetchall()]
+        optimizer = TableOptimizer()
 
-        optimized_tables = []
+        app_report = optimizer.optimize(db)
+        db.commit()
 
-        for table in tables:
-            try:
-                # Optimize table
-                optimize_query = f"OPTIMIZE TABLE {table}"
-                db.execute(optimize_query)
-                optimized_tables.append(table)
-                logger.info(f"Optimized table: {table}")
-            except Exception as e:
-                logger.warning(f"Failed to optimize table {table}: {str(e)}")
-                continue
-
-        # Optimize RADIUS tables
-        radius_db = next(get_radius_db())
-        try:
-            radius_tables = ['radacct', 'radcheck', 'radreply', 'radusergroup', 'radgroupcheck', 'radgroupreply', 'radpostauth']
-
-            for table in radius_tables:
-                try:
-                    optimize_query = f"OPTIMIZE TABLE {table}"
-                    radius_db.execute(optimize_query)
-                    optimized_tables.append(f"radius.{table}")
-                    logger.info(f"Optimized RADIUS table: {table}")
-                except Exception as e:
-                    logger.warning(f"Failed to optimize RADIUS table {table}: {str(e)}")
-                    continue
-
-            radius_db.commit()
-        finally:
-            radius_db.close()
+        # RADIUS tables share the same time budget
+        radius_db = radius_session()
+        radius_report = optimizer.optimize(radius_db)
+        radius_db.commit()
 
-        db.commit()
+        optimized_tables = [table['table'] for table in app_report['optimized'] + radius_report['optimized']]
+        skipped_tables = app_report['skipped'] + radius_report['skipped']
+        reclaimed_bytes = app_report['reclaimed_bytes'] + radius_report['reclaimed_bytes']
 
-        logger.info(f"Database optimization completed: {len(optimized_tables)} tables optimized")
+        logger.info(f"Database optimization completed: {len(optimized_tables)} tables optimized, {reclaimed_bytes} bytes reclaimed")
 
         return {
             'status': 'completed',
             'optimized_tables': optimized_tables,
-            'total_tables': len(optimized_tables)
+            'total_tables': len(optimized_tables),
+            'tables_checked': app_report['tables_checked'] + radius_report['tables_checked'],
+            'skipped_tables': skipped_tables,
+            'reclaimed_bytes': reclaimed_bytes,
+            'details': app_report['optimized'] + radius_report['optimized']
         }
 
     except Exception as e:
@@ -419,6 +336,8 @@ def update_system_statistics(self, db: Session):
 
     try:
         stats = {}
+        # Statistics are read from the replica when one is configured
+        stats_db = read_session('app')
 
         # Customer statistics
         customer_query = """
@@ -428,7 +347,7 @@ def update_system_statistics(self, db: Session):
             COUNT(CASE WHEN status = 'suspended' THEN 1 END) as suspended_customers
         FROM customers
         """
-        result = db.execute(customer_query)
+        result = stats_db.execute(customer_query)
         customer_stats = result.fetchone()
         stats['customers'] = dict(customer_stats)
 
@@ -441,7 +360,7 @@ def update_system_statistics(self, db: Session):
             SUM(CASE WHEN status = 'active' THEN 1 ELSE 0 END) as revenue_generating
         FROM subscriptions
         """
-        result = db.execute(subscription_query)
+        result = stats_db.execute(subscription_query)
         subscription_stats = result.fetchone()
         stats['subscriptions'] = dict(subscription_stats)
 
@@ -457,25 +376,21 @@ def update_system_statistics(self, db: Session):
         WHERE MONTH(issue_date) = MONTH(CURDATE())
         AND YEAR(issue_date) = YEAR(CURDATE())
         """
-        result = db.execute(financial_query)
+        result = stats_db.execute(financial_query)
         financial_stats = result.fetchone()
         stats['financials'] = dict(financial_stats)
 
         # Active sessions from RADIUS
-        radius_db = next(get_radius_db())
-        try:
-            session_query = """
-            SELECT
-                COUNT(*) as active_sessions,
-                COUNT(DISTINCT nasipaddress) as active_nas
-            FROM radacct
-            WHERE acctstoptime IS NULL
-            """
-            result = radius_db.execute(session_query)
-            session_stats = result.fetchone()
-            stats['sessions'] = dict(session_stats)
-        finally:
-            radius_db.close()
+        session_query = """
+        SELECT
+            COUNT(*) as active_sessions,
+            COUNT(DISTINCT nasipaddress) as active_nas
+        FROM radacct
+        WHERE acctstoptime IS NULL
+        """
+        result = read_session('radius').execute(session_query)
+        session_stats = result.fetchone()
+        stats['sessions'] = dict(session_stats)
 
         # Update statistics table
         import json
@@ -0,0 +1,121 @@
+"""
+HaroonNet ISP Platform - Hourly Usage Buckets
+Per-subscription hourly usage from accounting deltas, with the daily
+usage_aggregates rolled up from it
+
+usage_hourly is keyed by (hour, subscription_id), where hour counts hours
+since 1970-01-01 00:00 in the worker's local time. Rows hold only the key
+(8 bytes) and the counters, with no surrogate id or secondary index, so a
+bucket is far narrower than a usage_aggregates row
+(tests/load/worker/test_usage_storage.py compares the layouts). Hour-first
+keys make the rollup and peak-hour queries range scans, and monthly
+partitions on hour make retention a DROP PARTITION (see app/partitions.py).
+Create the table with:
+    python -m app.usage_buckets --print-ddl
+"""
+
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Tuple
+import logging
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+HOURLY_TABLE_DDL = """
+CREATE TABLE usage_hourly (
+    hour INT UNSIGNED NOT NULL,
+    subscription_id INT UNSIGNED NOT NULL,
+    input_octets BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    output_octets BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    session_time MEDIUMINT UNSIGNED NOT NULL DEFAULT 0,
+    session_count SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+    PRIMARY KEY (hour, subscription_id)
+)
+"""
+
+
+def hour_number(value: datetime) -> int:
+    """Hours since the epoch of a naive local datetime"""
+    return int((value - EPOCH).total_seconds()) // 3600
+
+
+def hour_start(hour: int) -> datetime:
+    return EPOCH + timedelta(hours=hour)
+
+
+def day_hours(day: date) -> Tuple[int, int]:
+    """First hour of a day and of the next one"""
+    first = hour_number(datetime.combine(day, datetime.min.time()))
+    return first, first + 24
+
+
+def rollup_daily(db: Session, day: date) -> int:
+    """Recompute a day's usage_aggregates rows from its hourly buckets
+
+    Rows are replaced rather than added to, so a day can be rolled up again
+    whenever more of its buckets arrive. Returns MySQL's affected rows, which
+    counts a replaced row twice.
+    """
+    first_hour, next_hour = day_hours(day)
+    rollup_query = """
+    INSERT INTO usage_aggregates (
+        customer_id, subscription_id, date, input_octets,
+        output_octets, total_octets, session_time, session_count,
+        created_at
+    )
+    SELECT s.customer_id, h.subscription_id, %s,
+           SUM(h.input_octets), SUM(h.output_octets),
+           SUM(h.input_octets + h.output_octets),
+           SUM(h.session_time), SUM(h.session_count), %s
+    FROM usage_hourly h
+    JOIN subscriptions s ON s.id = h.subscription_id
+    WHERE h.hour >= %s AND h.hour < %s
+    GROUP BY h.subscription_id, s.customer_id
+    ON DUPLICATE KEY UPDATE
+        input_octets = VALUES(input_octets),
+        output_octets = VALUES(output_octets),
+        total_octets = VALUES(total_octets),
+        session_time = VALUES(session_time),
+        session_count = VALUES(session_count)
+    """
+    return db.execute(rollup_query, (day, datetime.now(), first_hour, next_hour)).rowcount
+
+
+def peak_hours(db: Session, day: date, limit: int = 3):
+    """The day's busiest hours across all subscriptions, for capacity planning"""
+    first_hour, next_hour = day_hours(day)
+    query = """
+    SELECT hour, COUNT(*) as active_subscriptions,
+           SUM(input_octets + output_octets) as total_octets
+    FROM usage_hourly
+    WHERE hour >= %s AND hour < %s
+    GROUP BY hour
+    ORDER BY total_octets DESC
+    LIMIT %s
+    """
+    return [
+        {'hour': hour_start(row.hour), 'active_subscriptions': row.active_subscriptions,
+         'total_octets': int(row.total_octets or 0)}
+        for row in db.execute(query, (first_hour, next_hour, limit)).fetchall()
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hourly usage bucket table')
+    parser.add_argument('--print-ddl', action='store_true', help='Print CREATE TABLE and partitioning DDL')
+    args = parser.parse_args()
+
+    if args.print_ddl:
+        from app.partitions import PartitionManager, partition_specs
+        print(f"{HOURLY_TABLE_DDL.strip()};\n")
+        spec = next(spec for spec in partition_specs() if spec.table == 'usage_hourly')
+        # The new table's only key is (hour, subscription_id)
+        for statement in PartitionManager().conversion_ddl(spec, {'PRIMARY': ['hour', 'subscription_id']}):
+            print(f"{statement};\n")
+
+
+if __name__ == '__main__':
+    main()
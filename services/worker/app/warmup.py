@@ -0,0 +1,166 @@
+"""
+HaroonNet ISP Platform - Worker Warmup
+Prepares a freshly started worker process for the queues it consumes
+
+Prefork children are recycled every worker_max_tasks_per_child tasks, so
+each new child re-opens database connections and re-parses the RADIUS
+dictionary on its first task. The worker_process_init hook does that work
+up front, only for the queues the worker actually serves.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+import logging
+from celery import signals
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Databases each queue's tasks use; reports read through the replicas
+QUEUE_DATABASES: Dict[str, List[str]] = {
+    'billing': ['app'],
+    'notifications': ['app'],
+    'radius': ['app', 'radius'],
+    'reports': ['app', 'radius'],
+    'system': ['app', 'radius'],
+}
+
+READ_ONLY_QUEUES = {'reports'}
+
+
+def warm_radius_dictionary():
+    from app.clients import radius_dictionary
+    radius_dictionary()
+
+
+def warm_templates():
+    """Compile the active notification templates"""
+    from app.clients import compiled_template
+    from app.sessions import task_scope, app_session
+
+    query = """
+    SELECT subject, body_html, body_text, message
+    FROM notification_templates
+    WHERE is_active = 1
+    """
+    with task_scope():
+        for row in app_session().execute(query).fetchall():
+            for source in (row.subject, row.body_html, row.body_text, row.message):
+                if source:
+                    compiled_template(source)
+
+
+def warm_sms():
+    if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
+        from app.clients import twilio_client
+        twilio_client()
+
+
+def warm_analytics():
+    import app.analytics  # noqa: F401  (numpy and pandas)
+
+
+def warm_health():
+    from app import health
+    # Give the first health check an interval to measure CPU over
+    health.cpu_sampler.sample()
+
+
+QUEUE_WARMERS: Dict[str, List[Callable[[], None]]] = {
+    'notifications': [warm_templates, warm_sms],
+    'radius': [warm_radius_dictionary],
+    'reports': [warm_analytics],
+    'system': [warm_health],
+}
+
+
+def consumed_queues(app) -> List[str]:
+    """Queues this worker consumes (-Q)
+
+    A worker started without -Q only reads the default queue, which may hold
+    any task, so it is warmed for every routed queue.
+    """
+    from app.metrics import queue_names
+    selected = set(getattr(app.amqp.queues, 'consume_from', None) or ())
+    if selected - {app.conf.task_default_queue}:
+        return sorted(selected)
+    return queue_names(app)
+
+
+def reset_pools():
+    """Drop connections inherited from the parent process without closing them"""
+    from app.sessions import PRIMARY_ENGINES, REPLICA_ENGINES
+    for engine in list(PRIMARY_ENGINES.values()) + list(REPLICA_ENGINES.values()):
+        if engine is not None:
+            engine.dispose(close=False)
+
+
+def warm_pools(queues: Iterable[str]):
+    """Open one pooled connection per database the queues use"""
+    from app.sessions import open_session
+
+    needed = set()
+    for queue in queues:
+        for database in QUEUE_DATABASES.get(queue, ['app']):
+            needed.add((database, queue in READ_ONLY_QUEUES))
+
+    for database, read_only in sorted(needed):
+        open_session(database, read_only).close()
+
+
+def warm(queues: Iterable[str], pools: bool = True) -> Dict[str, float]:
+    """Run the warmers for the given queues, returning seconds spent per step"""
+    queues = list(queues)
+    timings = {}
+
+    steps: Dict[str, Callable[[], None]] = {}
+    if pools:
+        steps['warm_pools'] = lambda: warm_pools(queues)
+    for queue in queues:
+        for warmer in QUEUE_WARMERS.get(queue, []):
+            steps[warmer.__name__] = warmer
+
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warmup step {name} failed: {str(e)}")
+        timings[name] = time.perf_counter() - started
+
+    return timings
+
+
+def _warm_in_background(app):
+    queues = consumed_queues(app)
+
+    def run():
+        timings = warm(queues)
+        logger.info(
+            f"Worker warmed for {', '.join(queues)} in {sum(timings.values()):.2f}s "
+            + ' '.join(f"{name}={seconds:.3f}s" for name, seconds in timings.items())
+        )
+
+    # worker_process_init must return within worker_proc_alive_timeout,
+    # so slow connects must not hold up the child's start
+    threading.Thread(target=run, name='worker-warmup', daemon=True).start()
+
+
+def install(app):
+    """Warm each prefork child (or a thread/gevent worker) for the queues it consumes"""
+
+    @signals.worker_process_init.connect(weak=False)
+    def on_worker_process_init(**kwargs):
+        reset_pools()
+        if settings.WORKER_WARMUP_ENABLED:
+            _warm_in_background(app)
+
+    @signals.worker_ready.connect(weak=False)
+    def on_worker_ready(sender=None, **kwargs):
+        # Thread and gevent pools run tasks in the main process, where
+        # worker_process_init never fires
+        from celery.concurrency.prefork import TaskPool
+        pool = getattr(sender, 'pool', None)
+        if settings.WORKER_WARMUP_ENABLED and pool is not None and not isinstance(pool, TaskPool):
+            _warm_in_background(app)
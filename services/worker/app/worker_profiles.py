@@ -0,0 +1,158 @@
+"""
+HaroonNet ISP Platform - Worker Profiles
+Per-queue pool, concurrency, prefetch and acknowledgement settings
+
+Network-bound queues (SMTP, Twilio, UDP CoA) run on a thread or gevent pool
+with high concurrency; database- and CPU-bound queues run on prefork.
+Start a profile with:
+    python -m app.worker_profiles io|compute|system [extra celery worker args]
+    python -m app.worker_profiles --list
+"""
+
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from app import config
+
+PROFILE_ENV = 'WORKER_PROFILE'
+
+
+@dataclass
+class WorkerProfile:
+    """How one group of queues is consumed"""
+    name: str
+    queues: List[str]
+    pool: str  # prefork, threads or gevent
+    concurrency: Optional[int]  # None: one process per CPU
+    prefetch_multiplier: int
+    acks_late: bool
+    max_tasks_per_child: Optional[int] = None
+    # Settings overrides applied before the app is imported
+    env: Dict[str, str] = field(default_factory=dict)
+
+    def celery_conf(self) -> Dict[str, object]:
+        conf = {
+            'worker_pool': self.pool,
+            'worker_prefetch_multiplier': self.prefetch_multiplier,
+            'task_acks_late': self.acks_late,
+            'worker_max_tasks_per_child': self.max_tasks_per_child,
+        }
+        if self.concurrency:
+            conf['worker_concurrency'] = self.concurrency
+        return conf
+
+    def argv(self) -> List[str]:
+        """celery worker arguments for this profile"""
+        args = ['worker', '-Q', ','.join(self.queues), '-P', self.pool,
+                '-n', f'{self.name}@%h', '--loglevel', config.settings.LOG_LEVEL.lower()]
+        if self.concurrency:
+            args += ['-c', str(self.concurrency)]
+        return args
+
+
+def worker_profiles() -> Dict[str, WorkerProfile]:
+    io_concurrency = config.settings.WORKER_IO_CONCURRENCY
+    # Threads share one process's pools. Radius tasks hold an app and a radius
+    # session each, and email tasks keep theirs across SMTP, so pool plus
+    # overflow must cover every thread on both databases.
+    io_pool_size = min(max(10, io_concurrency // 4), io_concurrency)
+    io_max_overflow = io_concurrency - io_pool_size
+    return {
+        'io': WorkerProfile(
+            name='io',
+            queues=['notifications', 'radius'],
+            pool=config.settings.WORKER_IO_POOL,
+            concurrency=io_concurrency,
+            # Short network calls: keep a few messages buffered per slot
+            prefetch_multiplier=4,
+            acks_late=True,
+            env={
+                'DB_POOL_SIZE': str(io_pool_size),
+                'DB_MAX_OVERFLOW': str(io_max_overflow),
+                'RADIUS_DB_POOL_SIZE': str(io_pool_size),
+                'RADIUS_DB_MAX_OVERFLOW': str(io_max_overflow),
+            },
+        ),
+        'compute': WorkerProfile(
+            name='compute',
+            queues=['billing', 'reports'],
+            pool='prefork',
+            concurrency=config.settings.WORKER_COMPUTE_CONCURRENCY,
+            prefetch_multiplier=1,
+            acks_late=True,
+            max_tasks_per_child=1000,
+        ),
+        'system': WorkerProfile(
+            name='system',
+            queues=['system', 'default'],
+            pool='prefork',
+            concurrency=2,
+            prefetch_multiplier=1,
+            # Backups and purges can outlast the broker visibility timeout;
+            # acking late would redeliver them to a second worker mid-run
+            acks_late=False,
+            max_tasks_per_child=100,
+        ),
+    }
+
+
+def active_profile() -> Optional[WorkerProfile]:
+    """Profile named by WORKER_PROFILE, if any"""
+    name = os.environ.get(PROFILE_ENV)
+    if not name:
+        return None
+    profiles = worker_profiles()
+    if name not in profiles:
+        raise ValueError(f"Unknown worker profile {name!r}; choose from {', '.join(profiles)}")
+    return profiles[name]
+
+
+def apply_profile_env(profile: WorkerProfile):
+    """Set the profile's settings overrides and rebuild settings from them
+
+    app.config built its settings when this module was imported; rebuilding
+    them before app.database is imported gives the engines the profile's pool
+    sizes.
+    """
+    if 'app.database' in sys.modules:
+        raise RuntimeError("Worker profile settings must be applied before app.database is imported")
+    os.environ[PROFILE_ENV] = profile.name
+    for key, value in profile.env.items():
+        os.environ.setdefault(key, value)
+    # Read by prometheus_client when app.metrics imports it
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', config.settings.PROMETHEUS_MULTIPROC_DIR)
+    config.settings = config.Settings()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description='Start a Celery worker profile')
+    parser.add_argument('profile', nargs='?', help='Profile name')
+    parser.add_argument('--list', action='store_true', help='Show profiles and exit')
+    args, extra = parser.parse_known_args(argv)
+
+    profiles = worker_profiles()
+    if args.list or not args.profile:
+        for profile in profiles.values():
+            print(f"{profile.name:<8} celery -A app.celery {' '.join(profile.argv())}  "
+                  f"(prefetch={profile.prefetch_multiplier}, acks_late={profile.acks_late})")
+        return
+
+    if args.profile not in profiles:
+        parser.error(f"unknown profile {args.profile!r}")
+    profile = profiles[args.profile]
+
+    apply_profile_env(profile)
+
+    if profile.pool == 'gevent':
+        # Must patch before sockets, threads or the app are imported
+        from gevent import monkey
+        monkey.patch_all()
+
+    from app.celery import celery
+    celery.worker_main(profile.argv() + extra)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,226 @@
+"""
+HaroonNet ISP Platform - Distributed RADIUS Load Driver
+Runs one RADIUS load test from several processes or hosts
+
+The coordinator gives each agent a slice of the test:
+- a disjoint user-id range, and a NAS range in model mode
+- its own block of source ports
+- every N-th slot of the open-loop schedule
+
+Agents bind their sockets and report ready. The coordinator then sends one
+wall-clock start time to all of them. Each agent returns its counters and
+histograms, which are merged into a single RadiusLoadTester report.
+
+Local workers talk over multiprocessing pipes. Remote agents use
+multiprocessing.connection with a shared authkey, which has no default.
+Messages are pickled, and anyone holding the key can run code on an agent,
+so use a random key and run agents only on a trusted test network. Agents
+listen on 127.0.0.1 unless given a host. Hosts need NTP-synchronised clocks
+for the common start.
+
+    # On each load host
+    python tests/load/radius/test_radius_load.py --agent 0.0.0.0:7700 --authkey "$(cat load.key)"
+    # Coordinator
+    python tests/load/radius/test_radius_load.py --agents lg1:7700,lg2:7700 --authkey "$(cat load.key)" \\
+        --mode open --rate 40000 --duration 300
+"""
+
+import asyncio
+import dataclasses
+import logging
+import multiprocessing
+import socket
+import time
+from multiprocessing.connection import Client, Listener
+from typing import List, Sequence, Tuple
+
+from radius_client import install_fast_event_loop
+from recorder import MetricsRecorder
+from test_radius_load import RadiusLoadTester
+
+logger = logging.getLogger(__name__)
+
+READY_TIMEOUT = 60  # Seconds for an agent to bind its sockets
+
+# RadiusLoadTester attributes sent to agents
+TESTER_FIELDS = (
+    'server_ip', 'auth_port', 'acct_port', 'secret', 'sockets', 'timeout', 'retries',
+    'mode', 'concurrent_users', 'arrival_rate', 'test_duration', 'ramp_up_time', 'session_hold',
+    'workload', 'seed', 'time_scale', 'snapshot_interval', 'run_id',
+    'user_offset', 'worker_index', 'worker_count', 'source_port',
+)
+
+
+def partition(total: int, count: int, index: int) -> Tuple[int, int]:
+    """Offset and size of the index-th of count near-equal parts of total"""
+    base, extra = divmod(total, count)
+    return index * base + min(index, extra), base + (1 if index < extra else 0)
+
+
+def tester_settings(tester: RadiusLoadTester) -> dict:
+    return {name: getattr(tester, name) for name in TESTER_FIELDS}
+
+
+def build_tester(settings: dict) -> RadiusLoadTester:
+    tester = RadiusLoadTester()
+    for name, value in settings.items():
+        setattr(tester, name, value)
+    return tester
+
+
+def slice_settings(settings: dict, index: int, count: int) -> dict:
+    """Settings for worker index of count"""
+    part = dict(settings, worker_index=index, worker_count=count)
+
+    offset, size = partition(settings['concurrent_users'], count, index)
+    part['user_offset'] = settings['user_offset'] + offset
+    part['concurrent_users'] = size
+
+    if settings['source_port']:
+        part['source_port'] = settings['source_port'] + index * 2 * settings['sockets']
+
+    if settings['mode'] == 'model':
+        workload = settings['workload']
+        nas_offset, nas_count = partition(workload.nas_count, count, index)
+        part['seed'] = settings['seed'] + index
+        part['workload'] = dataclasses.replace(
+            workload,
+            users=size,
+            arrival_rate=workload.arrival_rate * size / workload.users,
+            nas_count=nas_count,
+            nas_offset=workload.nas_offset + nas_offset,
+            reboot_times=[(at, nas - nas_offset) for at, nas in workload.reboot_times
+                          if nas_offset <= nas < nas_offset + nas_count],
+        )
+    return part
+
+
+def validate(tester: RadiusLoadTester, count: int):
+    if tester.concurrent_users < count:
+        raise ValueError(f"{count} workers need at least {count} users")
+    if tester.mode == 'model' and tester.workload.nas_count < count:
+        raise ValueError(f"{count} workers need at least {count} NAS in model mode")
+
+
+def serve_coordinator(conn):
+    """Run one slice for the coordinator on the other end of conn"""
+    try:
+        message, settings = conn.recv()
+        if message != 'prepare':
+            raise RuntimeError(f"Expected prepare, got {message}")
+        tester = build_tester(settings)
+
+        async def wait_for_start():
+            conn.send(('ready', {'worker': tester.worker_index, 'host': socket.gethostname()}))
+            message, start_at = await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+            if message != 'start':
+                raise RuntimeError(f"Expected start, got {message}")
+            return start_at
+
+        install_fast_event_loop()
+        total_time = asyncio.run(tester.generate_load(wait_for_start))
+        conn.send(('result', {
+            'worker': tester.worker_index,
+            'total_time': total_time,
+            'metrics': tester.metrics.to_dict(),
+        }))
+    except (EOFError, OSError):
+        # The coordinator has gone; nobody to report to
+        raise
+    except Exception as e:
+        logger.exception("Load agent failed")
+        conn.send(('error', f"{type(e).__name__}: {str(e)}"))
+
+
+def run_distributed(tester: RadiusLoadTester, connections: Sequence, start_delay: float = 2.0) -> int:
+    """Drive one slice per connection and report the merged results; returns the exit code"""
+    count = len(connections)
+    validate(tester, count)
+    tester.run_id = int(time.time())
+    tester.worker_count = count
+    settings = tester_settings(tester)
+
+    for index, conn in enumerate(connections):
+        conn.send(('prepare', slice_settings(settings, index, count)))
+
+    for index, conn in enumerate(connections):
+        if not conn.poll(READY_TIMEOUT):
+            raise RuntimeError(f"Worker {index} was not ready within {READY_TIMEOUT}s")
+        message, payload = conn.recv()
+        if message != 'ready':
+            raise RuntimeError(f"Worker {index} failed: {payload}")
+        logger.info(f"Worker {index} ready on {payload['host']}")
+
+    start_at = time.time() + start_delay
+    for conn in connections:
+        conn.send(('start', start_at))
+    logger.info(f"Starting {count} workers in {start_delay:.1f}s")
+
+    merged = MetricsRecorder()
+    total_time = 0.0
+    for index, conn in enumerate(connections):
+        message, payload = conn.recv()
+        if message != 'result':
+            raise RuntimeError(f"Worker {index} failed: {payload}")
+        metrics = MetricsRecorder.from_dict(payload['metrics'])
+        merged.merge(metrics)
+        total_time = max(total_time, payload['total_time'])
+        logger.info(f"Worker {index}: {metrics.counters['sessions']} sessions "
+                    f"in {payload['total_time']:.1f}s")
+
+    tester.metrics = merged
+    return tester.calculate_and_report_metrics(total_time)
+
+
+def agent_main(conn):
+    """Entry point of a local worker process"""
+    try:
+        serve_coordinator(conn)
+    finally:
+        conn.close()
+
+
+def run_local(tester: RadiusLoadTester, workers: int, start_delay: float = 1.0) -> int:
+    """Run the test from `workers` local processes"""
+    context = multiprocessing.get_context('spawn')
+    connections, processes = [], []
+    for index in range(workers):
+        parent, child = context.Pipe()
+        process = context.Process(target=agent_main, args=(child,), name=f'radius-load-{index}', daemon=True)
+        process.start()
+        child.close()
+        connections.append(parent)
+        processes.append(process)
+
+    try:
+        return run_distributed(tester, connections, start_delay)
+    finally:
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+
+def parse_address(value: str) -> Tuple[str, int]:
+    """HOST:PORT, or PORT on loopback"""
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def connect_agents(addresses: List[str], authkey: str) -> list:
+    return [Client(parse_address(address), authkey=authkey.encode()) for address in addresses]
+
+
+def serve_agent(address: str, authkey: str):
+    """Accept coordinators on address, one run at a time, until interrupted"""
+    with Listener(parse_address(address), authkey=authkey.encode()) as listener:
+        logger.info(f"Load agent listening on {address}")
+        while True:
+            conn = listener.accept()
+            logger.info(f"Coordinator connected from {listener.last_accepted}")
+            try:
+                serve_coordinator(conn)
+            except (EOFError, OSError) as e:
+                logger.warning(f"Coordinator connection lost: {str(e)}")
+            finally:
+                conn.close()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+HaroonNet ISP Platform - Fake RADIUS Server and NAS
+Asyncio UDP stand-ins for FreeRADIUS and a NAS CoA endpoint, so the load
+test and the worker's CoA tasks can run without outside services
+
+FakeRadiusServer answers Access-Request and Accounting-Request. FakeNas
+answers CoA-Request and Disconnect-Request and remembers the rate limits and
+disconnects it was sent. Both can:
+- wait a fixed latency plus random jitter before replying
+- drop a fraction of requests (loss)
+- reject a fraction of requests: Access-Reject or CoA/Disconnect-NAK.
+  Rejected accounting gets no reply, as RFC 2866 has no negative response.
+
+Requests whose authenticator does not match the secret are dropped and
+counted as invalid. Everything received is counted by request type and
+outcome, for example `auth_accepted` or `acct_start_lost`.
+
+    python tests/load/radius/fake_radius.py --latency 0.002 --loss 0.01 --reject 0.05
+    python tests/load/radius/test_radius_load.py --mode open --rate 2000 --duration 60
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import struct
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import radius_client as rc
+
+logger = logging.getLogger(__name__)
+
+ERROR_CAUSE_UNAVAILABLE = 503  # Resources Unavailable (RFC 5176)
+
+ACCT_STATUS_NAMES = {1: 'start', 2: 'stop', 3: 'interim', 7: 'on', 8: 'off'}
+
+
+@dataclass
+class ResponderConfig:
+    secret: bytes = b'testing123'
+    latency: float = 0.0  # Seconds before every reply
+    jitter: float = 0.0  # Extra uniform delay of up to this many seconds
+    loss: float = 0.0  # Fraction of requests dropped without a reply
+    reject: float = 0.0  # Fraction of requests rejected or NAKed
+    verify: bool = True  # Drop requests whose authenticator does not match the secret
+    seed: Optional[int] = None
+
+
+class _Endpoint(asyncio.DatagramProtocol):
+    def __init__(self, responder: 'Responder'):
+        self.responder = responder
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.responder.handle(self.transport, data, addr)
+
+
+class Responder:
+    """Shared reply logic; subclasses map request codes to replies"""
+
+    # request code: (counter prefix, accept code, reject code or None for no reply)
+    REPLIES: Dict[int, Tuple[str, int, Optional[int]]] = {}
+
+    def __init__(self, config: ResponderConfig = None, host: str = '127.0.0.1'):
+        self.config = config or ResponderConfig()
+        self.host = host
+        self.counters = Counter()
+        self.random = random.Random(self.config.seed)
+        self.transports = []
+
+    async def _bind(self, port: int) -> int:
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _Endpoint(self), local_addr=(self.host, port))
+        self.transports.append(transport)
+        return transport.get_extra_info('sockname')[1]
+
+    async def close(self):
+        for transport in self.transports:
+            transport.close()
+        self.transports = []
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+    def verify(self, request: rc.Packet) -> bool:
+        return rc.verify_request(request.raw, self.config.secret)
+
+    def request_name(self, request: rc.Packet) -> str:
+        return self.REPLIES[request.code][0]
+
+    def reply_attributes(self, request: rc.Packet, rejected: bool) -> list:
+        return []
+
+    def received(self, request: rc.Packet):
+        """Hook for requests that are answered positively"""
+
+    def handle(self, transport, data: bytes, addr):
+        try:
+            request = rc.decode(data)
+        except (struct.error, ValueError):
+            self.counters['malformed'] += 1
+            return
+        if request.code not in self.REPLIES:
+            self.counters['unexpected'] += 1
+            return
+
+        name = self.request_name(request)
+        config = self.config
+        if config.verify and not self.verify(request):
+            self.counters[f'{name}_invalid'] += 1
+            return
+        if config.loss and self.random.random() < config.loss:
+            self.counters[f'{name}_lost'] += 1
+            return
+
+        _, accept_code, reject_code = self.REPLIES[request.code]
+        rejected = bool(config.reject) and self.random.random() < config.reject
+        if rejected:
+            self.counters[f'{name}_rejected'] += 1
+            if reject_code is None:
+                return
+        else:
+            self.counters[f'{name}_accepted'] += 1
+            self.received(request)
+
+        reply = rc.build_reply(request, reject_code if rejected else accept_code, config.secret,
+                               self.reply_attributes(request, rejected))
+        delay = config.latency + (self.random.uniform(0, config.jitter) if config.jitter else 0)
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, transport.sendto, reply, addr)
+        else:
+            transport.sendto(reply, addr)
+
+
+class FakeRadiusServer(Responder):
+    """Authentication and accounting server"""
+
+    REPLIES = {
+        rc.ACCESS_REQUEST: ('auth', rc.ACCESS_ACCEPT, rc.ACCESS_REJECT),
+        rc.ACCOUNTING_REQUEST: ('acct', rc.ACCOUNTING_RESPONSE, None),
+    }
+
+    def __init__(self, config: ResponderConfig = None, host: str = '127.0.0.1'):
+        super().__init__(config, host)
+        self.auth_port = None
+        self.acct_port = None
+
+    async def start(self, auth_port: int = 0, acct_port: int = 0) -> 'FakeRadiusServer':
+        """Bind the ports (0 picks free ones, see auth_port/acct_port)"""
+        self.auth_port = await self._bind(auth_port)
+        self.acct_port = await self._bind(acct_port)
+        return self
+
+    def verify(self, request: rc.Packet) -> bool:
+        if request.code == rc.ACCESS_REQUEST:
+            return rc.verify_access_request(request.raw, self.config.secret)
+        return super().verify(request)
+
+    def request_name(self, request: rc.Packet) -> str:
+        if request.code == rc.ACCOUNTING_REQUEST:
+            status = request.get('Acct-Status-Type')
+            return f"acct_{ACCT_STATUS_NAMES.get(status, 'other')}"
+        return 'auth'
+
+    def reply_attributes(self, request: rc.Packet, rejected: bool) -> list:
+        if request.code == rc.ACCESS_REQUEST and rejected:
+            return [('Reply-Message', 'Rejected by fake server')]
+        return []
+
+
+class FakeNas(Responder):
+    """NAS dynamic authorization endpoint (RFC 5176)"""
+
+    REPLIES = {
+        rc.COA_REQUEST: ('coa', rc.COA_ACK, rc.COA_NAK),
+        rc.DISCONNECT_REQUEST: ('disconnect', rc.DISCONNECT_ACK, rc.DISCONNECT_NAK),
+    }
+
+    def __init__(self, config: ResponderConfig = None, host: str = '127.0.0.1'):
+        super().__init__(config, host)
+        self.port = None
+        self.rate_limits: Dict[str, str] = {}
+        self.disconnects = Counter()
+
+    async def start(self, port: int = 0) -> 'FakeNas':
+        self.port = await self._bind(port)
+        return self
+
+    def reply_attributes(self, request: rc.Packet, rejected: bool) -> list:
+        return [('Error-Cause', ERROR_CAUSE_UNAVAILABLE)] if rejected else []
+
+    def received(self, request: rc.Packet):
+        username = request.get('User-Name')
+        if request.code == rc.DISCONNECT_REQUEST:
+            self.disconnects[username] += 1
+        elif request.get('Mikrotik-Rate-Limit') is not None:
+            self.rate_limits[username] = request.get('Mikrotik-Rate-Limit')
+
+
+async def serve(args):
+    config = ResponderConfig(secret=args.secret.encode(), latency=args.latency, jitter=args.jitter,
+                             loss=args.loss, reject=args.reject, seed=args.seed)
+    server = await FakeRadiusServer(config, args.host).start(args.auth_port, args.acct_port)
+    nas = await FakeNas(config, args.host).start(args.coa_port)
+    logger.info(f"Fake RADIUS on {args.host}:{server.auth_port}/{server.acct_port}, "
+                f"fake NAS CoA on {args.host}:{nas.port}")
+    try:
+        while True:
+            await asyncio.sleep(args.stats_interval)
+            logger.info(f"Server {server.stats()} NAS {nas.stats()}")
+    finally:
+        await server.close()
+        await nas.close()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Fake RADIUS server and NAS CoA endpoint')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind')
+    parser.add_argument('--auth-port', type=int, default=1812, help='Authentication port')
+    parser.add_argument('--acct-port', type=int, default=1813, help='Accounting port')
+    parser.add_argument('--coa-port', type=int, default=3799, help='CoA/Disconnect port')
+    parser.add_argument('--secret', default='testing123', help='RADIUS shared secret')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before every reply')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay of up to this many seconds')
+    parser.add_argument('--loss', type=float, default=0.0, help='Fraction of requests dropped')
+    parser.add_argument('--reject', type=float, default=0.0, help='Fraction of requests rejected or NAKed')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for loss, reject and jitter')
+    parser.add_argument('--stats-interval', type=float, default=10.0, help='Seconds between counter logs')
+    args = parser.parse_args()
+
+    rc.install_fast_event_loop()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+HaroonNet ISP Platform - Async RADIUS Client
+Minimal RADIUS codec (RFC 2865/2866/5176) and an asyncio UDP client that
+multiplexes requests over a small socket pool by packet identifier
+
+Each socket carries up to 256 outstanding requests (one per identifier), so a
+handful of sockets replaces one blocking socket per simulated user. Replies
+are matched by identifier and checked against the request authenticator, so
+a late reply to a reused identifier is dropped rather than misattributed.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import socket
+import struct
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Packet codes
+ACCESS_REQUEST = 1
+ACCESS_ACCEPT = 2
+ACCESS_REJECT = 3
+ACCOUNTING_REQUEST = 4
+ACCOUNTING_RESPONSE = 5
+DISCONNECT_REQUEST = 40
+DISCONNECT_ACK = 41
+DISCONNECT_NAK = 42
+COA_REQUEST = 43
+COA_ACK = 44
+COA_NAK = 45
+
+# name: (type code, data type)
+ATTRIBUTES = {
+    'User-Name': (1, 'string'),
+    'User-Password': (2, 'password'),
+    'NAS-IP-Address': (4, 'ipaddr'),
+    'NAS-Port': (5, 'integer'),
+    'Service-Type': (6, 'integer'),
+    'Framed-Protocol': (7, 'integer'),
+    'Framed-IP-Address': (8, 'ipaddr'),
+    'Reply-Message': (18, 'string'),
+    'Class': (25, 'octets'),
+    'Vendor-Specific': (26, 'octets'),
+    'Session-Timeout': (27, 'integer'),
+    'Calling-Station-Id': (31, 'string'),
+    'NAS-Identifier': (32, 'string'),
+    'Acct-Status-Type': (40, 'integer'),
+    'Acct-Delay-Time': (41, 'integer'),
+    'Acct-Input-Octets': (42, 'integer'),
+    'Acct-Output-Octets': (43, 'integer'),
+    'Acct-Session-Id': (44, 'string'),
+    'Acct-Session-Time': (46, 'integer'),
+    'Acct-Terminate-Cause': (49, 'integer'),
+    'Acct-Input-Gigawords': (52, 'integer'),
+    'Acct-Output-Gigawords': (53, 'integer'),
+    'Event-Timestamp': (55, 'integer'),
+    'NAS-Port-Type': (61, 'integer'),
+    'Message-Authenticator': (80, 'octets'),
+    'Error-Cause': (101, 'integer'),
+}
+
+ATTRIBUTE_NAMES = {code: name for name, (code, _) in ATTRIBUTES.items()}
+
+# Vendor-Specific attributes (RFC 2865 section 5.26) name: (vendor id, type code, data type)
+VENDOR_ATTRIBUTES = {
+    'Mikrotik-Rate-Limit': (14988, 8, 'string'),
+}
+
+VENDOR_ATTRIBUTE_NAMES = {(vendor, code): name for name, (vendor, code, _) in VENDOR_ATTRIBUTES.items()}
+
+VALUES = {
+    'Service-Type': {'Framed-User': 2},
+    'Framed-Protocol': {'PPP': 1},
+    'Acct-Status-Type': {'Start': 1, 'Stop': 2, 'Interim-Update': 3, 'Accounting-On': 7, 'Accounting-Off': 8},
+    'Acct-Terminate-Cause': {'User-Request': 1, 'Lost-Carrier': 2, 'Idle-Timeout': 4, 'Session-Timeout': 5,
+                             'Admin-Reset': 6, 'NAS-Reboot': 11},
+    'NAS-Port-Type': {'Virtual': 5, 'Ethernet': 15},
+}
+
+HEADER = struct.Struct('!BBH16s')
+SOCKET_BUFFER = 4 * 1024 * 1024  # Capped by net.core.rmem_max/wmem_max
+ZERO_AUTHENTICATOR = bytes(16)
+
+
+class RadiusTimeout(Exception):
+    """No valid reply within the timeout (after retries)"""
+
+
+class Packet:
+    """A decoded RADIUS packet; attributes map names to lists of values"""
+
+    __slots__ = ('code', 'identifier', 'authenticator', 'attributes', 'raw')
+
+    def __init__(self, code: int, identifier: int, authenticator: bytes, attributes: Dict[str, list], raw: bytes):
+        self.code = code
+        self.identifier = identifier
+        self.authenticator = authenticator
+        self.attributes = attributes
+        self.raw = raw
+
+    def get(self, name: str, default=None):
+        values = self.attributes.get(name)
+        return values[0] if values else default
+
+
+def encrypt_password(password: bytes, secret: bytes, authenticator: bytes) -> bytes:
+    """User-Password hiding (RFC 2865 section 5.2)"""
+    padded = password.ljust(max(16, (len(password) + 15) // 16 * 16), b'\0')
+    result = bytearray()
+    last = authenticator
+    for i in range(0, len(padded), 16):
+        digest = hashlib.md5(secret + last).digest()
+        block = bytes(a ^ b for a, b in zip(padded[i:i + 16], digest))
+        result += block
+        last = block
+    return bytes(result)
+
+
+def encode_value(name: str, value, secret: bytes, authenticator: bytes) -> bytes:
+    kind = ATTRIBUTES[name][1] if name in ATTRIBUTES else VENDOR_ATTRIBUTES[name][2]
+    if isinstance(value, str) and name in VALUES:
+        value = VALUES[name][value]
+    if kind == 'integer':
+        return struct.pack('!I', value)
+    if kind == 'ipaddr':
+        return socket.inet_aton(value)
+    if kind == 'password':
+        return encrypt_password(value.encode() if isinstance(value, str) else value, secret, authenticator)
+    return value.encode() if isinstance(value, str) else value
+
+
+def _encode_attribute(name: str, value, secret: bytes, authenticator: bytes) -> bytes:
+    data = encode_value(name, value, secret, authenticator)
+    if name in VENDOR_ATTRIBUTES:
+        vendor, code, _ = VENDOR_ATTRIBUTES[name]
+        data = struct.pack('!IBB', vendor, code, len(data) + 2) + data
+        return bytes((26, len(data) + 2)) + data
+    return bytes((ATTRIBUTES[name][0], len(data) + 2)) + data
+
+
+# NAS addresses, ports and status types repeat across packets
+_encode_plain_attribute = lru_cache(maxsize=65536)(
+    lambda name, value: _encode_attribute(name, value, b'', ZERO_AUTHENTICATOR))
+
+
+def encode_attributes(attributes: Iterable[Tuple[str, object]], secret: bytes, authenticator: bytes) -> bytes:
+    return b''.join(
+        _encode_attribute(name, value, secret, authenticator) if name == 'User-Password'
+        else _encode_plain_attribute(name, value)
+        for name, value in attributes
+    )
+
+
+def decode_attributes(data: bytes) -> Dict[str, list]:
+    attributes: Dict[str, list] = {}
+    offset = 0
+    while offset + 2 <= len(data):
+        code, length = data[offset], data[offset + 1]
+        if length < 2:
+            break
+        value = data[offset + 2:offset + length]
+        name = ATTRIBUTE_NAMES.get(code, str(code))
+        kind = ATTRIBUTES[name][1] if name in ATTRIBUTES else 'octets'
+        if code == 26 and len(value) >= 8:
+            vendor, vendor_code, vendor_length = struct.unpack_from('!IBB', value)
+            if (vendor, vendor_code) in VENDOR_ATTRIBUTE_NAMES:
+                name = VENDOR_ATTRIBUTE_NAMES[(vendor, vendor_code)]
+                kind = VENDOR_ATTRIBUTES[name][2]
+                value = value[6:4 + vendor_length]
+        if kind == 'integer' and len(value) == 4:
+            value = struct.unpack('!I', value)[0]
+        elif kind == 'ipaddr' and len(value) == 4:
+            value = socket.inet_ntoa(value)
+        elif kind == 'string':
+            value = value.decode(errors='replace')
+        attributes.setdefault(name, []).append(value)
+        offset += length
+    return attributes
+
+
+def decode(data: bytes) -> Packet:
+    code, identifier, length, authenticator = HEADER.unpack_from(data)
+    return Packet(code, identifier, authenticator, decode_attributes(data[HEADER.size:length]), data[:length])
+
+
+def _message_authenticator(packet: bytes, secret: bytes) -> bytes:
+    return hmac.new(secret, packet, hashlib.md5).digest()
+
+
+def build_request(code: int, identifier: int, secret: bytes, attributes: Sequence[Tuple[str, object]]) -> bytes:
+    """Encode a request with the authenticator its code requires"""
+    if code == ACCESS_REQUEST:
+        authenticator = os.urandom(16)
+        body = encode_attributes(attributes, secret, authenticator)
+        # Message-Authenticator (RFC 3579), required by current FreeRADIUS defaults
+        body += b'\x50\x12' + ZERO_AUTHENTICATOR
+        header = HEADER.pack(code, identifier, HEADER.size + len(body), authenticator)
+        return header + body[:-16] + _message_authenticator(header + body, secret)
+
+    # Accounting, CoA and Disconnect: MD5 over the packet with a zero authenticator
+    body = encode_attributes(attributes, secret, ZERO_AUTHENTICATOR)
+    length = HEADER.size + len(body)
+    authenticator = hashlib.md5(HEADER.pack(code, identifier, length, ZERO_AUTHENTICATOR) + body + secret).digest()
+    return HEADER.pack(code, identifier, length, authenticator) + body
+
+
+def build_reply(request: Packet, code: int, secret: bytes, attributes: Sequence[Tuple[str, object]] = ()) -> bytes:
+    """Encode a reply to a decoded request"""
+    body = encode_attributes(attributes, secret, request.authenticator)
+    length = HEADER.size + len(body)
+    authenticator = hashlib.md5(HEADER.pack(code, request.identifier, length, request.authenticator)
+                                + body + secret).digest()
+    return HEADER.pack(code, request.identifier, length, authenticator) + body
+
+
+def verify_reply(data: bytes, request_authenticator: bytes, secret: bytes) -> bool:
+    if len(data) < HEADER.size:
+        return False
+    length = struct.unpack_from('!H', data, 2)[0]
+    expected = hashlib.md5(data[:4] + request_authenticator + data[HEADER.size:length] + secret).digest()
+    return hmac.compare_digest(expected, data[4:20])
+
+
+def verify_access_request(data: bytes, secret: bytes) -> bool:
+    """Check an Access-Request's Message-Authenticator, if it has one"""
+    length = struct.unpack_from('!H', data, 2)[0]
+    offset = HEADER.size
+    while offset + 2 <= length:
+        code, attribute_length = data[offset], data[offset + 1]
+        if attribute_length < 2:
+            return False
+        if code == 80 and attribute_length == 18:
+            zeroed = data[:offset + 2] + ZERO_AUTHENTICATOR + data[offset + 18:length]
+            return hmac.compare_digest(_message_authenticator(zeroed, secret), data[offset + 2:offset + 18])
+        offset += attribute_length
+    return True
+
+
+def verify_request(data: bytes, secret: bytes) -> bool:
+    """Check an Accounting/CoA/Disconnect request authenticator"""
+    length = struct.unpack_from('!H', data, 2)[0]
+    expected = hashlib.md5(data[:4] + ZERO_AUTHENTICATOR + data[HEADER.size:length] + secret).digest()
+    return hmac.compare_digest(expected, data[4:20])
+
+
+class _Pending:
+    __slots__ = ('future', 'packet', 'authenticator', 'sent_at', 'attempts', 'deadline')
+
+    def __init__(self, future, packet, sent_at, deadline):
+        self.future = future
+        self.packet = packet
+        self.authenticator = packet[4:20]
+        self.sent_at = sent_at
+        self.attempts = 1
+        self.deadline = deadline
+
+
+class _SocketProtocol(asyncio.DatagramProtocol):
+    """One UDP socket with its own identifier space"""
+
+    def __init__(self, client: 'RadiusClient'):
+        self.client = client
+        self.transport = None
+        self.free_ids = deque(range(256))
+        self.pending: Dict[int, _Pending] = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        # Up to 256 replies can arrive in one burst per socket
+        sock = transport.get_extra_info('socket')
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+
+    def datagram_received(self, data, addr):
+        if len(data) < HEADER.size:
+            return
+        pending = self.pending.get(data[1])
+        if pending is None or not verify_reply(data, pending.authenticator, self.client.secret):
+            self.client.stray_replies += 1
+            return
+        self._finish(data[1], pending)
+        pending.future.set_result((data, time.perf_counter() - pending.sent_at))
+
+    def error_received(self, exc):
+        # ICMP port unreachable and the like; requests time out on their own
+        self.client.socket_errors += 1
+
+    def send(self, identifier: int, pending: _Pending):
+        self.pending[identifier] = pending
+        self.transport.sendto(pending.packet)
+
+    def expire(self, now: float):
+        """Retransmit or time out requests past their deadline"""
+        for identifier, pending in list(self.pending.items()):
+            if pending.deadline > now:
+                continue
+            if pending.attempts <= self.client.retries:
+                pending.attempts += 1
+                pending.deadline = now + self.client.timeout
+                self.transport.sendto(pending.packet)
+                continue
+            self._finish(identifier, pending)
+            if not pending.future.done():
+                pending.future.set_exception(RadiusTimeout(f"No reply after {pending.attempts} attempt(s)"))
+
+    def _finish(self, identifier: int, pending: _Pending):
+        del self.pending[identifier]
+        self.free_ids.append(identifier)
+        self.client._release()
+
+
+class RadiusClient:
+    """Asyncio RADIUS client for one server port over a small socket pool"""
+
+    def __init__(self, server: str, port: int, secret: bytes, sockets: int = 4, timeout: float = 3.0,
+                 retries: int = 0, local_ports: Optional[Sequence[int]] = None, bind: str = '0.0.0.0'):
+        self.server = server
+        self.port = port
+        self.secret = secret
+        self.socket_count = len(local_ports) if local_ports else sockets
+        self.local_ports = list(local_ports) if local_ports else [0] * sockets
+        self.bind = bind
+        self.timeout = timeout
+        self.retries = retries
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.sockets: List[_SocketProtocol] = []
+        self._next = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stray_replies = 0
+        self.socket_errors = 0
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(256 * self.socket_count)
+        for port in self.local_ports:
+            _, protocol = await self.loop.create_datagram_endpoint(
+                lambda: _SocketProtocol(self), local_addr=(self.bind, port), remote_addr=(self.server, self.port))
+            self.sockets.append(protocol)
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def _sweep(self):
+        # One periodic scan instead of a timer handle per request
+        interval = min(self.timeout / 4, 0.1)
+        while True:
+            await asyncio.sleep(interval)
+            now = time.perf_counter()
+            for protocol in self.sockets:
+                protocol.expire(now)
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        for protocol in self.sockets:
+            for pending in list(protocol.pending.values()):
+                if not pending.future.done():
+                    pending.future.cancel()
+            protocol.transport.close()
+        self.sockets = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _release(self):
+        self._slots.release()
+
+    def _pick_socket(self) -> _SocketProtocol:
+        # The semaphore guarantees at least one socket has a free identifier
+        for _ in range(self.socket_count):
+            protocol = self.sockets[self._next]
+            self._next = (self._next + 1) % self.socket_count
+            if protocol.free_ids:
+                return protocol
+        raise RuntimeError("No free RADIUS identifiers")
+
+    async def request(self, code: int, attributes: Sequence[Tuple[str, object]]) -> Tuple[Packet, float]:
+        """Send a request and wait for its reply; returns (reply, seconds)"""
+        await self._slots.acquire()
+        protocol = self._pick_socket()
+        identifier = protocol.free_ids.popleft()
+        packet = build_request(code, identifier, self.secret, attributes)
+        now = time.perf_counter()
+        pending = _Pending(self.loop.create_future(), packet, now, now + self.timeout)
+        protocol.send(identifier, pending)
+        data, latency = await pending.future
+        return decode(data), latency
+
+    def in_flight(self) -> int:
+        return sum(len(protocol.pending) for protocol in self.sockets)
+
+
+def install_fast_event_loop() -> bool:
+    """Use uvloop when it is installed"""
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
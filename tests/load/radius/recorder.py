@@ -0,0 +1,255 @@
+"""
+HaroonNet ISP Platform - Load Test Metrics Recorder
+Streaming latency histograms, counters and interval snapshots
+
+Latencies go into HDR-style log-linear histograms: exact below
+2**SUB_BUCKET_BITS microseconds, then SUB_BUCKET_BITS-1 bits of mantissa per
+power of two (under 1% relative error). Memory is a few thousand integers per
+histogram however long the run. Histograms and counters merge by addition,
+so each event loop or process records into its own recorder without locks
+and the results are combined at the end.
+
+Every `interval` seconds the recorder appends one JSON line with that
+window's request counts, throughput and p50/p99 per histogram.
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Dict, Iterable, Optional
+
+SUB_BUCKET_BITS = 8
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_BUCKETS = SUB_BUCKETS >> 1
+MAX_MICROSECONDS = 3600 * 1_000_000  # Larger values are clamped
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_BUCKETS + (value >> shift) - HALF_BUCKETS
+
+
+def bucket_range(index: int) -> tuple:
+    """Lowest and highest value (microseconds) counted in a bucket"""
+    if index < SUB_BUCKETS:
+        return index, index
+    shift, top = divmod(index - SUB_BUCKETS, HALF_BUCKETS)
+    shift += 1
+    top += HALF_BUCKETS
+    return top << shift, ((top + 1) << shift) - 1
+
+
+BUCKET_COUNT = bucket_index(MAX_MICROSECONDS) + 1
+
+
+class Histogram:
+    """Latency histogram in seconds, stored as microsecond buckets"""
+
+    __slots__ = ('counts', 'total', 'sum', 'min', 'max')
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, seconds: float, count: int = 1):
+        value = min(max(int(seconds * 1_000_000), 0), MAX_MICROSECONDS)
+        self.counts[bucket_index(value)] += count
+        self.total += count
+        self.sum += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> float:
+        """Value in seconds at or below which p percent of recordings fall"""
+        if not self.total:
+            return 0.0
+        rank = max(1, -(-self.total * p // 100))  # ceil
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                low, high = bucket_range(index)
+                return min(max((low + high) / 2, self.min), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def mean(self) -> float:
+        return self.sum / self.total / 1_000_000 if self.total else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        """Statistics in seconds, in the load test report's format"""
+        if not self.total:
+            return {'min': 0, 'max': 0, 'avg': 0, 'p50': 0, 'p95': 0, 'p99': 0}
+        return {
+            'min': self.min / 1_000_000,
+            'max': self.max / 1_000_000,
+            'avg': self.mean(),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+    def merge(self, other: 'Histogram') -> 'Histogram':
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+        return self
+
+    def copy(self) -> 'Histogram':
+        return Histogram().merge(self)
+
+    def since(self, earlier: 'Histogram') -> 'Histogram':
+        """Recordings made after `earlier` was copied from this histogram"""
+        window = Histogram()
+        window.counts = [now - before for now, before in zip(self.counts, earlier.counts)]
+        window.total = self.total - earlier.total
+        window.sum = self.sum - earlier.sum
+        nonzero = [index for index, count in enumerate(window.counts) if count]
+        if nonzero:
+            window.min = max(bucket_range(nonzero[0])[0], self.min)
+            window.max = min(bucket_range(nonzero[-1])[1], self.max)
+        return window
+
+    def to_dict(self) -> dict:
+        return {
+            'total': self.total,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'buckets': {str(index): count for index, count in enumerate(self.counts) if count},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Histogram':
+        histogram = cls()
+        for index, count in data['buckets'].items():
+            histogram.counts[int(index)] = count
+        histogram.total = data['total']
+        histogram.sum = data['sum']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+
+class MetricsRecorder:
+    """Named counters and latency histograms for one event loop"""
+
+    def __init__(self, histograms: Iterable[str] = (), throughput: Iterable[str] = None):
+        self.counters = Counter()
+        self.histograms: Dict[str, Histogram] = {name: Histogram() for name in histograms}
+        # Histograms whose recordings make up the snapshot throughput (default: all)
+        self.throughput = set(throughput) if throughput is not None else None
+        self.started = time.time()
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._snapshot_file = None
+        self._last = None
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] += value
+
+    def record(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(seconds)
+
+    def histogram(self, name: str) -> Histogram:
+        return self.histograms.get(name) or Histogram()
+
+    def merge(self, other: 'MetricsRecorder') -> 'MetricsRecorder':
+        self.counters.update(other.counters)
+        for name, histogram in other.histograms.items():
+            self.histograms.setdefault(name, Histogram()).merge(histogram)
+        self.started = min(self.started, other.started)
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            'started': self.started,
+            'counters': dict(self.counters),
+            'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'MetricsRecorder':
+        recorder = cls()
+        recorder.started = data['started']
+        recorder.counters.update(data['counters'])
+        recorder.histograms = {name: Histogram.from_dict(histogram)
+                               for name, histogram in data['histograms'].items()}
+        return recorder
+
+    def _state(self) -> tuple:
+        return (time.time(), self.counters.copy(),
+                {name: histogram.copy() for name, histogram in self.histograms.items()})
+
+    def snapshot(self) -> dict:
+        """Counts, throughput and latency for the window since the previous snapshot"""
+        now, counters, histograms = state = self._state()
+        since, last_counters, last_histograms = self._last or (self.started, Counter(), {})
+        self._last = state
+
+        window = max(now - since, 1e-9)
+        counts = {name: value - last_counters.get(name, 0) for name, value in counters.items()}
+        latency = {}
+        requests = 0
+        for name, histogram in histograms.items():
+            interval = histogram.since(last_histograms[name]) if name in last_histograms else histogram
+            if self.throughput is None or name in self.throughput:
+                requests += interval.total
+            latency[name] = {
+                'count': interval.total,
+                'p50_ms': round(interval.percentile(50) * 1000, 3),
+                'p99_ms': round(interval.percentile(99) * 1000, 3),
+            }
+        return {
+            'time': round(now, 3),
+            'elapsed': round(now - self.started, 3),
+            'window': round(window, 3),
+            'throughput_per_second': round(requests / window, 1),
+            'counts': counts,
+            'latency': latency,
+        }
+
+    def write_snapshot(self):
+        if self._snapshot_file is not None:
+            self._snapshot_file.write(json.dumps(self.snapshot()) + '\n')
+            self._snapshot_file.flush()
+
+    def start_snapshots(self, path: str, interval: float = 10.0):
+        """Append a snapshot line to path every interval seconds (needs a running loop)"""
+        self._snapshot_file = open(path, 'a')
+        self._last = self._state()
+
+        async def writer():
+            while True:
+                await asyncio.sleep(interval)
+                self.write_snapshot()
+
+        self._snapshot_task = asyncio.get_running_loop().create_task(writer())
+
+    async def stop_snapshots(self):
+        """Write the final partial window and close the file"""
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+            self._snapshot_task = None
+        if self._snapshot_file is not None:
+            self.write_snapshot()
+            self._snapshot_file.close()
+            self._snapshot_file = None
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+HaroonNet ISP Platform - Load Generator Throughput Benchmark
+Requests per second the open-loop generator sustains against the fake RADIUS
+server as the offered rate grows
+
+The fake server runs in its own process on loopback, so no FreeRADIUS or
+network is needed. A rate the generator cannot keep up with shows as
+achieved < offered and a growing p99 (latency counts from the intended send
+time).
+
+    python tests/load/radius/test_generator_throughput.py [--rates 500 1000 2000] [--latency 0.001]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+
+from fake_radius import FakeRadiusServer, ResponderConfig
+from radius_client import install_fast_event_loop
+from test_radius_load import HISTOGRAMS, RadiusLoadTester
+
+
+def serve(conn, config: ResponderConfig):
+    """Fake server process: report the ports, serve until told to stop, report the counters"""
+    async def main():
+        server = await FakeRadiusServer(config).start()
+        conn.send((server.auth_port, server.acct_port))
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        await server.close()
+        conn.send(server.stats())
+
+    install_fast_event_loop()
+    asyncio.run(main())
+
+
+def run(rate: float, duration: float, ports, sockets: int) -> dict:
+    tester = RadiusLoadTester(server_ip='127.0.0.1', auth_port=ports[0], acct_port=ports[1],
+                              sockets=sockets, timeout=1.0)
+    tester.mode = 'open'
+    tester.arrival_rate = rate
+    tester.test_duration = duration
+    tester.concurrent_users = max(1000, int(rate * duration))
+    tester.session_hold = (0, 0)
+    tester.snapshot_interval = None
+
+    seconds = asyncio.run(tester.generate_load())
+    counters = tester.metrics.counters
+    requests = sum(tester.metrics.histogram(name).total for name in HISTOGRAMS)
+    return {
+        'offered_sessions_per_second': rate,
+        'achieved_sessions_per_second': counters['sessions'] / seconds,
+        'requests_per_second': requests / seconds,
+        'auth_p99_ms': tester.metrics.histogram('auth').percentile(99) * 1000,
+        'timeouts': counters['auth_timeout'] + counters['acct_timeout'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Open-loop generator throughput against the fake RADIUS server')
+    parser.add_argument('--rates', type=float, nargs='+', default=[250, 500, 1000, 2000],
+                        help='Offered sessions per second (three requests each)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per rate')
+    parser.add_argument('--sockets', type=int, default=4, help='UDP sockets per server port')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake server reply latency (seconds)')
+    parser.add_argument('--loss', type=float, default=0.0, help='Fake server loss ratio')
+    parser.add_argument('--json', action='store_true', help='Print JSON results')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    parent, child = context.Pipe()
+    config = ResponderConfig(latency=args.latency, loss=args.loss, seed=0)
+    process = context.Process(target=serve, args=(child, config), daemon=True)
+    process.start()
+    ports = parent.recv()
+
+    install_fast_event_loop()
+    try:
+        results = [run(rate, args.duration, ports, args.sockets) for rate in args.rates]
+    finally:
+        parent.send('stop')
+        server_stats = parent.recv()
+        process.join(timeout=5)
+
+    if args.json:
+        print(json.dumps({'results': results, 'server': server_stats}, indent=2))
+        return
+
+    print(f"{'offered/s':>10} {'sessions/s':>11} {'requests/s':>11} {'auth p99 ms':>12} {'timeouts':>9}")
+    for result in results:
+        print(f"{result['offered_sessions_per_second']:>10.0f} {result['achieved_sessions_per_second']:>11.0f} "
+              f"{result['requests_per_second']:>11.0f} {result['auth_p99_ms']:>12.2f} {result['timeouts']:>9}")
+    print(f"Server received: {server_stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,265 +2,400 @@
 """
 HaroonNet ISP Platform - RADIUS Load Test
 Tests RADIUS server performance under high load (10,000+ concurrent sessions)
+
+Sessions run as coroutines on one event loop and share a small pool of UDP
+sockets (see radius_client.py), so the tester is not the bottleneck.
+
+    closed loop: --users N virtual users each run sessions back to back
+    open loop:   --rate R new sessions per second, whether or not earlier ones finished
+    model:       replay a seeded WorkloadModel (workload.py) of diurnal arrivals,
+                 Interim-Updates and NAS reboots, --time-scale times faster than real time
+
+Every request has an intended send time: its slot in the open-loop or model
+schedule, the end of the session hold, or the reply it follows. Reported
+latency runs from that time, so when the server or the tester falls behind
+the delay counts against the server as it would for a NAS (no coordinated
+omission); a timeout counts as the time waited. The uncorrected figures,
+replies only and measured from the actual send, are reported alongside. A closed loop only sends when its users are free, so its
+latency still understates what an open population sees.
+
+One process tops out around 10k requests/second; --workers N (and --agent /
+--agents across hosts, see distributed.py) split the users over processes and
+merge their histograms into one report.
 """
 
 import asyncio
+import random
 import time
-import statistics
-from concurrent.futures import ThreadPoolExecutor
-from pyrad.client import Client
-from pyrad.dictionary import Dictionary
-from pyrad import packet
 import logging
 import json
 import sys
 import os
 
+from radius_client import (
+    ACCESS_ACCEPT, ACCESS_REQUEST, ACCOUNTING_REQUEST, ACCOUNTING_RESPONSE,
+    RadiusClient, RadiusTimeout, install_fast_event_loop,
+)
+from recorder import MetricsRecorder
+from workload import WorkloadConfig, WorkloadModel
+
+# Latency histogram per request kind, from the intended send time; each also
+# has an "_uncorrected" twin measured from the actual send
+HISTOGRAMS = ('auth', 'acct_start', 'acct_interim', 'acct_stop', 'acct_on')
+UNCORRECTED = tuple(f'{name}_uncorrected' for name in HISTOGRAMS)
+ACCT_METRICS = {'Start': 'acct_start', 'Interim-Update': 'acct_interim', 'Stop': 'acct_stop',
+                'Accounting-On': 'acct_on'}
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class RadiusLoadTester:
-    def __init__(self, server_ip='localhost', auth_port=1812, acct_port=1813, secret='testing123'):
+    def __init__(self, server_ip='localhost', auth_port=1812, acct_port=1813, secret='testing123',
+                 sockets=4, timeout=3.0, retries=0):
         self.server_ip = server_ip
         self.auth_port = auth_port
         self.acct_port = acct_port
         self.secret = secret.encode()
-        self.dictionary = Dictionary("dictionary")
+        self.sockets = sockets
+        self.timeout = timeout
+        self.retries = retries
 
         # Test configuration
+        self.mode = 'closed'
         self.concurrent_users = 10000
+        self.arrival_rate = 100.0  # Sessions per second (open loop)
         self.test_duration = 300  # 5 minutes
         self.ramp_up_time = 60   # 1 minute
+        self.session_hold = (10, 30)  # Seconds between Start and Stop
+        self.workload = WorkloadConfig()  # Model mode
+        self.seed = 0
+        self.time_scale = 60.0  # Model seconds per wall-clock second
+
+        # This process's share of a distributed run (see distributed.py)
+        self.user_offset = 0  # Users are user_offset + 1 .. user_offset + concurrent_users
+        self.worker_index = 0
+        self.worker_count = 1
+        self.source_port = None  # First local UDP port; ephemeral ports if None
 
         # Metrics
-        self.auth_success = 0
-        self.auth_failure = 0
-        self.auth_timeout = 0
-        self.acct_success = 0
-        self.acct_failure = 0
-        self.response_times = []
-
-    def create_radius_client(self):
-        """Create a RADIUS client instance"""
-        return Client(
-            server=self.server_ip,
-            authport=self.auth_port,
-            acctport=self.acct_port,
-            secret=self.secret,
-            dict=self.dictionary
-        )
-
-    def authenticate_user(self, username, password):
+        self.metrics = MetricsRecorder(HISTOGRAMS + UNCORRECTED, throughput=HISTOGRAMS)
+        self.snapshot_interval = 10.0  # Seconds per line in the intervals file (None: no file)
+        self.run_id = None
+
+        self.auth_client = None
+        self.acct_client = None
+
+    def create_radius_clients(self):
+        """Create the authentication and accounting clients"""
+        options = dict(secret=self.secret, sockets=self.sockets, timeout=self.timeout, retries=self.retries)
+        auth_ports = acct_ports = None
+        if self.source_port:
+            auth_ports = range(self.source_port, self.source_port + self.sockets)
+            acct_ports = range(self.source_port + self.sockets, self.source_port + 2 * self.sockets)
+        self.auth_client = RadiusClient(self.server_ip, self.auth_port, local_ports=auth_ports, **options)
+        self.acct_client = RadiusClient(self.server_ip, self.acct_port, local_ports=acct_ports, **options)
+
+    async def authenticate_user(self, username, password, intended=None):
         """Perform RADIUS authentication"""
-        start_time = time.time()
+        return await self.send_access_request(username, [
+            ('User-Name', username),
+            ('User-Password', password),
+            ('NAS-IP-Address', '192.168.1.1'),
+            ('NAS-Port', 1234),
+            ('Service-Type', 'Framed-User'),
+            ('Framed-Protocol', 'PPP'),
+        ], intended)
+
+    async def send_access_request(self, username, attributes, intended=None):
+        """Send an Access-Request; returns (accepted, seconds since the intended send time)"""
+        start_time = intended or time.perf_counter()
 
         try:
-            client = self.create_radius_client()
-
-            # Create authentication request
-            req = client.CreateAuthPacket(code=packet.AccessRequest)
-            req["User-Name"] = username
-            req["User-Password"] = req.PwCrypt(password)
-            req["NAS-IP-Address"] = "192.168.1.1"
-            req["NAS-Port"] = 1234
-            req["Service-Type"] = "Framed-User"
-            req["Framed-Protocol"] = "PPP"
-
-            # Send request
-            reply = client.SendPacket(req)
-
-            response_time = time.time() - start_time
-            self.response_times.append(response_time)
-
-            if reply.code == packet.AccessAccept:
-                self.auth_success += 1
-                return True, response_time
+            reply, response_time = await self.auth_client.request(ACCESS_REQUEST, attributes)
+            latency = time.perf_counter() - start_time
+            self.metrics.record('auth', latency)
+            self.metrics.record('auth_uncorrected', response_time)
+
+            if reply.code == ACCESS_ACCEPT:
+                self.metrics.count('auth_success')
+                return True, latency
             else:
-                self.auth_failure += 1
-                return False, response_time
-
+                self.metrics.count('auth_failure')
+                return False, latency
+
+        except RadiusTimeout:
+            # What the NAS waited before giving up counts against the server
+            self.metrics.count('auth_timeout')
+            self.metrics.record('auth', time.perf_counter() - start_time)
+            return False, time.perf_counter() - start_time
         except Exception as e:
-            self.auth_timeout += 1
+            self.metrics.count('auth_timeout')
             logger.error(f"Authentication error for {username}: {str(e)}")
-            return False, time.time() - start_time
+            return False, time.perf_counter() - start_time
 
-    def send_accounting(self, username, session_id, status_type):
+    async def send_accounting(self, username, session_id, status_type, session_time=0, intended=None):
         """Send RADIUS accounting packet"""
-        start_time = time.time()
+        attributes = [
+            ('User-Name', username),
+            ('Acct-Session-Id', session_id),
+            ('Acct-Status-Type', status_type),
+            ('NAS-IP-Address', '192.168.1.1'),
+            ('NAS-Port', 1234),
+        ]
+        if status_type == "Start":
+            attributes += [
+                ('Service-Type', 'Framed-User'),
+                ('Framed-Protocol', 'PPP'),
+                ('Framed-IP-Address', '10.1.1.1'),
+            ]
+        elif status_type == "Stop":
+            attributes += [
+                ('Acct-Session-Time', session_time),
+                ('Acct-Input-Octets', 1000000),
+                ('Acct-Output-Octets', 5000000),
+                ('Acct-Terminate-Cause', 'User-Request'),
+            ]
+        return await self.send_accounting_request(username, status_type, attributes, intended)
+
+    async def send_accounting_request(self, username, status_type, attributes, intended=None):
+        """Send an Accounting-Request; returns (acknowledged, seconds since the intended send time)"""
+        start_time = intended or time.perf_counter()
+        name = ACCT_METRICS[status_type]
 
         try:
-            client = self.create_radius_client()
-
-            # Create accounting request
-            req = client.CreateAcctPacket()
-            req["User-Name"] = username
-            req["Acct-Session-Id"] = session_id
-            req["Acct-Status-Type"] = status_type
-            req["NAS-IP-Address"] = "192.168.1.1"
-            req["NAS-Port"] = 1234
-
-            if status_type == "Start":
-                req["Service-Type"] = "Framed-User"
-                req["Framed-Protocol"] = "PPP"
-                req["Framed-IP-Address"] = "10.1.1.1"
-            elif status_type == "Stop":
-                req["Acct-Session-Time"] = 3600
-                req["Acct-Input-Octets"] = 1000000
-                req["Acct-Output-Octets"] = 5000000
-                req["Acct-Terminate-Cause"] = "User-Request"
-
-            # Send request
-            reply = client.SendPacket(req)
-
-            response_time = time.time() - start_time
-
-            if reply.code == packet.AccountingResponse:
-                self.acct_success += 1
-                return True, response_time
+            reply, response_time = await self.acct_client.request(ACCOUNTING_REQUEST, attributes)
+            latency = time.perf_counter() - start_time
+            self.metrics.record(name, latency)
+            self.metrics.record(f'{name}_uncorrected', response_time)
+
+            if reply.code == ACCOUNTING_RESPONSE:
+                self.metrics.count(f'{name}_success')
+                return True, latency
             else:
-                self.acct_failure += 1
-                return False, response_time
+                self.metrics.count('acct_failure')
+                return False, latency
 
+        except RadiusTimeout:
+            self.metrics.count('acct_timeout')
+            self.metrics.record(name, time.perf_counter() - start_time)
+            return False, time.perf_counter() - start_time
         except Exception as e:
+            self.metrics.count('acct_failure')
             logger.error(f"Accounting error for {username}: {str(e)}")
-            return False, time.time() - start_time
+            return False, time.perf_counter() - start_time
 
-    def simulate_user_session(self, user_id):
-        """Simulate a complete user session"""
+    async def simulate_user_session(self, user_id, intended=None):
+        """Simulate a complete user session starting at the intended time"""
         username = f"loadtest{user_id:06d}@haroonnet.com"
         password = "test123"
-        session_id = f"sess_{user_id}_{int(time.time())}"
-
-        session_metrics = {
-            'username': username,
-            'auth_success': False,
-            'acct_start_success': False,
-            'acct_stop_success': False,
-            'auth_time': 0,
-            'acct_start_time': 0,
-            'acct_stop_time': 0,
-            'total_time': 0
-        }
-
-        session_start = time.time()
+        session_id = f"sess_{user_id}_{time.time_ns()}"
+        self.metrics.count('sessions')
 
         # 1. Authentication
-        auth_success, auth_time = self.authenticate_user(username, password)
-        session_metrics['auth_success'] = auth_success
-        session_metrics['auth_time'] = auth_time
-
+        auth_success, _ = await self.authenticate_user(username, password, intended)
         if not auth_success:
-            session_metrics['total_time'] = time.time() - session_start
-            return session_metrics
+            return
 
-        # 2. Accounting Start
-        acct_start_success, acct_start_time = self.send_accounting(username, session_id, "Start")
-        session_metrics['acct_start_success'] = acct_start_success
-        session_metrics['acct_start_time'] = acct_start_time
+        # 2. Accounting Start, due as soon as the Access-Accept arrives
+        await self.send_accounting(username, session_id, "Start")
 
-        # 3. Simulate session duration (random between 60-300 seconds for load test)
-        import random
-        session_duration = random.randint(10, 30)  # Shorter for load test
-        time.sleep(session_duration)
+        # 3. Hold the session (shorter than real sessions for a load test)
+        session_duration = random.uniform(*self.session_hold)
+        stop_due = time.perf_counter() + session_duration
+        await asyncio.sleep(session_duration)
 
         # 4. Accounting Stop
-        acct_stop_success, acct_stop_time = self.send_accounting(username, session_id, "Stop")
-        session_metrics['acct_stop_success'] = acct_stop_success
-        session_metrics['acct_stop_time'] = acct_stop_time
-
-        session_metrics['total_time'] = time.time() - session_start
-
-        return session_metrics
-
-    def run_concurrent_load_test(self):
-        """Run concurrent load test with multiple users"""
-        logger.info(f"Starting RADIUS load test with {self.concurrent_users} concurrent users")
-
-        start_time = time.time()
-        session_results = []
-
-        # Calculate users per second for ramp-up
-        users_per_second = self.concurrent_users / self.ramp_up_time
-
-        with ThreadPoolExecutor(max_workers=min(self.concurrent_users, 500)) as executor:
-            futures = []
-
-            for user_id in range(1, self.concurrent_users + 1):
-                # Ramp-up delay
-                if user_id > 1:
-                    delay = (user_id - 1) / users_per_second
-                    if delay > 0:
-                        time.sleep(min(delay, 0.1))  # Max 100ms between users
+        await self.send_accounting(username, session_id, "Stop", session_time=int(session_duration),
+                                   intended=stop_due)
+
+    async def _closed_loop(self):
+        """Each virtual user runs sessions back to back until the test ends"""
+        started = time.perf_counter()
+        deadline = started + self.test_duration
+
+        async def virtual_user(user_id):
+            # Spread user start times evenly over the ramp-up
+            offset = self.ramp_up_time * (user_id - self.user_offset - 1) / self.concurrent_users
+            await asyncio.sleep(offset)
+            intended = started + offset
+            while time.perf_counter() < deadline:
+                await self.simulate_user_session(user_id, intended)
+                # Back to back: the next session is due when this one ends
+                intended = None
+
+        first = self.user_offset + 1
+        await asyncio.gather(*(virtual_user(user_id) for user_id in range(first, first + self.concurrent_users)))
+
+    async def _open_loop(self):
+        """Start sessions at a constant arrival rate regardless of completions"""
+        started = time.perf_counter()
+        total = int(self.arrival_rate * self.test_duration)
+        running = set()
+
+        # Workers take every worker_count-th slot of the overall schedule
+        for n, slot in enumerate(range(self.worker_index, total, self.worker_count)):
+            intended = started + slot / self.arrival_rate
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            task = asyncio.create_task(self.simulate_user_session(
+                self.user_offset + n % self.concurrent_users + 1, intended))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+            if (n + 1) % 10000 == 0:
+                logger.info(f"Started {n + 1} sessions ({len(running)} in progress)")
+
+        logger.info("Waiting for all sessions to complete...")
+        if running:
+            await asyncio.gather(*running)
+
+    async def _model_loop(self):
+        """Replay the workload model's events on its (time-scaled) schedule"""
+        model = WorkloadModel(self.workload, seed=self.seed, user_offset=self.user_offset)
+        started = time.perf_counter()
+        open_sessions = {}  # Acct-Session-Id -> NAS index
+        running = set()
+        sent = 0
+
+        async def deliver(event, intended):
+            if event.session is None:
+                username = model.nas_ips[event.nas_index]
+            else:
+                username = model.username(event.session.user_id)
+            if event.is_auth:
+                await self.send_access_request(username, event.attributes, intended)
+            else:
+                await self.send_accounting_request(username, event.status, event.attributes, intended)
+
+        for event in model.events(self.test_duration * self.time_scale):
+            intended = started + event.at / self.time_scale
+            # Yield even when behind schedule so replies are read as we go
+            await asyncio.sleep(max(0, intended - time.perf_counter()))
+
+            if event.status == 'Accounting-On':
+                # The NAS dropped these sessions; they never send a Stop
+                for session_id in [key for key, nas_index in open_sessions.items()
+                                   if nas_index == event.nas_index]:
+                    del open_sessions[session_id]
+            elif event.is_auth:
+                self.metrics.count('sessions')
+                open_sessions[event.session.session_id] = event.nas_index
+            elif event.status == 'Stop':
+                open_sessions.pop(event.session.session_id, None)
+
+            task = asyncio.create_task(deliver(event, intended))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+            sent += 1
+            if sent % 10000 == 0:
+                logger.info(f"Sent {sent} requests, model time {event.at / 3600:.1f}h "
+                            f"({len(open_sessions)} sessions online)")
+
+        logger.info("Waiting for outstanding requests...")
+        if running:
+            await asyncio.gather(*running)
+
+    async def run_load_test(self):
+        """Run the load test in the configured mode"""
+        total_time = await self.generate_load()
 
-                future = executor.submit(self.simulate_user_session, user_id)
-                futures.append(future)
+        # Calculate metrics
+        return self.calculate_and_report_metrics(total_time)
+
+    async def generate_load(self, wait_for_start=None):
+        """Send this process's traffic; returns seconds taken
+
+        wait_for_start, if given, is awaited once the sockets are bound and
+        returns the wall-clock time at which to begin.
+        """
+        if self.mode == 'open':
+            logger.info(f"Starting open-loop RADIUS load test at {self.arrival_rate} sessions/sec "
+                        f"for {self.test_duration}s")
+        elif self.mode == 'model':
+            logger.info(f"Starting model RADIUS load test: {self.workload.users} users on "
+                        f"{self.workload.nas_count} NAS, seed {self.seed}, "
+                        f"{self.test_duration * self.time_scale / 3600:.1f}h of model time")
+        else:
+            logger.info(f"Starting RADIUS load test with {self.concurrent_users} concurrent users")
 
-                # Progress logging
-                if user_id % 1000 == 0:
-                    logger.info(f"Started {user_id} user sessions")
+        self.create_radius_clients()
+        await self.auth_client.start()
+        await self.acct_client.start()
 
-            # Collect results
-            logger.info("Waiting for all sessions to complete...")
-            for i, future in enumerate(futures):
-                try:
-                    result = future.result(timeout=600)  # 10 minute timeout per session
-                    session_results.append(result)
+        if wait_for_start is not None:
+            # Sockets are bound; wait for the coordinator's common start time
+            start_at = await wait_for_start()
+            await asyncio.sleep(max(0, start_at - time.time()))
 
-                    if (i + 1) % 1000 == 0:
-                        logger.info(f"Completed {i + 1} sessions")
+        self.run_id = self.run_id or int(time.time())
+        suffix = f'_w{self.worker_index}' if self.worker_count > 1 else ''
+        self.metrics = MetricsRecorder(HISTOGRAMS + UNCORRECTED, throughput=HISTOGRAMS)
+        if self.snapshot_interval:
+            self.metrics.start_snapshots(f'radius_load_test_intervals_{self.run_id}{suffix}.jsonl',
+                                         self.snapshot_interval)
 
-                except Exception as e:
-                    logger.error(f"Session {i + 1} failed: {str(e)}")
+        start_time = time.perf_counter()
+        try:
+            if self.mode == 'open':
+                await self._open_loop()
+            elif self.mode == 'model':
+                await self._model_loop()
+            else:
+                await self._closed_loop()
+        finally:
+            await self.metrics.stop_snapshots()
+            await self.auth_client.close()
+            await self.acct_client.close()
 
-        total_time = time.time() - start_time
+        return time.perf_counter() - start_time
 
-        # Calculate metrics
-        self.calculate_and_report_metrics(session_results, total_time)
+    def run_concurrent_load_test(self):
+        """Run the load test on a fresh event loop; returns the exit code"""
+        install_fast_event_loop()
+        return asyncio.run(self.run_load_test())
 
-    def calculate_and_report_metrics(self, session_results, total_time):
+    def calculate_and_report_metrics(self, total_time):
         """Calculate and report test metrics"""
         logger.info("Calculating test metrics...")
 
         # Basic counts
-        total_sessions = len(session_results)
-        successful_auths = sum(1 for s in session_results if s['auth_success'])
-        successful_acct_starts = sum(1 for s in session_results if s['acct_start_success'])
-        successful_acct_stops = sum(1 for s in session_results if s['acct_stop_success'])
-
-        # Response time statistics
-        auth_times = [s['auth_time'] for s in session_results if s['auth_success']]
-        acct_start_times = [s['acct_start_time'] for s in session_results if s['acct_start_success']]
-        acct_stop_times = [s['acct_stop_time'] for s in session_results if s['acct_stop_success']]
-
-        # Calculate percentiles
-        def calculate_percentiles(times):
-            if not times:
-                return {'min': 0, 'max': 0, 'avg': 0, 'p50': 0, 'p95': 0, 'p99': 0}
-
-            return {
-                'min': min(times),
-                'max': max(times),
-                'avg': statistics.mean(times),
-                'p50': statistics.median(times),
-                'p95': self.percentile(times, 95),
-                'p99': self.percentile(times, 99)
-            }
-
-        auth_stats = calculate_percentiles(auth_times)
-        acct_start_stats = calculate_percentiles(acct_start_times)
-        acct_stop_stats = calculate_percentiles(acct_stop_times)
+        counters = self.metrics.counters
+        total_sessions = counters['sessions']
+        successful_auths = counters['auth_success']
+        successful_acct_starts = counters['acct_start_success']
+        successful_acct_stops = counters['acct_stop_success']
+        successful_acct_interims = counters['acct_interim_success']
+
+        # Response time statistics, from the intended send time and uncorrected
+        auth_stats = self.metrics.histogram('auth').summary()
+        acct_start_stats = self.metrics.histogram('acct_start').summary()
+        acct_stop_stats = self.metrics.histogram('acct_stop').summary()
+        acct_interim_stats = self.metrics.histogram('acct_interim').summary()
+        uncorrected_stats = {
+            report_name: self.metrics.histogram(f'{name}_uncorrected').summary()
+            for report_name, name in (('authentication', 'auth'), ('accounting_start', 'acct_start'),
+                                      ('accounting_interim', 'acct_interim'), ('accounting_stop', 'acct_stop'))
+        }
 
         # Throughput calculations
         auth_throughput = successful_auths / total_time
-        acct_throughput = (successful_acct_starts + successful_acct_stops) / total_time
+        acct_throughput = (successful_acct_starts + successful_acct_interims + successful_acct_stops) / total_time
 
         # Generate report
         report = {
             'test_configuration': {
+                'mode': self.mode,
                 'concurrent_users': self.concurrent_users,
+                'arrival_rate': self.arrival_rate if self.mode == 'open' else None,
                 'test_duration': total_time,
                 'ramp_up_time': self.ramp_up_time,
+                'seed': self.seed if self.mode == 'model' else None,
+                'time_scale': self.time_scale if self.mode == 'model' else None,
+                'workers': self.worker_count,
                 'server_ip': self.server_ip
             },
             'session_metrics': {
@@ -268,6 +403,8 @@ class RadiusLoadTester:
                 'successful_authentications': successful_auths,
                 'successful_acct_starts': successful_acct_starts,
                 'successful_acct_stops': successful_acct_stops,
+                'successful_acct_interims': successful_acct_interims,
+                'auth_timeouts': counters['auth_timeout'],
                 'auth_success_rate': (successful_auths / total_sessions) * 100 if total_sessions > 0 else 0,
                 'acct_success_rate': (successful_acct_starts / total_sessions) * 100 if total_sessions > 0 else 0
             },
@@ -279,31 +416,21 @@ class RadiusLoadTester:
             'response_time_metrics': {
                 'authentication': auth_stats,
                 'accounting_start': acct_start_stats,
-                'accounting_stop': acct_stop_stats
-            }
+                'accounting_interim': acct_interim_stats,
+                'accounting_stop': acct_stop_stats,
+                'latency_basis': 'intended_send_time'
+            },
+            'uncorrected_response_time_metrics': uncorrected_stats
         }
 
         # Print report
         self.print_report(report)
 
         # Save detailed results
-        self.save_results(report, session_results)
+        self.save_results(report)
 
         # Check if performance criteria are met
-        self.validate_performance_criteria(report)
-
-    def percentile(self, data, p):
-        """Calculate percentile"""
-        data_sorted = sorted(data)
-        index = (len(data_sorted) - 1) * p / 100
-        lower = int(index)
-        upper = lower + 1
-        weight = index - lower
-
-        if upper >= len(data_sorted):
-            return data_sorted[-1]
-
-        return data_sorted[lower] * (1 - weight) + data_sorted[upper] * weight
+        return self.validate_performance_criteria(report)
 
     def print_report(self, report):
         """Print test report"""
@@ -314,8 +441,16 @@ class RadiusLoadTester:
         # Test configuration
         config = report['test_configuration']
         print(f"\nTest Configuration:")
-        print(f"  Concurrent Users: {config['concurrent_users']:,}")
+        if config['mode'] == 'open':
+            print(f"  Arrival Rate: {config['arrival_rate']:,.0f} sessions/sec (open loop)")
+        elif config['mode'] == 'model':
+            print(f"  Workload Model: {config['concurrent_users']:,} users, seed {config['seed']}, "
+                  f"{config['time_scale']:g}x real time")
+        else:
+            print(f"  Concurrent Users: {config['concurrent_users']:,}")
         print(f"  Test Duration: {config['test_duration']:.1f} seconds")
+        if config['workers'] > 1:
+            print(f"  Load Generator Processes: {config['workers']}")
         print(f"  Server: {config['server_ip']}")
 
         # Session metrics
@@ -325,6 +460,8 @@ class RadiusLoadTester:
         print(f"  Successful Authentications: {session['successful_authentications']:,}")
         print(f"  Authentication Success Rate: {session['auth_success_rate']:.2f}%")
         print(f"  Accounting Success Rate: {session['acct_success_rate']:.2f}%")
+        if session['successful_acct_interims']:
+            print(f"  Successful Interim-Updates: {session['successful_acct_interims']:,}")
 
         # Performance metrics
         perf = report['performance_metrics']
@@ -342,21 +479,29 @@ class RadiusLoadTester:
         print(f"  99th percentile: {auth['p99']*1000:.1f}ms")
         print(f"  Max: {auth['max']*1000:.1f}ms")
 
+        raw = report['uncorrected_response_time_metrics']['authentication']
+        print(f"  Uncorrected (from actual send): p50 {raw['p50']*1000:.1f}ms, "
+              f"p95 {raw['p95']*1000:.1f}ms, p99 {raw['p99']*1000:.1f}ms")
+        if config['mode'] == 'closed':
+            print("  Note: closed-loop users wait for replies before sending, so these understate "
+                  "latency under load; use --mode open or model for SLA runs")
+
         print("\n" + "="*80)
 
-    def save_results(self, report, session_results):
+    def save_results(self, report):
         """Save detailed test results"""
-        timestamp = int(time.time())
+        timestamp = self.run_id or int(time.time())
 
         # Save summary report
         with open(f'radius_load_test_report_{timestamp}.json', 'w') as f:
             json.dump(report, f, indent=2)
 
-        # Save detailed session results
-        with open(f'radius_load_test_sessions_{timestamp}.json', 'w') as f:
-            json.dump(session_results, f, indent=2)
+        # Save the full histograms and counters (mergeable across runs)
+        with open(f'radius_load_test_histograms_{timestamp}.json', 'w') as f:
+            json.dump(self.metrics.to_dict(), f)
 
-        logger.info(f"Results saved to radius_load_test_*_{timestamp}.json")
+        logger.info(f"Results saved to radius_load_test_{{report,histograms}}_{timestamp}.json "
+                    f"and radius_load_test_intervals_{timestamp}*.jsonl")
 
     def validate_performance_criteria(self, report):
         """Validate against performance criteria"""
@@ -402,23 +547,105 @@ def main():
 
     parser = argparse.ArgumentParser(description='RADIUS Load Test')
     parser.add_argument('--server', default='localhost', help='RADIUS server IP')
-    parser.add_argument('--users', type=int, default=1000, help='Number of concurrent users')
+    parser.add_argument('--auth-port', type=int, default=1812, help='Authentication port')
+    parser.add_argument('--acct-port', type=int, default=1813, help='Accounting port')
     parser.add_argument('--secret', default='testing123', help='RADIUS shared secret')
-    parser.add_argument('--ramp-up', type=int, default=60, help='Ramp-up time in seconds')
+    parser.add_argument('--mode', choices=['closed', 'open', 'model'], default='closed',
+                        help='closed: fixed number of users; open: fixed session arrival rate; '
+                             'model: seeded session-lifecycle workload')
+    parser.add_argument('--users', type=int, default=1000, help='Number of concurrent users (user-id space in open mode)')
+    parser.add_argument('--rate', type=float, default=100.0,
+                        help='New sessions per second (open mode; model mode at the daily mean, in model time)')
+    parser.add_argument('--duration', type=int, default=300, help='Test duration in seconds')
+    parser.add_argument('--ramp-up', type=int, default=60, help='Ramp-up time in seconds (closed mode)')
+    parser.add_argument('--hold', type=float, nargs=2, default=[10, 30], metavar=('MIN', 'MAX'),
+                        help='Seconds between Accounting Start and Stop')
+    parser.add_argument('--sockets', type=int, default=4, help='UDP sockets per server port')
+    parser.add_argument('--timeout', type=float, default=3.0, help='Reply timeout in seconds')
+    parser.add_argument('--retries', type=int, default=0, help='Retransmissions before a timeout')
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help='Seconds per line in the intervals JSON-lines file')
+    parser.add_argument('--seed', type=int, default=0, help='Workload seed (model mode)')
+    parser.add_argument('--time-scale', type=float, default=60.0,
+                        help='Model seconds per wall-clock second (model mode)')
+    parser.add_argument('--nas', type=int, default=20, help='NAS devices (model mode)')
+    parser.add_argument('--nas-skew', type=float, default=0.0,
+                        help='Zipf exponent of users per NAS; 0 spreads them evenly (model mode)')
+    parser.add_argument('--interim', type=float, default=300.0,
+                        help='Interim-Update interval in model seconds (model mode)')
+    parser.add_argument('--session-median', type=float, default=3 * 3600.0,
+                        help='Median session length in model seconds (model mode)')
+    parser.add_argument('--reboots', type=float, default=0.0, help='Reboots per NAS per day (model mode)')
+    parser.add_argument('--start-hour', type=float, default=0.0,
+                        help='Hour of day the model starts at (model mode)')
+    parser.add_argument('--workers', type=int, default=1, help='Local load generator processes')
+    parser.add_argument('--agents', help='Comma-separated HOST:PORT load agents to coordinate')
+    parser.add_argument('--agent', metavar='[HOST:]PORT',
+                        help='Run as a load agent listening on HOST:PORT (127.0.0.1 without a host)')
+    parser.add_argument('--authkey', default=os.environ.get('RADIUS_LOAD_AUTHKEY'),
+                        help='Shared key between coordinator and agents; required with --agent/--agents '
+                             '(default: RADIUS_LOAD_AUTHKEY)')
+    parser.add_argument('--source-port', type=int, default=None,
+                        help='First local UDP port; each worker takes 2 x --sockets ports from here')
+    parser.add_argument('--start-delay', type=float, default=2.0,
+                        help='Seconds between all workers being ready and the common start')
 
     args = parser.parse_args()
 
+    if (args.agent or args.agents) and not args.authkey:
+        # Agents unpickle what the coordinator sends; a known key would let anyone run code on them
+        parser.error('--agent and --agents require --authkey or RADIUS_LOAD_AUTHKEY')
+
+    if args.agent:
+        import distributed
+        try:
+            distributed.serve_agent(args.agent, args.authkey)
+        except KeyboardInterrupt:
+            pass
+        return
+
     # Create and configure tester
     tester = RadiusLoadTester(
         server_ip=args.server,
-        secret=args.secret
+        auth_port=args.auth_port,
+        acct_port=args.acct_port,
+        secret=args.secret,
+        sockets=args.sockets,
+        timeout=args.timeout,
+        retries=args.retries
     )
+    tester.mode = args.mode
     tester.concurrent_users = args.users
+    tester.arrival_rate = args.rate
+    tester.test_duration = args.duration
     tester.ramp_up_time = args.ramp_up
+    tester.session_hold = tuple(args.hold)
+    tester.snapshot_interval = args.interval
+    tester.source_port = args.source_port
+    tester.seed = args.seed
+    tester.time_scale = args.time_scale
+    tester.workload = WorkloadConfig(
+        users=args.users,
+        nas_count=args.nas,
+        nas_skew=args.nas_skew,
+        arrival_rate=args.rate,
+        interim_interval=args.interim,
+        session_median=args.session_median,
+        nas_reboots_per_day=args.reboots,
+        start_offset=args.start_hour * 3600,
+    )
 
     try:
         # Run the load test
-        exit_code = tester.run_concurrent_load_test()
+        if args.agents or args.workers > 1:
+            import distributed
+            if args.agents:
+                connections = distributed.connect_agents(args.agents.split(','), args.authkey)
+                exit_code = distributed.run_distributed(tester, connections, args.start_delay)
+            else:
+                exit_code = distributed.run_local(tester, args.workers, args.start_delay)
+        else:
+            exit_code = tester.run_concurrent_load_test()
         sys.exit(exit_code or 0)
 
     except KeyboardInterrupt:
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+HaroonNet ISP Platform - RADIUS Workload Model
+Seeded, streaming generator of subscriber session lifecycles
+
+Each session is Access-Request, Accounting Start, periodic Interim-Updates
+carrying cumulative counters, and Stop. Sessions arrive as a Poisson process
+shaped by a 24-hour diurnal curve and spread over NAS devices. A NAS reboot
+sends Accounting-On, drops that NAS's sessions without a Stop, and its users
+reconnect over a short storm window.
+
+Events are produced in time order from a heap of per-session next events,
+so memory grows with the number of active sessions rather than the run
+length. The same seed and config always produce the same event stream.
+
+    python tests/load/radius/workload.py --users 1000 --hours 24 --seed 7 [--summary]
+"""
+
+import heapq
+import ipaddress
+import itertools
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Typical residential broadband demand by hour of day (1.0 = daily mean)
+DEFAULT_DIURNAL = (
+    0.55, 0.40, 0.30, 0.25, 0.25, 0.30, 0.45, 0.70, 0.85, 0.90, 0.95, 1.00,
+    1.00, 1.00, 1.00, 1.05, 1.10, 1.20, 1.35, 1.55, 1.70, 1.75, 1.50, 0.95,
+)
+
+OCTET_WRAP = 2 ** 32
+
+# Internal heap event kinds, in tie-break order at equal times
+_REBOOT, _ARRIVAL, _RECONNECT, _SESSION = 0, 1, 2, 3
+
+
+@dataclass
+class WorkloadConfig:
+    users: int = 10000
+    nas_count: int = 20
+    nas_skew: float = 0.0  # Zipf exponent for users per NAS; 0 spreads them evenly
+    nas_network: str = '192.168.0.0/16'
+    nas_offset: int = 0  # Skip this many NAS addresses, so several generators use distinct NAS
+    framed_network: str = '10.64.0.0/10'
+    arrival_rate: float = 5.0  # New sessions per second at a diurnal multiplier of 1.0
+    diurnal: Sequence[float] = DEFAULT_DIURNAL
+    session_median: float = 3 * 3600.0  # Lognormal session length (seconds)
+    session_sigma: float = 1.2
+    interim_interval: float = 300.0
+    interim_jitter: float = 0.1  # Fraction of the interval
+    rate_median: float = 150_000.0  # Lognormal download bytes/second while online
+    rate_sigma: float = 1.0
+    upload_ratio: float = 0.12
+    nas_reboots_per_day: float = 0.0  # Per NAS
+    reboot_times: Sequence[Tuple[float, int]] = ()  # Explicit (seconds, nas index) reboots
+    storm_window: float = 60.0  # Users of a rebooted NAS reconnect within this many seconds
+    start_time: int = 1_717_200_000  # Event-Timestamp of model time 0 (epoch seconds)
+    start_offset: float = 0.0  # Seconds past midnight at model time 0, for the diurnal curve
+
+
+@dataclass
+class Session:
+    user_id: int
+    nas_index: int
+    session_id: str
+    framed_ip: str
+    started: float
+    ends: float
+    download_rate: float
+    upload_rate: float
+    alive: bool = True
+
+    def counters(self, now: float) -> Tuple[int, int, int]:
+        """Session time and cumulative input/output octets at model time now"""
+        elapsed = max(0.0, now - self.started)
+        return int(elapsed), int(elapsed * self.upload_rate), int(elapsed * self.download_rate)
+
+
+@dataclass
+class Event:
+    """One RADIUS request at model time `at`"""
+    at: float
+    status: str  # Access-Request, Start, Interim-Update, Stop or Accounting-On
+    nas_index: int
+    attributes: List[Tuple[str, object]] = field(default_factory=list)
+    session: Optional[Session] = None
+
+    @property
+    def is_auth(self) -> bool:
+        return self.status == 'Access-Request'
+
+
+class WorkloadModel:
+    """Streams events for one seeded workload"""
+
+    def __init__(self, config: WorkloadConfig = None, seed: int = 0, user_offset: int = 0):
+        self.config = config or WorkloadConfig()
+        self.seed = seed
+        # Lets several generators share one numbering space without overlap
+        self.user_offset = user_offset
+        self.random = random.Random(seed)
+
+        cfg = self.config
+        nas_hosts = itertools.islice(ipaddress.ip_network(cfg.nas_network).hosts(), cfg.nas_offset, None)
+        self.nas_ips = [str(next(nas_hosts)) for _ in range(cfg.nas_count)]
+        self._framed_base = int(ipaddress.ip_network(cfg.framed_network).network_address)
+        self._framed_size = ipaddress.ip_network(cfg.framed_network).num_addresses
+        self.user_nas = self._assign_nas()
+        self._peak = max(cfg.diurnal)
+
+    def _assign_nas(self) -> List[int]:
+        cfg = self.config
+        if cfg.nas_skew <= 0:
+            return [user % cfg.nas_count for user in range(cfg.users)]
+        weights = [1 / (rank + 1) ** cfg.nas_skew for rank in range(cfg.nas_count)]
+        return self.random.choices(range(cfg.nas_count), weights=weights, k=cfg.users)
+
+    def username(self, user_id: int) -> str:
+        return f"loadtest{self.user_offset + user_id:06d}@haroonnet.com"
+
+    def calling_station(self, user_id: int) -> str:
+        value = self.user_offset + user_id
+        return '02-' + '-'.join(f'{(value >> shift) & 0xff:02X}' for shift in (32, 24, 16, 8, 0))
+
+    def diurnal_factor(self, at: float) -> float:
+        hour = ((at + self.config.start_offset) / 3600) % 24
+        low = int(hour)
+        high = (low + 1) % 24
+        weight = hour - low
+        return self.config.diurnal[low] * (1 - weight) + self.config.diurnal[high] * weight
+
+    def _next_arrival(self, after: float) -> float:
+        """Non-homogeneous Poisson arrivals by thinning against the peak rate"""
+        peak_rate = self.config.arrival_rate * self._peak
+        at = after
+        while True:
+            at += self.random.expovariate(peak_rate)
+            if self.random.random() * self._peak <= self.diurnal_factor(at):
+                return at
+
+    def _next_reboot(self, after: float) -> Optional[float]:
+        cfg = self.config
+        if cfg.nas_reboots_per_day <= 0:
+            return None
+        return after + self.random.expovariate(cfg.nas_reboots_per_day * cfg.nas_count / 86400)
+
+    def _lognormal(self, median: float, sigma: float) -> float:
+        return self.random.lognormvariate(math.log(median), sigma)
+
+    def _interim_delay(self) -> float:
+        cfg = self.config
+        return cfg.interim_interval * (1 + self.random.uniform(-cfg.interim_jitter, cfg.interim_jitter))
+
+    def events(self, duration: float) -> Iterator[Event]:
+        """Events in time order for model times [0, duration)"""
+        cfg = self.config
+        rng = self.random
+        idle = list(range(cfg.users))
+        active = {}  # user_id -> Session
+        framed_next = 0
+        session_seq = 0
+        heap = []
+        seq = 0
+
+        def push(at, kind, payload):
+            nonlocal seq
+            seq += 1
+            heapq.heappush(heap, (at, kind, seq, payload))
+
+        push(self._next_arrival(0.0), _ARRIVAL, None)
+        next_reboot = self._next_reboot(0.0)
+        if next_reboot is not None:
+            push(next_reboot, _REBOOT, None)
+        for at, nas_index in cfg.reboot_times:
+            push(at, _REBOOT, nas_index)
+
+        def start_session(at: float, user_id: int):
+            nonlocal framed_next, session_seq
+            session_seq += 1
+            framed_next = (framed_next + 1) % (self._framed_size - 2)
+            nas_index = self.user_nas[user_id]
+            download = self._lognormal(cfg.rate_median, cfg.rate_sigma)
+            session = Session(
+                user_id=user_id,
+                nas_index=nas_index,
+                session_id=f'{self.seed & 0xffff:04X}{cfg.nas_offset + nas_index:04X}{session_seq:08X}',
+                framed_ip=str(ipaddress.IPv4Address(self._framed_base + 1 + framed_next)),
+                started=at,
+                ends=at + self._lognormal(cfg.session_median, cfg.session_sigma),
+                download_rate=download,
+                upload_rate=download * cfg.upload_ratio,
+            )
+            active[user_id] = session
+            push(at, _SESSION, (session, 'Access-Request'))
+
+        while heap:
+            at, kind, _, payload = heapq.heappop(heap)
+            if at >= duration:
+                return
+
+            if kind == _ARRIVAL:
+                push(self._next_arrival(at), _ARRIVAL, None)
+                if idle:
+                    index = rng.randrange(len(idle))
+                    idle[index], idle[-1] = idle[-1], idle[index]
+                    start_session(at, idle.pop())
+                continue
+
+            if kind == _REBOOT:
+                if payload is None:
+                    nas_index = rng.randrange(cfg.nas_count)
+                    following = self._next_reboot(at)
+                    push(following, _REBOOT, None)
+                else:
+                    nas_index = payload
+                yield Event(at, 'Accounting-On', nas_index, self._accounting_on(at, nas_index))
+                # Sessions on the NAS end without a Stop; their users come back in a storm
+                for user_id, session in list(active.items()):
+                    if session.nas_index == nas_index:
+                        session.alive = False
+                        del active[user_id]
+                        push(at + rng.uniform(0, cfg.storm_window), _RECONNECT, user_id)
+                continue
+
+            if kind == _RECONNECT:
+                start_session(at, payload)
+                continue
+
+            session, status = payload
+            if not session.alive:
+                continue
+
+            if status == 'Access-Request':
+                yield Event(at, status, session.nas_index, self._auth(session), session)
+                push(at, _SESSION, (session, 'Start'))
+            elif status in ('Start', 'Interim-Update'):
+                yield Event(at, status, session.nas_index, self._accounting(session, at, status), session)
+                following = at + self._interim_delay()
+                if following < session.ends:
+                    push(following, _SESSION, (session, 'Interim-Update'))
+                else:
+                    push(session.ends, _SESSION, (session, 'Stop'))
+            else:
+                session.alive = False
+                del active[session.user_id]
+                idle.append(session.user_id)
+                yield Event(at, 'Stop', session.nas_index, self._accounting(session, at, 'Stop'), session)
+
+    def _auth(self, session: Session) -> List[Tuple[str, object]]:
+        return [
+            ('User-Name', self.username(session.user_id)),
+            ('User-Password', 'test123'),
+            ('NAS-IP-Address', self.nas_ips[session.nas_index]),
+            ('NAS-Port', session.user_id % 65536),
+            ('NAS-Port-Type', 'Ethernet'),
+            ('Calling-Station-Id', self.calling_station(session.user_id)),
+            ('Service-Type', 'Framed-User'),
+            ('Framed-Protocol', 'PPP'),
+        ]
+
+    def _accounting(self, session: Session, at: float, status: str) -> List[Tuple[str, object]]:
+        attributes = [
+            ('User-Name', self.username(session.user_id)),
+            ('Acct-Session-Id', session.session_id),
+            ('Acct-Status-Type', status),
+            ('NAS-IP-Address', self.nas_ips[session.nas_index]),
+            ('NAS-Port', session.user_id % 65536),
+            ('NAS-Port-Type', 'Ethernet'),
+            ('Calling-Station-Id', self.calling_station(session.user_id)),
+            ('Framed-IP-Address', session.framed_ip),
+            ('Event-Timestamp', self.config.start_time + int(at)),
+        ]
+        if status == 'Start':
+            return attributes + [('Service-Type', 'Framed-User'), ('Framed-Protocol', 'PPP')]
+
+        session_time, input_octets, output_octets = session.counters(at)
+        attributes += [
+            ('Acct-Session-Time', session_time),
+            ('Acct-Input-Octets', input_octets % OCTET_WRAP),
+            ('Acct-Output-Octets', output_octets % OCTET_WRAP),
+            ('Acct-Input-Gigawords', input_octets // OCTET_WRAP),
+            ('Acct-Output-Gigawords', output_octets // OCTET_WRAP),
+        ]
+        if status == 'Stop':
+            cause = 'Session-Timeout' if session_time >= 86400 else 'User-Request'
+            attributes.append(('Acct-Terminate-Cause', cause))
+        return attributes
+
+    def _accounting_on(self, at: float, nas_index: int) -> List[Tuple[str, object]]:
+        return [
+            ('Acct-Status-Type', 'Accounting-On'),
+            ('Acct-Session-Id', f'{self.config.nas_offset + nas_index:04X}00000000'),
+            ('NAS-IP-Address', self.nas_ips[nas_index]),
+            ('Event-Timestamp', self.config.start_time + int(at)),
+        ]
+
+
+def main():
+    import argparse
+    from collections import Counter
+
+    parser = argparse.ArgumentParser(description='Print or summarise a RADIUS workload')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--nas', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=0.5, help='Session arrivals/second at the daily mean')
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--reboots', type=float, default=0.0, help='Reboots per NAS per day')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start-hour', type=float, default=0.0)
+    parser.add_argument('--summary', action='store_true', help='Only print counts per hour and status')
+    args = parser.parse_args()
+
+    model = WorkloadModel(WorkloadConfig(users=args.users, nas_count=args.nas, arrival_rate=args.rate,
+                                         nas_reboots_per_day=args.reboots,
+                                         start_offset=args.start_hour * 3600), seed=args.seed)
+    counts = Counter()
+    for event in model.events(args.hours * 3600):
+        if args.summary:
+            counts[(int(event.at // 3600), event.status)] += 1
+        else:
+            print(f"{event.at:10.1f} {event.status:<15} {dict(event.attributes)}")
+
+    if args.summary:
+        statuses = ('Access-Request', 'Start', 'Interim-Update', 'Stop', 'Accounting-On')
+        print(f"{'hour':>4} " + ' '.join(f'{status:>15}' for status in statuses))
+        for hour in range(int(math.ceil(args.hours))):
+            print(f"{hour:>4} " + ' '.join(f'{counts[(hour, status)]:>15}' for status in statuses))
+
+
+if __name__ == '__main__':
+    main()
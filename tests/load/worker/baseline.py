@@ -0,0 +1,57 @@
+"""
+HaroonNet ISP Platform - Benchmark Baselines
+Stored benchmark timings and regression checks against them
+
+A baseline file maps a volume key (see dataset.Volumes.key) to each
+benchmark's median and minimum seconds. The median of a new run is
+compared with the stored median. Anything slower by more than the
+threshold is flagged as a regression.
+"""
+
+import json
+import os
+import platform
+from datetime import datetime
+from typing import Dict, List
+
+
+def load(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(path: str, key: str, results: Dict[str, dict]):
+    """Record results as the baseline for key, keeping other volumes' baselines"""
+    baselines = load(path)
+    baselines[key] = {
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'benchmarks': {
+            name: {'median': result['median'], 'min': result['min']}
+            for name, result in results.items() if result['status'] == 'ok'
+        },
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def compare(results: Dict[str, dict], baseline: dict, threshold: float) -> List[dict]:
+    """One row per benchmark with its change against the baseline median"""
+    stored = baseline.get('benchmarks', {})
+    rows = []
+    for name, result in results.items():
+        row = {'name': name, 'median': result['median'], 'baseline': None, 'change': None, 'flag': ''}
+        if result['status'] != 'ok':
+            row['flag'] = 'ERROR'
+        elif name in stored and stored[name]['median'] > 0:
+            row['baseline'] = stored[name]['median']
+            row['change'] = result['median'] / row['baseline'] - 1
+            if row['change'] > threshold:
+                row['flag'] = 'REGRESSION'
+            elif row['change'] < -threshold:
+                row['flag'] = 'improved'
+        rows.append(row)
+    return rows
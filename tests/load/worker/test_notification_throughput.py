@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+HaroonNet ISP Platform - Notification Throughput Benchmark
+Notifications per second from a single io-profile worker process as pool
+concurrency grows
+
+Each task waits a fixed provider latency (SMTP/Twilio round trip) instead of
+sending. Messages go through kombu's in-memory transport unless
+CELERY_BROKER_URL points at Redis.
+
+    python tests/load/worker/test_notification_throughput.py [--count 2000] [--latency 0.05]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+WORKER_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'services', 'worker')
+sys.path.insert(0, os.path.abspath(WORKER_DIR))
+
+os.environ.setdefault('CELERY_BROKER_URL', 'memory://')
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+os.environ.setdefault('MONITORING_ENABLED', 'false')
+os.environ.setdefault('WORKER_WARMUP_ENABLED', 'false')
+os.environ['WORKER_PROFILE'] = 'io'
+
+from celery.contrib.testing.worker import start_worker  # noqa: E402
+from app.celery import celery  # noqa: E402
+from app.worker_profiles import worker_profiles  # noqa: E402
+
+if celery.conf.broker_url.startswith('memory://'):
+    # The memory transport polls, and the worker's blocking loop only refills
+    # the prefetch window every two seconds; lift both limits so the numbers
+    # reflect the pool rather than the test transport
+    celery.conf.broker_transport_options = {'polling_interval': 0.001}
+    celery.conf.worker_prefetch_multiplier = 0
+
+
+@celery.task(name='benchmark.provider_call', queue='notifications')
+def provider_call(latency: float):
+    time.sleep(latency)
+    return True
+
+
+def run(count: int, concurrency: int, latency: float) -> dict:
+    profile = worker_profiles()['io']
+    with start_worker(celery, pool=profile.pool, concurrency=concurrency,
+                      queues=profile.queues, perform_ping_check=False, shutdown_timeout=30):
+        started = time.perf_counter()
+        results = [provider_call.apply_async((latency,), queue='notifications') for _ in range(count)]
+        for result in results:
+            result.get(timeout=600, interval=0.005)
+        elapsed = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'notifications': count,
+        'seconds': elapsed,
+        'per_second': count / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='io-profile notification throughput')
+    parser.add_argument('--count', type=int, default=2000, help='Notifications per run')
+    parser.add_argument('--latency', type=float, default=0.05, help='Simulated provider latency (seconds)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 25, 50, 100])
+    parser.add_argument('--json', action='store_true', help='Print JSON results')
+    args = parser.parse_args()
+
+    results = [run(args.count, concurrency, args.latency) for concurrency in args.concurrency]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'concurrency':>11} {'seconds':>9} {'notifications/s':>16}")
+    for result in results:
+        print(f"{result['concurrency']:>11} {result['seconds']:>9.2f} {result['per_second']:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
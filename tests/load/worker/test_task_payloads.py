@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+HaroonNet ISP Platform - Task Payload Benchmark
+Broker bytes and enqueue rate for notification fan-out, per serializer and
+with report contexts inlined or passed by reference
+
+Messages are published through Celery to kombu's in-memory transport; each
+is sized as the Redis transport would store it (JSON envelope with a
+base64-encoded body) and then dropped.
+
+    python tests/load/worker/test_task_payloads.py [--count 100000] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+WORKER_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'services', 'worker')
+sys.path.insert(0, os.path.abspath(WORKER_DIR))
+
+os.environ.setdefault('CELERY_BROKER_URL', 'memory://')
+os.environ.setdefault('CELERY_RESULT_BACKEND', 'cache+memory://')
+os.environ.setdefault('MONITORING_ENABLED', 'false')
+
+from kombu.transport import memory  # noqa: E402
+from kombu.utils.json import dumps as kombu_dumps  # noqa: E402
+
+_sizes = []
+
+
+def _put(self, queue, message, **kwargs):
+    _sizes.append(len(kombu_dumps(message)))
+
+
+memory.Channel._put = _put
+
+import app.celery  # noqa: E402,F401
+from app.payloads import SERIALIZER, register_serializer, report_ref  # noqa: E402
+from app.tasks.notifications import send_email_notification  # noqa: E402
+
+
+def invoice_context(i: int) -> dict:
+    return {
+        'customer_name': f'Customer {i}',
+        'plan_name': 'Fiber 50 Mbps',
+        'amount': 1500 + i % 7,
+        'invoice_number': f'INV-202406-{i:06d}',
+        'due_date': '2024-06-30',
+    }
+
+
+def report_data() -> dict:
+    return {
+        'revenue': {'total_revenue': 1234567.5, 'total_invoices': 4821},
+        'plan_analysis': [
+            {'plan_name': f'Plan {p}', 'subscriptions': 100 + p, 'revenue': 15000.0 + p,
+             'p50_usage': 1.5e9, 'p95_usage': 9.8e10, 'p99_usage': 2.1e11}
+            for p in range(40)
+        ],
+        'top_users': [{'username': f'user{u}', 'total_octets': 10 ** 11 - u} for u in range(100)],
+    }
+
+
+def run(count: int, serializer: str, scenario: str) -> dict:
+    _sizes.clear()
+    report = report_data()
+
+    started = time.perf_counter()
+    for i in range(count):
+        if scenario == 'invoice':
+            args = ('customer@example.com', 'invoice_generated', invoice_context(i))
+        elif scenario == 'report-inline':
+            args = ('noc@example.com', 'monthly_report', {'month_start': '2024-05-01', 'reports': report})
+        else:
+            args = ('noc@example.com', 'monthly_report', {'month_start': '2024-05-01', 'reports': report_ref(42)})
+        send_email_notification.apply_async(args, serializer=serializer)
+    elapsed = time.perf_counter() - started
+
+    total = sum(_sizes)
+    return {
+        'messages': count,
+        'bytes_per_message': total / count,
+        'total_mb': total / 1e6,
+        'enqueue_per_second': count / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Notification payload size and enqueue rate')
+    parser.add_argument('--count', type=int, default=100000, help='Notifications per run')
+    parser.add_argument('--json', action='store_true', help='Print JSON results')
+    args = parser.parse_args()
+
+    serializers = ['json'] + ([SERIALIZER] if register_serializer() else [])
+    results = {}
+    for scenario in ('invoice', 'report-inline', 'report-ref'):
+        for serializer in serializers:
+            results[f'{scenario}/{serializer}'] = run(args.count, serializer, scenario)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'profile':<34} {'bytes/msg':>10} {'total MB':>10} {'enqueue/s':>11}")
+    for name, result in results.items():
+        print(f"{name:<34} {result['bytes_per_message']:>10.0f} {result['total_mb']:>10.1f} "
+              f"{result['enqueue_per_second']:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+HaroonNet ISP Platform - Worker Startup Benchmark
+Measures per-queue worker process startup: task module imports plus warmup
+
+Each measurement runs in a fresh interpreter, as a recycled prefork child
+would. The "eager" column imports every heavy dependency up front, which is
+what each worker paid before imports were made lazy.
+
+    python tests/load/worker/test_worker_startup.py [--repeat 5] [--with-db] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+WORKER_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'services', 'worker')
+
+QUEUES = ['billing', 'notifications', 'radius', 'reports', 'system']
+
+HEAVY_MODULES = ['pyrad.client', 'twilio.rest', 'jinja2', 'psutil', 'numpy', 'pandas']
+
+PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+if {eager}:
+    for module in {heavy!r}:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+from app.celery import celery
+for module in celery.conf.include:
+    importlib.import_module(module)
+imported = time.perf_counter() - started
+from app import warmup
+timings = warmup.warm([{queue!r}], pools={pools})
+print(json.dumps({{
+    'import_seconds': imported,
+    'warmup_seconds': sum(timings.values()),
+    'steps': timings,
+    'heavy_loaded': sorted(m for m in {heavy!r} if m in sys.modules),
+}}))
+"""
+
+
+def measure(queue: str, eager: bool, pools: bool) -> dict:
+    code = PROBE.format(eager=eager, heavy=HEAVY_MODULES, queue=queue, pools=pools)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=WORKER_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(repeat: int, pools: bool) -> dict:
+    results = {}
+    for queue in QUEUES:
+        lazy = [measure(queue, False, pools) for _ in range(repeat)]
+        eager = [measure(queue, True, pools) for _ in range(repeat)]
+        results[queue] = {
+            'lazy_import_ms': statistics.median(r['import_seconds'] for r in lazy) * 1000,
+            'warmup_ms': statistics.median(r['warmup_seconds'] for r in lazy) * 1000,
+            'eager_import_ms': statistics.median(r['import_seconds'] for r in eager) * 1000,
+            'heavy_loaded_after_warmup': lazy[-1]['heavy_loaded'],
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker startup time per queue')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh processes per measurement')
+    parser.add_argument('--with-db', action='store_true', help='Include connection pool warmup')
+    parser.add_argument('--json', action='store_true', help='Print JSON results')
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.with_db)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'queue':<14} {'lazy import':>12} {'warmup':>9} {'ready':>9} {'eager import':>13}  loaded by warmup")
+    for queue, result in results.items():
+        ready = result['lazy_import_ms'] + result['warmup_ms']
+        print(f"{queue:<14} {result['lazy_import_ms']:>10.0f}ms {result['warmup_ms']:>7.0f}ms "
+              f"{ready:>7.0f}ms {result['eager_import_ms']:>11.0f}ms  "
+              f"{', '.join(result['heavy_loaded_after_warmup']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+HaroonNet ISP Platform - Usage Storage Layouts
+The usage layouts compared by test_usage_storage.py, and seeded hourly usage
+to fill them
+
+- daily: usage_aggregates, one row per subscription and day (the layout
+  before hourly buckets)
+- hourly: usage_hourly, one narrow integer-keyed row per subscription and
+  active hour (app/usage_buckets.py)
+- packed: one row per subscription and day holding 24-slot little-endian
+  arrays, the alternative compact layout
+
+Hourly usage follows a diurnal profile peaking in the evening. The daily and
+packed rows are summed or packed from the hourly rows, so every layout holds
+the same usage.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+import dataset
+from app.usage_buckets import HOURLY_TABLE_DDL, day_hours
+
+# Share of subscribers online in each hour of the day
+ACTIVITY = np.array([0.30, 0.22, 0.15, 0.10, 0.08, 0.08, 0.12, 0.20, 0.30, 0.35, 0.38, 0.40,
+                     0.42, 0.42, 0.40, 0.40, 0.45, 0.52, 0.62, 0.72, 0.80, 0.82, 0.70, 0.45])
+
+DAILY_DDL = next(statement for statement in dataset.APP_SCHEMA if 'CREATE TABLE usage_aggregates' in statement)
+
+PACKED_DDL = """
+CREATE TABLE usage_hourly_packed (
+    date DATE NOT NULL,
+    subscription_id INT UNSIGNED NOT NULL,
+    input_octets VARBINARY(192) NOT NULL,
+    output_octets VARBINARY(192) NOT NULL,
+    session_time VARBINARY(96) NOT NULL,
+    PRIMARY KEY (date, subscription_id)
+)
+"""
+
+LAYOUTS = {
+    'daily': 'usage_aggregates',
+    'hourly': 'usage_hourly',
+    'packed': 'usage_hourly_packed',
+}
+
+DDL = {
+    'daily': DAILY_DDL,
+    'hourly': HOURLY_TABLE_DDL,
+    'packed': PACKED_DDL,
+}
+
+
+def hourly_usage(subscribers: int, day: date, rng: np.random.Generator) -> pd.DataFrame:
+    """One day of usage_hourly rows: the hours each subscriber was online"""
+    active = rng.random((subscribers, 24)) < ACTIVITY
+    subscription, hour_of_day = np.nonzero(active)
+    count = len(subscription)
+    first_hour, _ = day_hours(day)
+    return pd.DataFrame({
+        'hour': first_hour + hour_of_day,
+        'subscription_id': subscription + 1,
+        'input_octets': rng.lognormal(16, 1.5, count).astype(np.int64),
+        'output_octets': rng.lognormal(18, 1.5, count).astype(np.int64),
+        'session_time': rng.integers(60, 3601, count),
+        'session_count': (rng.random(count) < 0.1).astype(np.int64),
+    })
+
+
+def daily_from_hourly(hourly: pd.DataFrame, day: date) -> pd.DataFrame:
+    """usage_aggregates rows summed from a day's hourly rows"""
+    daily = hourly.groupby('subscription_id', sort=True).agg(
+        input_octets=('input_octets', 'sum'),
+        output_octets=('output_octets', 'sum'),
+        session_time=('session_time', 'sum'),
+        session_count=('session_count', 'sum'),
+    ).reset_index()
+    daily.insert(0, 'customer_id', daily['subscription_id'])
+    daily.insert(2, 'date', day)
+    daily.insert(5, 'total_octets', daily['input_octets'] + daily['output_octets'])
+    daily['created_at'] = pd.Timestamp(day + timedelta(days=1)) + pd.Timedelta(minutes=5)
+    return daily
+
+
+def packed_from_hourly(hourly: pd.DataFrame, day: date) -> pd.DataFrame:
+    """usage_hourly_packed rows: 24 uint64 (octets) or uint32 (seconds) slots per subscription-day"""
+    first_hour, _ = day_hours(day)
+    subscriptions, rows = np.unique(hourly['subscription_id'].to_numpy(), return_inverse=True)
+    slots = hourly['hour'].to_numpy() - first_hour
+    arrays = {}
+    for column, dtype in (('input_octets', '<u8'), ('output_octets', '<u8'), ('session_time', '<u4')):
+        grid = np.zeros((len(subscriptions), 24), dtype=dtype)
+        grid[rows, slots] = hourly[column].to_numpy()
+        arrays[column] = [grid_row.tobytes() for grid_row in grid]
+    return pd.DataFrame({'date': day, 'subscription_id': subscriptions, **arrays})
+
+
+def unpack(value: bytes, dtype: str = '<u8') -> np.ndarray:
+    return np.frombuffer(value, dtype=dtype)
+
+
+def generate(subscribers: int, days: int, seed: int,
+             today: date = None) -> Iterator[Tuple[date, Dict[str, pd.DataFrame]]]:
+    """Per day: the same usage in each layout"""
+    rng = np.random.default_rng(seed)
+    today = today or date.today()
+    for offset in range(days, 0, -1):
+        day = today - timedelta(days=offset)
+        hourly = hourly_usage(subscribers, day, rng)
+        yield day, {
+            'daily': daily_from_hourly(hourly, day),
+            'hourly': hourly,
+            'packed': packed_from_hourly(hourly, day),
+        }
@@ -0,0 +1,15 @@
+"""
+HaroonNet ISP Platform - Load Tooling Unit Test Configuration
+Makes the RADIUS load test and worker benchmark modules, and the worker application
+package they use, importable from the test suite
+"""
+
+import os
+import sys
+
+LOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'load'))
+WORKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'services', 'worker'))
+
+for path in (WORKER_DIR, os.path.join(LOAD_DIR, 'worker'), os.path.join(LOAD_DIR, 'radius')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,81 @@
+"""
+HaroonNet ISP Platform - Synthetic Data Generator Unit Tests
+Tests for row consistency across tables and seeded determinism
+"""
+
+from datetime import datetime
+
+import pandas as pd
+
+import datagen
+from dataset import EXPIRED_AGE_DAYS, Volumes
+
+NOW = datetime(2026, 3, 15, 12, 0, 0)
+VOLUMES = Volumes(subscribers=300, days=5, invoices=900, seed=3)
+
+
+def generate(tmp_path, volumes=VOLUMES):
+    counts = datagen.generate(volumes, datagen.CsvSink(str(tmp_path)), now=NOW)
+    tables = {table: pd.read_csv(tmp_path / f'{table}.csv', na_values=['\\N'], keep_default_na=False)
+              for table in counts}
+    return counts, tables
+
+
+def test_sessions_belong_to_subscriptions_and_nas(tmp_path):
+    counts, tables = generate(tmp_path)
+    radacct = tables['radacct']
+
+    assert counts['radacct'] == len(radacct) > 0
+    assert set(radacct['username']) <= set(tables['subscriptions']['username'])
+    assert set(radacct['nasipaddress']) <= set(tables['nas']['nasname'])
+    assert radacct['acctuniqueid'].is_unique
+    assert tables['invoices']['invoice_number'].is_unique
+
+    # One Access-Accept per session, rejects on top
+    replies = tables['radpostauth']['reply'].value_counts()
+    assert replies['Access-Accept'] == len(radacct)
+    assert 0 < replies['Access-Reject'] < len(radacct) * 0.1
+
+    open_sessions = radacct[radacct['acctstoptime'].isna()]
+    assert len(open_sessions) > 0
+    assert (pd.to_datetime(open_sessions['acctstarttime']) >= pd.Timestamp(NOW) - pd.Timedelta(days=2)).all()
+
+
+def test_usage_aggregates_match_closed_sessions_up_to_yesterday(tmp_path):
+    _, tables = generate(tmp_path)
+    radacct = tables['radacct']
+    start = pd.to_datetime(radacct['acctstarttime'])
+    closed = radacct[radacct['acctstoptime'].notna() & (start.dt.date < NOW.date())]
+
+    usage = tables['usage_aggregates']
+    assert usage['input_octets'].sum() == closed['acctinputoctets'].sum()
+    assert usage['total_octets'].sum() == closed['acctinputoctets'].sum() + closed['acctoutputoctets'].sum()
+    assert usage['session_count'].sum() == len(closed)
+    assert (usage['customer_id'] == usage['subscription_id']).all()
+
+    # A share of sessions is past every retention period
+    expired = start < pd.Timestamp(NOW) - pd.Timedelta(days=EXPIRED_AGE_DAYS)
+    assert 0.03 < expired.mean() < 0.07
+
+
+def test_expired_tail_starts_after_the_requested_days(tmp_path):
+    volumes = Volumes(subscribers=20, days=EXPIRED_AGE_DAYS + 30, invoices=20, seed=3)
+    _, tables = generate(tmp_path, volumes)
+
+    usage = tables['usage_aggregates']
+    assert not usage.duplicated(['subscription_id', 'date']).any()
+
+    # Tail sessions are older than every day the daily loop generated
+    start = pd.to_datetime(tables['radacct']['acctstarttime'])
+    first_day = pd.Timestamp(NOW.date()) - pd.Timedelta(days=volumes.days - 1)
+    assert (start < first_day).sum() > 0
+
+
+def test_the_same_seed_gives_the_same_rows(tmp_path):
+    _, first = generate(tmp_path / 'a')
+    _, second = generate(tmp_path / 'b')
+    _, other = generate(tmp_path / 'c', Volumes(subscribers=300, days=5, invoices=900, seed=4))
+
+    pd.testing.assert_frame_equal(first['radacct'], second['radacct'])
+    pd.testing.assert_frame_equal(first['invoices'], second['invoices'])
+    assert not first['radacct']['acctinputoctets'].equals(other['radacct']['acctinputoctets'])
@@ -0,0 +1,115 @@
+"""
+HaroonNet ISP Platform - Distributed RADIUS Load Driver Unit Tests
+Tests for work slicing and merged multi-process runs
+"""
+
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import distributed
+import radius_client as rc
+from fake_radius import FakeRadiusServer, ResponderConfig
+from test_radius_load import RadiusLoadTester, main as load_test_main
+from workload import WorkloadConfig
+
+SECRET = b'testing123'
+
+
+def settings(**overrides):
+    tester = RadiusLoadTester()
+    tester.concurrent_users = 1000
+    for name, value in overrides.items():
+        setattr(tester, name, value)
+    return distributed.tester_settings(tester)
+
+
+def test_partition_covers_the_range_once():
+    for total, count in [(10, 3), (7, 7), (1000, 6)]:
+        parts = [distributed.partition(total, count, index) for index in range(count)]
+        covered = [value for offset, size in parts for value in range(offset, offset + size)]
+        assert covered == list(range(total))
+
+
+def test_slices_get_disjoint_users_ports_and_nas():
+    workload = WorkloadConfig(users=1000, nas_count=10, arrival_rate=4.0, reboot_times=[(60, 3), (90, 9)])
+    base = settings(mode='model', workload=workload, source_port=40000, sockets=4, seed=7)
+    parts = [distributed.slice_settings(base, index, 3) for index in range(3)]
+
+    users = [(part['user_offset'], part['concurrent_users']) for part in parts]
+    assert users == [(0, 334), (334, 333), (667, 333)]
+    assert [part['source_port'] for part in parts] == [40000, 40008, 40016]
+    assert [part['workload'].nas_offset for part in parts] == [0, 4, 7]
+    assert [part['workload'].nas_count for part in parts] == [4, 3, 3]
+    assert [part['workload'].reboot_times for part in parts] == [[(60, 3)], [], [(90, 2)]]
+    assert abs(sum(part['workload'].arrival_rate for part in parts) - 4.0) < 1e-9
+    assert len({part['seed'] for part in parts}) == 3
+
+
+def test_open_loop_slices_share_one_schedule():
+    class FakeClient:
+        def __init__(self):
+            self.users = []
+
+        async def request(self, code, attributes):
+            if code == rc.ACCESS_REQUEST:
+                self.users.append(dict(attributes)['User-Name'])
+                return SimpleNamespace(code=rc.ACCESS_ACCEPT), 0.0
+            return SimpleNamespace(code=rc.ACCOUNTING_RESPONSE), 0.0
+
+    base = settings(mode='open', arrival_rate=400, test_duration=0.25, session_hold=(0, 0), concurrent_users=10)
+    seen = []
+    for index in range(2):
+        tester = distributed.build_tester(distributed.slice_settings(base, index, 2))
+        tester.auth_client = tester.acct_client = FakeClient()
+        asyncio.run(tester._open_loop())
+        seen.append(tester.auth_client.users)
+
+    assert len(seen[0]) == len(seen[1]) == 50
+    assert not set(seen[0]) & set(seen[1])
+
+
+def start_responder():
+    """Fake RADIUS server on two ephemeral ports in a background thread"""
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(FakeRadiusServer(ResponderConfig(secret=SECRET)).start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop, (server.auth_port, server.acct_port)
+
+
+def test_local_workers_merge_into_one_report(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    loop, (auth_port, acct_port) = start_responder()
+    tester = RadiusLoadTester(server_ip='127.0.0.1', auth_port=auth_port, acct_port=acct_port, sockets=1)
+    tester.mode = 'open'
+    tester.concurrent_users = 100
+    tester.arrival_rate = 100
+    tester.test_duration = 1
+    tester.session_hold = (0, 0.1)
+
+    try:
+        exit_code = distributed.run_local(tester, 2, start_delay=0.2)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+    assert exit_code == 0
+    report = json.loads(next(tmp_path.glob('radius_load_test_report_*.json')).read_text())
+    assert report['test_configuration']['workers'] == 2
+    assert report['session_metrics']['total_sessions'] == 100
+    assert report['session_metrics']['successful_acct_stops'] == 100
+    assert len(list(tmp_path.glob('radius_load_test_intervals_*_w*.jsonl'))) == 2
+
+
+def test_agents_listen_on_loopback_and_need_a_key(monkeypatch):
+    assert distributed.parse_address('7700') == ('127.0.0.1', 7700)
+    assert distributed.parse_address('0.0.0.0:7700') == ('0.0.0.0', 7700)
+
+    monkeypatch.delenv('RADIUS_LOAD_AUTHKEY', raising=False)
+    monkeypatch.setattr(distributed, 'serve_agent', lambda address, authkey: pytest.fail('agent started'))
+    for argv in (['--agent', '7700'], ['--agents', 'lg1:7700']):
+        monkeypatch.setattr('sys.argv', ['test_radius_load.py'] + argv)
+        with pytest.raises(SystemExit):
+            load_test_main()
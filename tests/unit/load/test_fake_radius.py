@@ -0,0 +1,136 @@
+"""
+HaroonNet ISP Platform - Fake RADIUS Server Unit Tests
+Tests for the stand-in RADIUS server and NAS CoA endpoint
+"""
+
+import asyncio
+import time
+
+import radius_client as rc
+from fake_radius import FakeNas, FakeRadiusServer, ResponderConfig
+
+SECRET = b'testing123'
+
+
+async def send_all(port, code, requests, timeout=0.5, secret=SECRET):
+    """Send each attribute list once; returns the reply packets (None for timeouts)"""
+    client = rc.RadiusClient('127.0.0.1', port, secret, sockets=1, timeout=timeout)
+    await client.start()
+    # Client and server share one loop; bound the burst so the socket buffers do not overflow
+    window = asyncio.Semaphore(64)
+
+    async def send(attributes):
+        async with window:
+            try:
+                reply, _ = await client.request(code, attributes)
+                return reply
+            except rc.RadiusTimeout:
+                return None
+
+    try:
+        return await asyncio.gather(*(send(attributes) for attributes in requests))
+    finally:
+        await client.close()
+
+
+def test_server_answers_auth_and_accounting_and_counts_them():
+    async def run():
+        server = await FakeRadiusServer(ResponderConfig(seed=1)).start()
+        auth = await send_all(server.auth_port, rc.ACCESS_REQUEST,
+                              [[('User-Name', f'user{n}'), ('User-Password', 'pw')] for n in range(20)])
+        acct = await send_all(server.acct_port, rc.ACCOUNTING_REQUEST,
+                              [[('User-Name', 'user1'), ('Acct-Status-Type', status)]
+                               for status in ('Start', 'Interim-Update', 'Stop')])
+        await server.close()
+        return server, auth, acct
+
+    server, auth, acct = asyncio.run(run())
+
+    assert [reply.code for reply in auth] == [rc.ACCESS_ACCEPT] * 20
+    assert [reply.code for reply in acct] == [rc.ACCOUNTING_RESPONSE] * 3
+    assert server.stats() == {'auth_accepted': 20, 'acct_start_accepted': 1,
+                              'acct_interim_accepted': 1, 'acct_stop_accepted': 1}
+
+
+def test_loss_and_reject_ratios_are_applied():
+    config = ResponderConfig(loss=0.2, reject=0.3, seed=7)
+
+    async def run():
+        server = await FakeRadiusServer(config).start()
+        replies = await send_all(server.auth_port, rc.ACCESS_REQUEST,
+                                 [[('User-Name', f'user{n}')] for n in range(1000)], timeout=0.2)
+        await server.close()
+        return server, replies
+
+    server, replies = asyncio.run(run())
+    stats = server.stats()
+
+    assert replies.count(None) == stats['auth_lost']
+    assert sum(reply is not None and reply.code == rc.ACCESS_REJECT for reply in replies) == stats['auth_rejected']
+    assert 150 < stats['auth_lost'] < 250
+    assert 200 < stats['auth_rejected'] < 280  # 30% of the 80% not lost
+    assert sum(stats.values()) == 1000
+
+
+def test_latency_delays_replies():
+    async def run():
+        server = await FakeRadiusServer(ResponderConfig(latency=0.1, jitter=0.05, seed=3)).start()
+        started = time.perf_counter()
+        replies = await send_all(server.auth_port, rc.ACCESS_REQUEST, [[('User-Name', 'user')]] * 50)
+        elapsed = time.perf_counter() - started
+        await server.close()
+        return replies, elapsed
+
+    replies, elapsed = asyncio.run(run())
+
+    assert all(reply.code == rc.ACCESS_ACCEPT for reply in replies)
+    assert 0.1 <= elapsed < 0.4  # Replies are scheduled, not serialised
+
+
+def test_wrong_secret_is_dropped_as_invalid():
+    async def run():
+        server = await FakeRadiusServer().start()
+        auth = await send_all(server.auth_port, rc.ACCESS_REQUEST, [[('User-Name', 'user')]],
+                              timeout=0.1, secret=b'wrong')
+        acct = await send_all(server.acct_port, rc.ACCOUNTING_REQUEST, [[('Acct-Status-Type', 'Start')]],
+                              timeout=0.1, secret=b'wrong')
+        await server.close()
+        return server, auth + acct
+
+    server, replies = asyncio.run(run())
+
+    assert replies == [None, None]
+    assert server.stats() == {'auth_invalid': 1, 'acct_start_invalid': 1}
+
+
+def test_nas_records_rate_limits_and_disconnects():
+    async def run():
+        nas = await FakeNas(ResponderConfig(seed=2)).start()
+        coa = await send_all(nas.port, rc.COA_REQUEST,
+                             [[('User-Name', 'alice'), ('Mikrotik-Rate-Limit', '2M/2M')],
+                              [('User-Name', 'bob'), ('Mikrotik-Rate-Limit', '512k/512k')]])
+        disconnect = await send_all(nas.port, rc.DISCONNECT_REQUEST, [[('User-Name', 'bob')]])
+        await nas.close()
+        return nas, coa + disconnect
+
+    nas, replies = asyncio.run(run())
+
+    assert [reply.code for reply in replies] == [rc.COA_ACK, rc.COA_ACK, rc.DISCONNECT_ACK]
+    assert nas.rate_limits == {'alice': '2M/2M', 'bob': '512k/512k'}
+    assert nas.disconnects == {'bob': 1}
+    assert nas.stats() == {'coa_accepted': 2, 'disconnect_accepted': 1}
+
+
+def test_nas_naks_carry_an_error_cause():
+    async def run():
+        nas = await FakeNas(ResponderConfig(reject=1.0)).start()
+        replies = await send_all(nas.port, rc.COA_REQUEST,
+                                 [[('User-Name', 'alice'), ('Mikrotik-Rate-Limit', '1M/1M')]])
+        await nas.close()
+        return nas, replies
+
+    nas, (reply,) = asyncio.run(run())
+
+    assert reply.code == rc.COA_NAK
+    assert reply.get('Error-Cause') == 503
+    assert nas.rate_limits == {}
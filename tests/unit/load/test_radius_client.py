@@ -0,0 +1,91 @@
+"""
+HaroonNet ISP Platform - Async RADIUS Client Unit Tests
+Tests for the RADIUS codec and identifier-multiplexed UDP client
+"""
+
+import asyncio
+import socket
+
+import radius_client as rc
+
+SECRET = b'testing123'
+
+
+def test_password_hiding_matches_rfc2865_example():
+    authenticator = bytes.fromhex('0f403f9473978057bd83d5cb98f4227a')
+
+    hidden = rc.encrypt_password(b'arctangent', b'xyzzy5461', authenticator)
+
+    assert hidden == bytes.fromhex('0dbe708d93d413ce3196e43f782a0aee')
+
+
+def test_accounting_request_round_trip():
+    data = rc.build_request(rc.ACCOUNTING_REQUEST, 7, SECRET, [
+        ('User-Name', 'loadtest000001@haroonnet.com'),
+        ('Acct-Status-Type', 'Interim-Update'),
+        ('Framed-IP-Address', '10.1.1.1'),
+        ('Acct-Input-Octets', 123456),
+    ])
+    request = rc.decode(data)
+
+    assert rc.verify_request(data, SECRET)
+    assert not rc.verify_request(data, b'wrong')
+    assert request.identifier == 7
+    assert request.get('Acct-Status-Type') == 3
+    assert request.get('Framed-IP-Address') == '10.1.1.1'
+    assert request.get('Acct-Input-Octets') == 123456
+
+    reply = rc.build_reply(request, rc.ACCOUNTING_RESPONSE, SECRET)
+    assert rc.verify_reply(reply, request.authenticator, SECRET)
+
+
+class Responder(asyncio.DatagramProtocol):
+    """Replies to every request, optionally ignoring some identifiers' first copies"""
+
+    def __init__(self, drop_first=0):
+        self.drop_first = drop_first
+        self.received = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rc.SOCKET_BUFFER)
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        if self.received <= self.drop_first:
+            return
+        request = rc.decode(data)
+        code = rc.ACCESS_ACCEPT if request.code == rc.ACCESS_REQUEST else rc.ACCOUNTING_RESPONSE
+        self.transport.sendto(rc.build_reply(request, code, SECRET), addr)
+
+
+async def _run(requests, drop_first=0, timeout=1.0, retries=0):
+    loop = asyncio.get_running_loop()
+    transport, responder = await loop.create_datagram_endpoint(
+        lambda: Responder(drop_first), local_addr=('127.0.0.1', 0))
+    port = transport.get_extra_info('sockname')[1]
+    try:
+        async with rc.RadiusClient('127.0.0.1', port, SECRET, sockets=2, timeout=timeout,
+                                   retries=retries) as client:
+            results = await asyncio.gather(*(
+                client.request(rc.ACCESS_REQUEST, [('User-Name', f'user{i}'), ('User-Password', 'test123')])
+                for i in range(requests)
+            ), return_exceptions=True)
+            return results, client.in_flight()
+    finally:
+        transport.close()
+
+
+def test_more_requests_than_identifiers_are_multiplexed():
+    results, in_flight = asyncio.run(_run(1500))
+
+    assert all(reply.code == rc.ACCESS_ACCEPT for reply, _ in results)
+    assert in_flight == 0
+
+
+def test_lost_request_is_retransmitted_then_times_out():
+    results, _ = asyncio.run(_run(1, drop_first=1, timeout=0.2, retries=1))
+    assert results[0][0].code == rc.ACCESS_ACCEPT
+
+    results, _ = asyncio.run(_run(1, drop_first=5, timeout=0.1, retries=0))
+    assert isinstance(results[0], rc.RadiusTimeout)
@@ -0,0 +1,83 @@
+"""
+HaroonNet ISP Platform - RADIUS Load Test Latency Unit Tests
+Tests that latency is measured from the intended send time
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import radius_client as rc
+from test_radius_load import RadiusLoadTester
+
+
+class FakeClient:
+    """Replies after a fixed service time"""
+
+    def __init__(self, code, service_time=0.001):
+        self.code = code
+        self.service_time = service_time
+
+    async def request(self, code, attributes):
+        await asyncio.sleep(self.service_time)
+        return SimpleNamespace(code=self.code), self.service_time
+
+
+def make_tester():
+    tester = RadiusLoadTester()
+    tester.auth_client = FakeClient(rc.ACCESS_ACCEPT)
+    tester.acct_client = FakeClient(rc.ACCOUNTING_RESPONSE)
+    return tester
+
+
+def test_late_send_counts_from_the_intended_time():
+    tester = make_tester()
+
+    async def run():
+        return await tester.send_access_request('user', [], intended=time.perf_counter() - 0.5)
+
+    accepted, latency = asyncio.run(run())
+
+    assert accepted and latency >= 0.5
+    assert tester.metrics.histogram('auth').min >= 500_000
+    assert tester.metrics.histogram('auth_uncorrected').max < 10_000
+
+
+def test_open_loop_stall_shows_in_corrected_latency_only():
+    tester = make_tester()
+    tester.arrival_rate = 200
+    tester.test_duration = 1
+    tester.session_hold = (0, 0)
+
+    async def run():
+        async def stall():
+            await asyncio.sleep(0.3)
+            time.sleep(0.25)  # The tester itself falls behind
+
+        await asyncio.gather(tester._open_loop(), stall())
+
+    asyncio.run(run())
+
+    auth = tester.metrics.histogram('auth')
+    uncorrected = tester.metrics.histogram('auth_uncorrected')
+    assert auth.total == uncorrected.total == 200
+    assert auth.max >= 200_000
+    assert auth.percentile(95) > 0.05
+    assert uncorrected.max < 50_000
+
+
+def test_timeouts_count_as_the_time_waited():
+    tester = make_tester()
+
+    class Silent:
+        async def request(self, code, attributes):
+            await asyncio.sleep(0.05)
+            raise rc.RadiusTimeout('no reply')
+
+    tester.auth_client = Silent()
+    accepted, _ = asyncio.run(tester.send_access_request('user', []))
+
+    assert not accepted
+    assert tester.metrics.counters['auth_timeout'] == 1
+    assert tester.metrics.histogram('auth').total == 1
+    assert tester.metrics.histogram('auth_uncorrected').total == 0
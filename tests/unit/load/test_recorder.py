@@ -0,0 +1,81 @@
+"""
+HaroonNet ISP Platform - Load Test Recorder Unit Tests
+Tests for the streaming latency histograms and interval snapshots
+"""
+
+import asyncio
+import json
+import random
+
+import recorder as rec
+
+
+def exact_percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(0, int(-(-len(ordered) * p // 100)) - 1)]
+
+
+def test_buckets_cover_values_with_bounded_error():
+    for value in [0, 1, 255, 256, 257, 1000, 65_535, 1_234_567, rec.MAX_MICROSECONDS]:
+        low, high = rec.bucket_range(rec.bucket_index(value))
+        assert low <= value <= high
+        assert high - low <= max(1, value // 100)
+
+
+def test_percentiles_match_sorted_lists_within_one_percent():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(-5, 1.5) for _ in range(50_000)]
+    histogram = rec.Histogram()
+    for value in values:
+        histogram.record(value)
+
+    assert histogram.total == len(values)
+    for p in (50, 95, 99, 99.9):
+        exact = exact_percentile(values, p)
+        assert abs(histogram.percentile(p) - exact) <= exact * 0.01 + 1e-6
+    assert histogram.summary()['max'] == int(max(values) * 1_000_000) / 1_000_000
+
+
+def test_merged_recorders_equal_one_recorder():
+    combined = rec.MetricsRecorder(['auth'])
+    parts = [rec.MetricsRecorder(['auth']) for _ in range(3)]
+    for n in range(3000):
+        latency = (n % 97) / 1000
+        combined.record('auth', latency)
+        combined.count('auth_success')
+        parts[n % 3].record('auth', latency)
+        parts[n % 3].count('auth_success')
+
+    merged = rec.MetricsRecorder()
+    for part in parts:
+        merged.merge(rec.MetricsRecorder.from_dict(json.loads(json.dumps(part.to_dict()))))
+
+    assert merged.counters == combined.counters
+    assert merged.histogram('auth').counts == combined.histogram('auth').counts
+    assert merged.histogram('auth').summary() == combined.histogram('auth').summary()
+
+
+def test_snapshots_report_each_window(tmp_path):
+    path = tmp_path / 'intervals.jsonl'
+    metrics = rec.MetricsRecorder(['auth'])
+
+    async def run():
+        metrics.start_snapshots(str(path), interval=0.05)
+        for _ in range(100):
+            metrics.record('auth', 0.002)
+            metrics.count('auth_success')
+        await asyncio.sleep(0.08)
+        for _ in range(10):
+            metrics.record('auth', 0.5)
+        await metrics.stop_snapshots()
+
+    asyncio.run(run())
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+
+    assert len(lines) == 2
+    assert lines[0]['counts'] == {'auth_success': 100}
+    assert lines[0]['latency']['auth']['count'] == 100
+    assert abs(lines[0]['latency']['auth']['p99_ms'] - 2) < 0.02
+    assert lines[1]['counts'] == {'auth_success': 0}
+    assert abs(lines[1]['latency']['auth']['p50_ms'] - 500) < 5
+    assert sum(line['latency']['auth']['count'] for line in lines) == 110
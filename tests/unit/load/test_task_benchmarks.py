@@ -0,0 +1,60 @@
+"""
+HaroonNet ISP Platform - Worker Task Benchmark Unit Tests
+Tests for baseline regression checks and the benchmark session adapter
+"""
+
+import sqlite3
+
+import baseline
+import dataset
+
+
+def result(median, status='ok'):
+    return {'status': status, 'median': median, 'min': median * 0.9, 'runs': 3, 'result': {}}
+
+
+def test_slower_medians_beyond_the_threshold_are_regressions():
+    stored = {'benchmarks': {'a': {'median': 1.0, 'min': 0.9}, 'b': {'median': 1.0, 'min': 0.9},
+                             'c': {'median': 2.0, 'min': 1.8}}}
+    rows = baseline.compare({'a': result(1.15), 'b': result(1.3), 'c': result(1.0), 'd': result(5.0),
+                             'e': result(0.1, status='error')}, stored, threshold=0.2)
+    flags = {row['name']: row['flag'] for row in rows}
+
+    assert flags == {'a': '', 'b': 'REGRESSION', 'c': 'improved', 'd': '', 'e': 'ERROR'}
+    assert abs(rows[1]['change'] - 0.3) < 1e-9
+    assert rows[3]['baseline'] is None
+
+
+def test_saved_baselines_are_kept_per_volume(tmp_path):
+    path = str(tmp_path / 'baselines' / 'tasks.json')
+    baseline.save(path, 'small', {'a': result(1.0), 'b': result(2.0, status='error')})
+    baseline.save(path, 'large', {'a': result(8.0)})
+    baseline.save(path, 'small', {'a': result(1.5)})
+
+    stored = baseline.load(path)
+    assert stored['small']['benchmarks'] == {'a': {'median': 1.5, 'min': 1.35}}
+    assert stored['large']['benchmarks']['a']['median'] == 8.0
+
+
+def test_session_rows_read_by_attribute_position_and_mapping():
+    session = dataset.DBAPISession(sqlite3.connect(':memory:'))
+    session.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, username TEXT, octets INTEGER)')
+    inserted = session.execute('INSERT INTO t (username, octets) VALUES (?, ?)', ('user1', 42))
+    session.execute('INSERT INTO t (username, octets) VALUES (?, ?)', ('user2', 7))
+    session.commit()
+
+    assert inserted.lastrowid == 1
+    row = session.execute('SELECT username, SUM(octets) as total FROM t WHERE id = ?', (1,)).fetchone()
+    assert (row.username, row.total) == ('user1', 42)
+    assert (row[0], row['total']) == ('user1', 42)
+    assert dict(row) == {'username': 'user1', 'total': 42}
+
+    result = session.execute('SELECT id FROM t ORDER BY id')
+    assert [row.id for row in result.fetchmany(1)] == [1]
+    assert [row.id for row in result.fetchall()] == [2]
+    assert session.execute('DELETE FROM t').rowcount == 2
+
+
+def test_volume_keys_distinguish_baselines():
+    assert dataset.Volumes().key() == '10000s-30d-60000i-seed1'
+    assert dataset.Volumes(subscribers=500, seed=2).key() != dataset.Volumes(subscribers=500).key()
@@ -0,0 +1,44 @@
+"""
+HaroonNet ISP Platform - Usage Storage Layout Unit Tests
+Tests that the benchmarked layouts hold the same seeded usage
+"""
+
+from datetime import date
+
+import numpy as np
+
+from app.usage_buckets import day_hours
+from usage_layouts import generate, unpack
+
+
+def test_every_layout_holds_the_same_usage():
+    (day, frames), = generate(500, 1, seed=3, today=date(2024, 6, 2))
+    hourly, daily, packed = frames['hourly'], frames['daily'], frames['packed']
+    first_hour, end_hour = day_hours(day)
+
+    assert day == date(2024, 6, 1)
+    assert hourly['hour'].between(first_hour, end_hour - 1).all()
+    assert not hourly.duplicated(['hour', 'subscription_id']).any()
+
+    by_subscription = hourly.groupby('subscription_id')[['input_octets', 'output_octets']].sum()
+    assert (daily.set_index('subscription_id')['total_octets']
+            == by_subscription['input_octets'] + by_subscription['output_octets']).all()
+
+    assert list(packed['subscription_id']) == list(daily['subscription_id'])
+    for row in packed.sample(20, random_state=0).itertuples():
+        rows = hourly[hourly['subscription_id'] == row.subscription_id]
+        slots = np.zeros(24, dtype=np.int64)
+        slots[rows['hour'] - first_hour] = rows['input_octets']
+        assert (unpack(row.input_octets) == slots).all()
+        assert unpack(row.session_time, '<u4').sum() == rows['session_time'].sum()
+
+
+def test_usage_is_seeded_and_peaks_in_the_evening():
+    first = [frames['hourly'] for _, frames in generate(2000, 2, seed=5, today=date(2024, 6, 3))]
+    again = [frames['hourly'] for _, frames in generate(2000, 2, seed=5, today=date(2024, 6, 3))]
+    assert all(a.equals(b) for a, b in zip(first, again))
+
+    first_hour, _ = day_hours(date(2024, 6, 1))
+    online = first[0].groupby('hour').size()
+    assert 19 <= int(online.idxmax()) - first_hour <= 22
+    assert int(online.idxmin()) - first_hour in (3, 4, 5)
@@ -0,0 +1,93 @@
+"""
+HaroonNet ISP Platform - RADIUS Workload Model Unit Tests
+Tests for the seeded session-lifecycle event stream
+"""
+
+from collections import defaultdict
+from itertools import islice
+
+import radius_client as rc
+from workload import OCTET_WRAP, WorkloadConfig, WorkloadModel
+
+
+def small_config(**overrides):
+    options = dict(users=200, nas_count=4, arrival_rate=0.5, session_median=1800, interim_interval=300)
+    options.update(overrides)
+    return WorkloadConfig(**options)
+
+
+def stream(model, hours=6):
+    return [(event.at, event.status, event.attributes) for event in model.events(hours * 3600)]
+
+
+def test_same_seed_gives_the_same_stream():
+    assert stream(WorkloadModel(small_config(), seed=5)) == stream(WorkloadModel(small_config(), seed=5))
+    assert stream(WorkloadModel(small_config(), seed=5)) != stream(WorkloadModel(small_config(), seed=6))
+
+
+def test_events_are_time_ordered_and_sessions_follow_the_lifecycle():
+    events = list(WorkloadModel(small_config(), seed=1).events(6 * 3600))
+    assert [event.at for event in events] == sorted(event.at for event in events)
+
+    statuses = defaultdict(list)
+    for event in events:
+        statuses[event.session.session_id].append(event.status)
+
+    for sequence in statuses.values():
+        assert sequence[:2] == ['Access-Request', 'Start']
+        assert set(sequence[2:-1]) <= {'Interim-Update'}
+        assert sequence[-1] in ('Start', 'Interim-Update', 'Stop')
+    assert any(sequence[-1] == 'Stop' and len(sequence) > 3 for sequence in statuses.values())
+
+
+def test_interim_counters_are_cumulative():
+    model = WorkloadModel(small_config(rate_median=5_000_000, session_median=6 * 3600), seed=2)
+    previous = {}
+
+    for event in model.events(12 * 3600):
+        if event.status not in ('Interim-Update', 'Stop'):
+            continue
+        attributes = dict(event.attributes)
+        counters = (
+            attributes['Acct-Session-Time'],
+            attributes['Acct-Input-Gigawords'] * OCTET_WRAP + attributes['Acct-Input-Octets'],
+            attributes['Acct-Output-Gigawords'] * OCTET_WRAP + attributes['Acct-Output-Octets'],
+        )
+        assert attributes['Acct-Output-Octets'] < OCTET_WRAP
+        last = previous.get(event.session.session_id, (0, 0, 0))
+        assert all(now >= before for now, before in zip(counters, last))
+        previous[event.session.session_id] = counters
+
+    assert any(dict(event.attributes).get('Acct-Output-Gigawords') for event in model.events(12 * 3600))
+
+
+def test_reboot_sends_accounting_on_and_users_reconnect():
+    model = WorkloadModel(small_config(reboot_times=[(3 * 3600, 2)], storm_window=60), seed=3)
+    events = list(model.events(4 * 3600))
+
+    reboot = next(event for event in events if event.status == 'Accounting-On')
+    assert reboot.at == 3 * 3600
+    assert dict(reboot.attributes)['NAS-IP-Address'] == model.nas_ips[2]
+
+    online = {}
+    for event in events:
+        if event.at < reboot.at and event.nas_index == 2 and event.session is not None:
+            if event.status == 'Stop':
+                online.pop(event.session.session_id, None)
+            else:
+                online[event.session.session_id] = event.session.user_id
+    assert online
+
+    after = [event for event in events if event.at > reboot.at and event.session is not None]
+    assert not any(event.session.session_id in online for event in after)
+
+    reconnected = {event.session.user_id for event in after if event.is_auth and event.at <= reboot.at + 60}
+    assert set(online.values()) <= reconnected
+
+def test_events_encode_as_radius_requests():
+    model = WorkloadModel(small_config(reboot_times=[(600, 0)]), seed=4)
+
+    for event in islice(model.events(3600), 500):
+        code = rc.ACCESS_REQUEST if event.is_auth else rc.ACCOUNTING_REQUEST
+        request = rc.decode(rc.build_request(code, 1, b'testing123', event.attributes))
+        assert request.code == code
@@ -0,0 +1,38 @@
+"""
+HaroonNet ISP Platform - Worker Unit Test Configuration
+Makes the worker application package importable from the test suite, and
+provides a Lua-capable Redis for the tests of the lease and rate-limit scripts
+"""
+
+import os
+import sys
+import pytest
+
+WORKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'services', 'worker'))
+
+if WORKER_DIR not in sys.path:
+    sys.path.insert(0, WORKER_DIR)
+
+
+@pytest.fixture
+def redis_client():
+    """A Redis that runs Lua scripts: the server at REDIS_TEST_URL, else fakeredis[lua]
+
+    REDIS_TEST_URL must point at a throwaway database; it is flushed around each test.
+    """
+    url = os.environ.get('REDIS_TEST_URL')
+    if url:
+        import redis
+        client = redis.Redis.from_url(url)
+        try:
+            client.ping()
+        except redis.ConnectionError:
+            pytest.skip(f"Redis at {url} is not reachable")
+    else:
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')
+        client = fakeredis.FakeRedis()
+
+    client.flushdb()
+    yield client
+    client.flushdb()
@@ -0,0 +1,244 @@
+"""
+HaroonNet ISP Platform - Accounting Stream Unit Tests
+Tests for session counter deltas, quota crossings and batch acknowledgement
+"""
+
+from datetime import datetime
+import pytest
+
+pytest.importorskip('pydantic_settings')
+
+from app.accounting import (AccountingStream, SESSION_KEY, apply_usage, compute_deltas, parse_event,
+                            quota_crossings)
+from app.usage_buckets import hour_number
+
+
+def event(status, session_id, input_octets, output_octets, session_time, when, username='user1', entry_id='1-0'):
+    fields = {
+        b'status': status.encode(), b'username': username.encode(), b'session_id': session_id.encode(),
+        b'nas_ip': b'10.0.0.1', b'input_octets': str(input_octets % 2 ** 32).encode(),
+        b'input_gigawords': str(input_octets >> 32).encode(), b'output_octets': str(output_octets).encode(),
+        b'output_gigawords': b'0', b'session_time': str(session_time).encode(),
+        b'event_time': str(int(when.timestamp())).encode(),
+    }
+    return parse_event(entry_id.encode(), fields)
+
+
+class FakeRedis:
+    """Single-stream, single-group stand-in for the consumer group commands"""
+
+    def __init__(self):
+        self.data = {}
+        self.entries = []
+        self.delivered = {}  # consumer -> pending entry ids
+        self.last_delivered = -1
+        self.groups = set()
+
+    def xadd(self, fields):
+        entry_id = f'{len(self.entries) + 1}-0'
+        self.entries.append((entry_id, fields))
+        return entry_id
+
+    def xgroup_create(self, stream, group, id='0', mkstream=False):
+        self.groups.add(group)
+
+    def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        (stream, start), = streams.items()
+        pending = self.delivered.setdefault(consumer, [])
+        if start == '0':
+            batch = [(entry_id, fields) for entry_id, fields in self.entries if entry_id in pending][:count]
+        else:
+            batch = self.entries[self.last_delivered + 1:self.last_delivered + 1 + count]
+            self.last_delivered += len(batch)
+            pending.extend(entry_id for entry_id, _ in batch)
+        return [(stream.encode(), [(entry_id.encode(), fields) for entry_id, fields in batch])] if batch else []
+
+    def xack(self, stream, group, *entry_ids):
+        for pending in self.delivered.values():
+            pending[:] = [entry_id for entry_id in pending if entry_id not in entry_ids]
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode()
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.calls = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+            def execute(self):
+                return [getattr(client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+        return Pipeline()
+
+
+class RecordingSession:
+    """Answers the subscription lookup and records the writes"""
+
+    def __init__(self, subscriptions):
+        self.subscriptions = subscriptions
+        self.writes = []
+
+    def execute(self, query, params=()):
+        if query.strip().startswith('SELECT'):
+            rows = [type('Row', (), row) for row in self.subscriptions if row['username'] in params]
+
+            class Result:
+                def fetchall(self):
+                    return rows
+
+            return Result()
+        self.writes.append((query.split()[0], params))
+
+
+def test_gigawords_and_malformed_entries():
+    parsed = event('Interim-Update', 's1', 5 * 2 ** 32 + 7, 3, 60, datetime(2024, 6, 1, 12))
+    assert parsed.input_octets == 5 * 2 ** 32 + 7
+
+    assert parse_event('2-0', {b'status': b'Start', b'username': b'user1'}) is None
+    assert parse_event('3-0', None) is None
+    reboot = parse_event('4-0', {b'status': b'Accounting-On', b'username': b'-', b'session_id': b'-',
+                                 b'event_time': b'1717243200'})
+    assert reboot.session_id == ''
+
+
+def test_cumulative_counters_become_deltas_in_the_hour_of_the_event():
+    events = [
+        event('Start', 's1', 0, 0, 0, datetime(2024, 6, 1, 23, 50)),
+        event('Interim-Update', 's1', 100, 1000, 300, datetime(2024, 6, 1, 23, 55)),
+        event('Interim-Update', 's1', 150, 1500, 600, datetime(2024, 6, 2, 0, 0, 30)),
+        event('Stop', 's1', 160, 1600, 650, datetime(2024, 6, 2, 0, 1)),
+        event('Interim-Update', 's2', 50, 500, 900, datetime(2024, 6, 2, 0, 1), username='user2'),
+    ]
+    # s2 was already applied up to 40/400/600 by an earlier batch
+    usage, counters = compute_deltas(events, {'s2': (40, 400, 600, False)})
+
+    midnight = hour_number(datetime(2024, 6, 2))
+    assert usage[('user1', midnight - 1)] == [100, 1000, 300, 0]
+    assert usage[('user1', midnight)] == [60, 600, 350, 1]
+    assert usage[('user2', midnight)] == [10, 100, 300, 0]
+    assert counters == {'s1': (160, 1600, 650, True), 's2': (50, 500, 900, False)}
+
+
+def test_counters_that_go_backwards_count_from_zero():
+    usage, _ = compute_deltas([event('Interim-Update', 's1', 30, 300, 60, datetime(2024, 6, 1, 12))],
+                              {'s1': (1000, 2000, 5000, False)})
+    assert usage[('user1', hour_number(datetime(2024, 6, 1, 12)))] == [30, 300, 60, 0]
+
+
+def test_quota_crossings():
+    assert quota_crossings(70, 15, 100) == ['warning']
+    assert quota_crossings(70, 40, 100) == ['warning', 'exceeded']
+    assert quota_crossings(85, 5, 100) == []
+    assert quota_crossings(0, 500, None) == []
+
+
+def test_usage_and_quota_deltas_are_applied_per_subscription():
+    db = RecordingSession([
+        {'id': 11, 'customer_id': 21, 'username': 'user1', 'monthly_quota': 1000, 'used_quota': 700},
+    ])
+    usage = {
+        ('user1', 478000): [100, 50, 300, 0],
+        ('user1', 478001): [20, 10, 60, 1],
+        ('ghost', 478001): [1, 1, 1, 0],
+    }
+
+    stats, crossed = apply_usage(db, usage)
+
+    assert stats == {'usage_rows': 2, 'subscriptions': 1, 'unknown_users': 1, 'quota_crossings': 1}
+    assert crossed == [11]
+    inserts = [params for verb, params in db.writes if verb == 'INSERT']
+    assert inserts == [(478000, 11, 100, 50, 300, 0), (478001, 11, 20, 10, 60, 1)]
+    assert ('UPDATE', (180, 11)) in db.writes
+
+
+def test_unacknowledged_batches_are_read_again_first():
+    client = FakeRedis()
+    for index in range(5):
+        client.xadd({b'status': b'Interim-Update', b'session_id': f's{index}'.encode()})
+    stream = AccountingStream(client, 'acct', 'usage', 'worker')
+    stream.ensure_group()
+
+    first = stream.read(3, 0)
+    assert [entry_id for entry_id, _ in first] == ['1-0', '2-0', '3-0']
+
+    # The run fails before acknowledging; a new consumer instance starts over
+    stream = AccountingStream(client, 'acct', 'usage', 'worker')
+    assert [entry_id for entry_id, _ in stream.read(3, 0)] == ['1-0', '2-0', '3-0']
+    stream.acknowledge(['1-0', '2-0', '3-0'], {'s0': (1, 2, 3, False), 's1': (4, 5, 6, True)})
+
+    assert [entry_id for entry_id, _ in stream.read(3, 0)] == ['4-0', '5-0']
+    assert stream.load_counters(['s0', 's1', 's9']) == {'s0': (1, 2, 3, False), 's1': (4, 5, 6, True)}
+    assert client.data[SESSION_KEY.format(session_id='s0')] == b'1,2,3,0'
+
+
+def test_repeated_stop_and_late_update_add_nothing():
+    client = FakeRedis()
+    stream = AccountingStream(client, 'acct', 'usage', 'worker')
+    stop = datetime(2024, 6, 1, 12, 30)
+    batches = [
+        [event('Interim-Update', 's1', 100, 1000, 300, datetime(2024, 6, 1, 12)),
+         event('Stop', 's1', 160, 1600, 650, stop)],
+        # The NAS retransmits the Stop, and a queued interim update arrives after it
+        [event('Stop', 's1', 160, 1600, 650, stop), event('Interim-Update', 's1', 150, 1500, 600, stop)],
+    ]
+
+    totals = []
+    for batch in batches:
+        usage, counters = compute_deltas(batch, stream.load_counters(event.session_id for event in batch))
+        stream.acknowledge([], counters)
+        totals.append(usage)
+
+    assert totals[0][('user1', hour_number(stop))] == [160, 1600, 650, 1]
+    assert totals[1] == {}
+    assert stream.load_counters(['s1']) == {'s1': (160, 1600, 650, True)}
+
+
+class CheckpointSession:
+    """Keeps accounting_checkpoints rows like the committed table"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def execute(self, query, params=()):
+        if query.strip().startswith('SELECT'):
+            row = self.rows.get(params)
+            return type('Result', (), {'fetchone': lambda self: row and type('Row', (), {'last_entry_id': row})})()
+        stream, group, entry_id, _ = params
+        self.rows[(stream, group)] = entry_id
+
+
+def test_batch_replayed_after_a_crash_before_acknowledging_adds_nothing():
+    client = FakeRedis()
+    db = CheckpointSession()
+    when = datetime(2024, 6, 1, 12)
+    client.data[SESSION_KEY.format(session_id='s1')] = b'100,1000,300,0'
+    for input_octets, output_octets in ((150, 1500), (200, 2000)):
+        client.xadd({b'status': b'Interim-Update', b'username': b'user1', b'session_id': b's1',
+                     b'input_octets': str(input_octets).encode(), b'output_octets': str(output_octets).encode(),
+                     b'session_time': b'600', b'event_time': str(int(when.timestamp())).encode()})
+    stream = AccountingStream(client, 'acct', 'usage', 'worker')
+    stream.ensure_group()
+
+    entries = stream.read(10, 0)
+    events = [parse_event(entry_id, fields) for entry_id, fields in entries]
+    usage, _ = compute_deltas(events, stream.load_counters(['s1']), stream.last_applied(db))
+    stream.record_applied(db, entries[-1][0])
+    # The usage commits, then the worker dies before acknowledge()
+    assert usage[('user1', hour_number(when))] == [100, 1000, 300, 0]
+
+    stream = AccountingStream(client, 'acct', 'usage', 'worker')
+    entries = stream.read(10, 0)
+    events = [parse_event(entry_id, fields) for entry_id, fields in entries]
+    usage, counters = compute_deltas(events, stream.load_counters(['s1']), stream.last_applied(db))
+
+    assert [entry_id for entry_id, _ in entries] == ['1-0', '2-0']
+    assert usage == {}
+    assert counters == {'s1': (200, 2000, 600, False)}
@@ -0,0 +1,72 @@
+"""
+HaroonNet ISP Platform - Analytics Unit Tests
+Tests for the columnar monthly plan analysis
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from app.analytics import analyze_plans
+
+
+class TestPlanAnalysis:
+    """Test per-plan revenue and usage aggregation"""
+
+    def setup_method(self):
+        """Set up dimension and fact tables"""
+        self.plans = pd.DataFrame({
+            'plan_id': np.array([1, 2, 3], dtype=np.int64),
+            'plan_name': np.array(['Basic', 'Pro', 'Unused'], dtype=object),
+            'monthly_fee': np.array([10.0, 25.0, 99.0]),
+        })
+        self.subscriptions = pd.DataFrame({
+            'subscription_id': np.array([100, 101, 102, 200], dtype=np.int64),
+            'customer_id': np.array([1, 2, 3, 4], dtype=np.int64),
+            'plan_id': np.array([1, 1, 1, 2], dtype=np.int64),
+            'username': np.array(['a', 'b', 'c', 'd'], dtype=object),
+            'is_active': np.array([True, True, False, True]),
+        })
+        # 31 daily rows for subscription 100, one for 101 and 200, none for 102
+        self.usage = pd.DataFrame({
+            'subscription_id': np.array([100] * 31 + [101, 200], dtype=np.int64),
+            'customer_id': np.array([1] * 31 + [2, 4], dtype=np.int64),
+            'total_octets': np.array([10] * 31 + [5, 1000], dtype=np.int64),
+            'session_time': np.array([60] * 31 + [60, 60], dtype=np.int64),
+        })
+
+    def test_revenue_not_multiplied_by_usage_rows(self):
+        """Revenue counts each active subscription once"""
+        result = analyze_plans(self.usage, self.subscriptions, self.plans)
+        plans = {row['plan_name']: row for row in result['plan_analysis']}
+
+        assert plans['Basic']['monthly_revenue'] == 20.0
+        assert plans['Basic']['total_subscribers'] == 3
+        assert plans['Basic']['active_subscribers'] == 2
+        assert plans['Pro']['monthly_revenue'] == 25.0
+
+    def test_usage_statistics_per_subscription(self):
+        """Usage averages are over subscriptions with usage"""
+        result = analyze_plans(self.usage, self.subscriptions, self.plans)
+        basic = next(row for row in result['plan_analysis'] if row['plan_name'] == 'Basic')
+
+        assert basic['total_usage'] == 315
+        assert basic['avg_usage_per_user'] == pytest.approx(157.5)
+        assert basic['p50_usage'] == pytest.approx(157.5)
+
+    def test_plans_without_subscribers_are_reported(self):
+        """Empty plans appear with zero revenue"""
+        result = analyze_plans(self.usage, self.subscriptions, self.plans)
+        unused = next(row for row in result['plan_analysis'] if row['plan_name'] == 'Unused')
+
+        assert unused['monthly_revenue'] == 0.0
+        assert unused['avg_usage_per_user'] is None
+        assert result['plan_analysis'][0]['plan_name'] == 'Pro'
+
+    def test_top_users(self):
+        """Top users are ranked by monthly usage"""
+        result = analyze_plans(self.usage, self.subscriptions, self.plans, top_n=2)
+
+        assert [row['username'] for row in result['top_users']] == ['d', 'a']
+        assert result['top_users'][1]['total_octets'] == 310
@@ -0,0 +1,130 @@
+"""
+HaroonNet ISP Platform - RADIUS Archive Unit Tests
+Tests for incremental radacct/radpostauth archival and restore planning
+"""
+
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('pydantic_settings')
+
+from app.archive import ArchiveManifest, RadiusArchiver
+from app.backup import BackupEngine, DumpResult
+from app.restore import RestoreError, restore_plan
+
+
+class FakeRadiusDB:
+    """Answers the archiver's boundary queries"""
+
+    def __init__(self, max_id, first_open=None):
+        self.max_id = max_id
+        self.first_open = first_open
+
+    def execute(self, query, params=()):
+        if 'MIN(radacctid)' in query:
+            row = SimpleNamespace(first_open=self.first_open)
+        else:
+            row = SimpleNamespace(max_id=self.max_id)
+        return SimpleNamespace(fetchone=lambda: row)
+
+
+@pytest.fixture
+def archiver(tmp_path):
+    engine = BackupEngine(backup_dir=str(tmp_path), compression='gzip')
+    return RadiusArchiver(engine, chunk_rows=1000)
+
+
+class TestRadiusArchiver:
+    """Test archive boundaries and chunking"""
+
+    def test_upper_bound_stops_below_open_sessions(self, archiver):
+        """Rows of still-open sessions are not archived"""
+        archiver.manifest.set_horizon('radacct', 5000)
+        assert archiver.archive_upper_bound(FakeRadiusDB(6000, first_open=4200), 'radacct') == 4199
+        assert archiver.archive_upper_bound(FakeRadiusDB(6000), 'radacct') == 5000
+        assert archiver.archive_upper_bound(FakeRadiusDB(None), 'radpostauth') == 0
+
+    def test_ids_are_archived_one_run_after_they_were_allocated(self, archiver, monkeypatch):
+        """An id still uncommitted when a run reads MAX(id) is never skipped"""
+        exported = []
+
+        def fake_dump(table, first_id, last_id, timestamp):
+            exported.append((first_id, last_id))
+            return DumpResult(backup_type=f'{table}_chunk', file_path=f'/tmp/{table}_{first_id}.sql.gz')
+
+        monkeypatch.setattr(archiver, 'dump_chunk', fake_dump)
+        archiver.archive_table(FakeRadiusDB(800), 'radpostauth', '20240101_000000')
+        assert exported == []
+        assert archiver.manifest.horizon('radpostauth') == 800
+
+        archiver.archive_table(FakeRadiusDB(1900), 'radpostauth', '20240102_000000')
+        assert exported == [(1, 800)]
+        assert archiver.manifest.horizon('radpostauth') == 1900
+
+    def test_base_dumps_the_tail_past_the_last_archived_id(self, archiver, monkeypatch):
+        """Open sessions and rows not yet archived are in the base"""
+        targets = []
+        monkeypatch.setattr(archiver.engine, 'run', lambda run_targets, timestamp: targets.extend(run_targets) or [])
+        archiver.manifest.data['tables']['radacct']['last_id'] = 4199
+
+        archiver.dump_base('20240101_000000')
+
+        tails = {target.backup_type: target for target in targets if target.backup_type.endswith('_tail')}
+        assert tails['radacct_tail'].tables == ['radacct']
+        assert '--where=radacctid > 4199' in tails['radacct_tail'].extra_args
+        assert '--where=id > 0' in tails['radpostauth_tail'].extra_args
+
+    def test_chunks_resume_after_last_archived_id(self, archiver, monkeypatch):
+        """Only ids past the manifest's last_id are exported"""
+        exported = []
+
+        def fake_dump(table, first_id, last_id, timestamp):
+            exported.append((first_id, last_id))
+            return DumpResult(backup_type=f'{table}_chunk', file_path=f'/tmp/{table}_{first_id}.sql.gz')
+
+        monkeypatch.setattr(archiver, 'dump_chunk', fake_dump)
+        archiver.manifest.data['tables']['radacct']['last_id'] = 1500
+        archiver.manifest.set_horizon('radacct', 3200)
+
+        archiver.archive_table(FakeRadiusDB(3200), 'radacct', '20240101_000000')
+
+        assert exported == [(1501, 2500), (2501, 3200)]
+        assert archiver.manifest.last_id('radacct') == 3200
+
+    def test_failed_chunk_does_not_advance(self, archiver, monkeypatch):
+        """A failed export leaves last_id at the previous chunk"""
+        def failing_dump(table, first_id, last_id, timestamp):
+            return DumpResult(backup_type='radacct_chunk', file_path='/tmp/x', status='failed', error='boom')
+
+        monkeypatch.setattr(archiver, 'dump_chunk', failing_dump)
+        archiver.manifest.set_horizon('radacct', 3200)
+        archiver.archive_table(FakeRadiusDB(3200), 'radacct', '20240101_000000')
+
+        assert archiver.manifest.last_id('radacct') == 0
+
+
+class TestRestorePlan:
+    """Test restore ordering"""
+
+    def test_plan_replays_schema_base_chunks_then_tails(self, tmp_path):
+        manifest = ArchiveManifest(str(tmp_path / 'manifest.json'))
+        base_files = []
+        for backup_type in ('radacct_tail', 'radius', 'radius_schema'):
+            path = tmp_path / f'{backup_type}.sql.gz'
+            path.write_bytes(b'')
+            base_files.append(DumpResult(backup_type=backup_type, file_path=str(path)))
+        manifest.add_chunk('radacct', 1001, 2000, DumpResult('radacct_chunk', 'radacct_2.sql.gz'))
+        manifest.add_chunk('radacct', 1, 1000, DumpResult('radacct_chunk', 'radacct_1.sql.gz'))
+        manifest.add_base('20240101_000000', base_files, {'radacct': 2000, 'radpostauth': 0})
+        # Archived by a later run whose base failed: already in the base's tail
+        manifest.add_chunk('radacct', 2001, 3000, DumpResult('radacct_chunk', 'radacct_3.sql.gz'))
+
+        plan = [entry['backup_type'] for entry in restore_plan(manifest)]
+        files = [entry['file'] for entry in restore_plan(manifest)]
+
+        assert plan == ['radius_schema', 'radius', 'radacct_chunk', 'radacct_chunk', 'radacct_tail']
+        assert files[2].endswith('radacct_1.sql.gz')
+
+    def test_plan_requires_base(self, tmp_path):
+        with pytest.raises(RestoreError):
+            restore_plan(ArchiveManifest(str(tmp_path / 'manifest.json')))
@@ -0,0 +1,83 @@
+"""
+HaroonNet ISP Platform - Notification Backpressure Unit Tests
+Tests for the shared token bucket, spilling and adaptive send rate, running
+the bucket script on a Lua-capable Redis (the redis_client fixture)
+"""
+
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('prometheus_client')
+
+from app import backpressure
+
+
+class FakeTask:
+    def __init__(self):
+        self.sent = []
+
+    def delay(self, *args):
+        self.sent.append(args)
+
+
+class FakeSession:
+    def __init__(self):
+        self.rows = []
+
+    def execute(self, query, params):
+        self.rows.append(params)
+
+
+@pytest.fixture
+def send_task(monkeypatch):
+    task = FakeTask()
+    monkeypatch.setattr(backpressure, '_send_task', lambda channel: task)
+    monkeypatch.setattr(backpressure, '_depth_cache', {})
+    monkeypatch.setattr(backpressure.settings, 'NOTIFY_EMAIL_RATE', 10.0)
+    monkeypatch.setattr(backpressure.settings, 'NOTIFY_BURST_SECONDS', 2.0)
+    return task
+
+
+def test_burst_above_bucket_is_spilled_with_schedule(send_task, redis_client):
+    db = FakeSession()
+
+    outcomes = [backpressure.notify(db, 'email', f'user{i}@example.com', 'invoice_generated',
+                                    {'amount': 1500}, client=redis_client, broker=redis_client)
+                for i in range(50)]
+
+    # The bucket holds 2s at 10/s; it may refill a token while the loop runs
+    enqueued = outcomes.count('enqueued')
+    assert 20 <= enqueued <= 21
+    assert len(send_task.sent) == enqueued
+    assert len(db.rows) == 50 - enqueued
+    recipient, channel, template, context, status, scheduled_at, created_at = db.rows[0]
+    assert (channel, status) == ('email', 'pending')
+    assert scheduled_at > created_at
+
+
+def test_deep_queue_spills_without_taking_tokens(send_task, monkeypatch, redis_client):
+    monkeypatch.setattr(backpressure.settings, 'NOTIFY_MAX_QUEUE_DEPTH', 100)
+    redis_client.rpush(backpressure.NOTIFICATIONS_QUEUE, *range(5000))
+    db = FakeSession()
+
+    assert backpressure.notify(db, 'email', 'a@example.com', 'quota_warning', {}, client=redis_client,
+                               broker=redis_client) == 'spilled'
+    assert send_task.sent == []
+    assert not redis_client.exists(backpressure.BUCKET_KEY.format(channel='email'))
+
+
+def test_rate_halves_on_errors_and_recovers_additively(monkeypatch, redis_client):
+    monkeypatch.setattr(backpressure.settings, 'NOTIFY_EMAIL_RATE', 10.0)
+    monkeypatch.setattr(backpressure.settings, 'NOTIFY_MIN_RATE', 1.0)
+    monkeypatch.setattr(backpressure.settings, 'NOTIFY_ADAPT_MIN_SAMPLES', 10)
+    def window(ok, errors):
+        redis_client.hset(backpressure.WINDOW_KEY.format(channel='email'), mapping={'ok': ok, 'error': errors})
+        return backpressure.adapt('email', redis_client)
+
+    assert window(80, 20) == 5.0
+    assert window(80, 20) == 2.5
+    assert window(0, 50) == 1.25
+    assert window(0, 50) == 1.0
+    assert window(100, 0) == 2.0
+    assert window(3, 0) is None
+    assert backpressure.current_rate('email', redis_client) == 2.0
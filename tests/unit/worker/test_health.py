@@ -0,0 +1,104 @@
+"""
+HaroonNet ISP Platform - Health Subsystem Unit Tests
+Tests for concurrent probes, CPU sampling and alert de-duplication
+"""
+
+import threading
+import time
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('psutil')
+
+from app.health import CpuSampler, HealthReport, new_alerts, run_probes
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.sets = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def smembers(self, key):
+        return {member.encode() for member in self.sets.get(key, set())}
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def srem(self, key, member):
+        self.sets.get(key, set()).discard(member)
+
+
+def test_probes_run_concurrently_with_timeout():
+    def slow():
+        time.sleep(0.3)
+
+    def failing():
+        raise RuntimeError('connection refused')
+
+    started = time.monotonic()
+    results = run_probes({'ok': lambda: 42, 'slow': slow, 'failing': failing}, timeout=0.1)
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.3
+    assert results['ok'].status == 'healthy'
+    assert results['ok'].value == 42
+    assert results['slow'].status == 'timeout'
+    assert results['failing'].status == 'unhealthy'
+    assert 'connection refused' in results['failing'].error
+
+
+def test_hung_probes_do_not_delay_later_checks():
+    release = threading.Event()
+    hung = {name: release.wait for name in ('database', 'radius_database', 'redis')}
+
+    try:
+        for _ in range(2):
+            assert all(result.status == 'timeout' for result in run_probes(hung, timeout=0.05).values())
+
+        started = time.monotonic()
+        results = run_probes({'database': lambda: None, 'redis': lambda: None}, timeout=1)
+        assert time.monotonic() - started < 0.5
+        assert all(result.status == 'healthy' for result in results.values())
+    finally:
+        release.set()
+
+
+def test_cpu_sampler_does_not_block():
+    sampler = CpuSampler()
+    started = time.monotonic()
+    percent, source = sampler.sample()
+
+    assert time.monotonic() - started < 0.5
+    assert source == 'loadavg'
+    assert 0.0 <= percent <= 100.0
+
+
+def test_persistent_issue_alerts_once_until_resolved():
+    client = FakeRedis()
+    report = HealthReport(issues=[('disk', 'High disk usage: 95.0%')])
+
+    assert new_alerts(report, client, cooldown=3600) == [('disk', 'High disk usage: 95.0%')]
+    # Same issue with a different reading is still the same issue
+    report = HealthReport(issues=[('disk', 'High disk usage: 96.0%')])
+    assert new_alerts(report, client, cooldown=3600) == []
+
+    assert new_alerts(HealthReport(), client, cooldown=3600) == []
+    assert new_alerts(report, client, cooldown=3600) == [('disk', 'High disk usage: 96.0%')]
+
+
+def test_alerts_every_issue_without_redis():
+    class BrokenRedis:
+        def smembers(self, key):
+            raise ConnectionError('redis down')
+
+    report = HealthReport(issues=[('redis', 'Redis connection issue: down')])
+    assert new_alerts(report, BrokenRedis(), cooldown=3600) == report.issues
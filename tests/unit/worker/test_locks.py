@@ -0,0 +1,119 @@
+"""
+HaroonNet ISP Platform - Task Lease Unit Tests
+Tests for lease locks, holder tokens and singleton task ticks, running the
+lease scripts on a Lua-capable Redis (the redis_client fixture)
+"""
+
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('prometheus_client')
+
+from app import locks
+
+
+class FakeTask:
+    name = 'app.tasks.radius.update_usage_aggregates'
+
+    def __init__(self):
+        self.enqueued = 0
+
+    def apply_async(self):
+        self.enqueued += 1
+
+
+def test_tokens_increase_and_second_holder_is_refused(redis_client):
+    first = locks.Lease('aggregates', 60, redis_client)
+    second = locks.Lease('aggregates', 60, redis_client)
+
+    assert first.acquire()
+    assert 0 < redis_client.pttl(first.key) <= 60000
+    assert not second.acquire()
+    assert first.release()
+    assert second.acquire()
+    assert second.token > first.token
+
+
+def test_expired_lease_cannot_be_extended_or_released_by_old_holder(redis_client):
+    old = locks.Lease('quota', 60, redis_client)
+    old.acquire()
+    # The lease TTL runs out
+    redis_client.delete(old.key)
+    new = locks.Lease('quota', 60, redis_client)
+    new.acquire()
+
+    assert not old.extend()
+    with pytest.raises(locks.LeaseLost):
+        old.ensure()
+    assert not old.release()
+    assert new.holder() == new.token
+
+
+def test_overlapping_tick_is_skipped(redis_client):
+    task = FakeTask()
+    results = []
+
+    @locks.singleton(ttl=60, missed='skip', client=redis_client)
+    def run(task):
+        results.append(run_again(task))
+        return {'status': 'completed'}
+
+    run_again = locks.singleton(ttl=60, missed='skip', client=redis_client)(lambda task: {'status': 'completed'})
+
+    assert run(task) == {'status': 'completed'}
+    assert results == [{'status': 'skipped', 'reason': 'already_running', 'missed': 'skip'}]
+    assert task.enqueued == 0
+
+
+def test_missed_ticks_coalesce_into_one_follow_up_run(redis_client):
+    task = FakeTask()
+
+    @locks.singleton(ttl=60, missed='coalesce', client=redis_client)
+    def run(task, overlaps=0):
+        for _ in range(overlaps):
+            run(task)
+        return {'status': 'completed'}
+
+    run(task, overlaps=3)
+
+    assert task.enqueued == 1
+
+
+def test_lease_lost_mid_run_stops_side_effects(redis_client):
+    sent = []
+
+    @locks.singleton(ttl=60, client=redis_client)
+    def run(task):
+        redis_client.delete(locks.LOCK_KEY.format(name=task.name))
+        locks.ensure_lease()
+        sent.append('coa')
+
+    with pytest.raises(locks.LeaseLost):
+        run(FakeTask())
+    assert sent == []
+
+
+def test_task_lease_is_taken_before_the_task_opens_sessions(redis_client):
+    opened = []
+
+    class LeasedTask(FakeTask):
+        @locks.singleton(ttl=60, client=redis_client)
+        def run(self):
+            return {'status': 'completed', 'holder': locks.current_lease().token}
+
+        def __call__(self):
+            with locks.task_lease(self) as skipped:
+                if skipped:
+                    return skipped
+                opened.append('session')
+                return self.run()
+
+    holder = locks.Lease(LeasedTask.name, 60, redis_client)
+    holder.acquire()
+    assert LeasedTask()()['reason'] == 'already_running'
+    assert opened == []
+
+    holder.release()
+    result = LeasedTask()()
+    assert result['status'] == 'completed' and result['holder'] > holder.token
+    assert opened == ['session']
@@ -0,0 +1,104 @@
+"""
+HaroonNet ISP Platform - Worker Metrics Unit Tests
+Tests for task, database and queue depth metrics
+"""
+
+import os
+import tempfile
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('prometheus_client')
+pytest.importorskip('celery')
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', tempfile.mkdtemp(prefix='haroonnet-metrics-'))
+
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from app import metrics
+
+
+class FakeTask:
+    name = 'app.tasks.radius.send_coa_disconnect'
+
+
+class FakePipeline:
+    def __init__(self, lists):
+        self.lists = lists
+        self.commands = []
+
+    def llen(self, key):
+        self.commands.append(key)
+
+    def execute(self):
+        return [self.lists.get(key, 0) for key in self.commands]
+
+
+class FakeRedis:
+    def __init__(self, lists):
+        self.lists = lists
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.lists)
+
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_task_postrun_records_duration_and_outcome():
+    task = FakeTask()
+    before = sample('haroonnet_worker_external_calls_total', {'service': 'coa', 'outcome': 'no_session'})
+
+    metrics.on_task_prerun(task_id='t1', task=task)
+    metrics.on_task_postrun(task_id='t1', task=task, retval={'status': 'no_session'}, state='SUCCESS')
+
+    assert sample('haroonnet_worker_external_calls_total',
+                  {'service': 'coa', 'outcome': 'no_session'}) == before + 1
+    assert sample('haroonnet_worker_task_duration_seconds_count',
+                  {'task': task.name, 'state': 'SUCCESS'}) >= 1
+
+
+def test_rows_processed_from_result_counts():
+    labels = {'task': 'app.tasks.billing.generate_monthly_invoices', 'kind': 'invoices_generated'}
+    before = sample('haroonnet_worker_rows_processed_total', labels)
+
+    metrics.record_result(labels['task'], {'status': 'completed', 'invoices_generated': 12,
+                                           'billing_period': '2024-05', 'dry_run': True})
+
+    assert sample('haroonnet_worker_rows_processed_total', labels) == before + 12
+
+
+def test_only_row_count_fields_are_rows():
+    task = 'app.tasks.system.backup_database'
+    metrics.record_result(task, {'status': 'completed', 'app_size': 52428800, 'radius_size': 1048576})
+    metrics.record_result('app.tasks.system.update_system_statistics', {'active_sessions': 800})
+
+    assert sample('haroonnet_worker_rows_processed_total', {'task': task, 'kind': 'app_size'}) == 0
+    assert sample('haroonnet_worker_rows_processed_total',
+                  {'task': 'app.tasks.system.update_system_statistics', 'kind': 'active_sessions'}) == 0
+
+
+def test_engine_queries_are_timed():
+    engine = create_engine('sqlite://')
+    metrics.instrument_engine(engine, 'test')
+
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        with pytest.raises(Exception):
+            conn.execute(text('SELECT * FROM missing_table'))
+
+    assert sample('haroonnet_worker_db_query_seconds_count', {'database': 'test', 'task': 'none'}) == 2
+
+
+def test_queue_depth_for_routed_queues():
+    from app.celery import celery
+
+    queues = metrics.queue_names(celery)
+    assert {'billing', 'notifications', 'radius', 'reports', 'system', 'default'} <= set(queues)
+
+    collector = metrics.QueueDepthCollector(['billing', 'radius'], FakeRedis({'billing': 7}))
+    family = next(collector.collect())
+
+    assert {s.labels['queue']: s.value for s in family.samples} == {'billing': 7, 'radius': 0}
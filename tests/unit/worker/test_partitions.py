@@ -0,0 +1,116 @@
+"""
+HaroonNet ISP Platform - Partition Manager Unit Tests
+Tests for monthly partition planning
+"""
+
+from datetime import date
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('pydantic_settings')
+
+from app.partitions import PartitionError, PartitionManager, PartitionSpec
+
+
+class SchemaSession:
+    """Answers the information_schema lookups for one table"""
+
+    def __init__(self, keys, column_type, nullable, null_rows=0, foreign_keys=()):
+        self.keys = keys
+        self.foreign_keys = foreign_keys
+        self.column = SimpleNamespace(column_type=column_type, is_nullable='YES' if nullable else 'NO')
+        self.null_rows = null_rows
+
+    def execute(self, query, params=()):
+        if 'information_schema.statistics' in query:
+            rows = [SimpleNamespace(index_name=name, column_name=column)
+                    for name, columns in self.keys.items() for column in columns]
+        elif 'information_schema.key_column_usage' in query:
+            rows = [SimpleNamespace(table_name=table, constraint_name=name, referenced_table_name=referenced)
+                    for table, name, referenced in self.foreign_keys]
+        elif 'information_schema.columns' in query:
+            rows = [self.column]
+        else:
+            rows = [SimpleNamespace(null_rows=self.null_rows)]
+        return SimpleNamespace(fetchall=lambda: rows, fetchone=lambda: rows[0])
+
+
+# The keys of FreeRADIUS' mysql schema.sql radacct table
+FREERADIUS_RADACCT_KEYS = {'PRIMARY': ['radacctid'], 'acctuniqueid': ['acctuniqueid']}
+
+
+@pytest.fixture
+def manager():
+    return PartitionManager(months_ahead=2, today=date(2024, 6, 15))
+
+
+class TestPartitionPlan:
+    """Test which partitions are added and dropped"""
+
+    def test_adds_missing_future_months(self, manager):
+        spec = PartitionSpec('radacct', 'acctstarttime', 'radius', 730)
+        plan = manager.plan(spec, ['p202405', 'p202406', 'pmax'])
+
+        assert plan['add'] == [date(2024, 7, 1), date(2024, 8, 1)]
+        assert plan['drop'] == []
+
+    def test_drops_only_fully_expired_months(self, manager):
+        # Cutoff is 2023-12-18: December 2023 still holds rows inside retention
+        spec = PartitionSpec('radpostauth', 'authdate', 'radius', 180, function='UNIX_TIMESTAMP')
+        plan = manager.plan(spec, ['p202310', 'p202311', 'p202312', 'p202408', 'pmax'])
+
+        assert plan['drop'] == [date(2023, 10, 1), date(2023, 11, 1)]
+        assert plan['add'] == []
+
+    def test_reorganize_statement_keeps_maxvalue(self, manager):
+        spec = PartitionSpec('radpostauth', 'authdate', 'radius', 180, function='UNIX_TIMESTAMP')
+        sql = manager.add_partitions_sql(spec, [date(2024, 12, 1)])
+
+        assert sql.startswith('ALTER TABLE radpostauth REORGANIZE PARTITION pmax INTO')
+        assert "p202412 VALUES LESS THAN (UNIX_TIMESTAMP('2025-01-01 00:00:00'))" in sql
+        assert sql.rstrip(')').endswith('pmax VALUES LESS THAN MAXVALUE\n')
+
+    def test_hour_number_tables_partition_on_the_bare_column(self, manager):
+        spec = PartitionSpec('usage_hourly', 'hour', 'app', 400, function='HOURS')
+        statements = manager.conversion_ddl(spec, {'PRIMARY': ['hour', 'subscription_id']}, months_back=1)
+
+        # The primary key already starts with hour, so it is left alone
+        assert len(statements) == 1
+        assert statements[0].startswith('ALTER TABLE usage_hourly PARTITION BY RANGE (hour) (')
+        # 2024-07-01 00:00 is 19905 days after the epoch
+        assert f"p202406 VALUES LESS THAN ({19905 * 24})" in statements[0]
+
+
+class TestConversion:
+    """Test the one-off conversion DDL"""
+
+    def test_freeradius_radacct_keys_and_nullable_start_time(self, manager):
+        spec = PartitionSpec('radacct', 'acctstarttime', 'radius', 730)
+        session = SchemaSession(FREERADIUS_RADACCT_KEYS, 'datetime', nullable=True)
+
+        alter, partition = manager.conversion_plan(session, spec, months_back=1)
+
+        assert alter == (
+            'ALTER TABLE radacct MODIFY acctstarttime datetime NOT NULL, '
+            'DROP PRIMARY KEY, ADD PRIMARY KEY (radacctid, acctstarttime), '
+            'DROP INDEX acctuniqueid, ADD UNIQUE KEY acctuniqueid (acctuniqueid, acctstarttime)'
+        )
+        assert partition.startswith('ALTER TABLE radacct PARTITION BY RANGE (TO_DAYS(acctstarttime)) (')
+
+    def test_rows_without_a_start_time_refuse_the_conversion(self, manager):
+        spec = PartitionSpec('radacct', 'acctstarttime', 'radius', 730)
+        session = SchemaSession(FREERADIUS_RADACCT_KEYS, 'datetime', nullable=True, null_rows=12)
+
+        with pytest.raises(PartitionError, match='12 radacct rows have NULL acctstarttime'):
+            manager.conversion_plan(session, spec)
+
+    def test_tables_with_foreign_keys_refuse_the_conversion(self, manager):
+        spec = PartitionSpec('usage_aggregates', 'date', 'app', 730)
+        session = SchemaSession({'PRIMARY': ['id']}, 'date', nullable=False,
+                                foreign_keys=[('usage_aggregates', 'usage_aggregates_ibfk_1', 'subscriptions')])
+
+        with pytest.raises(PartitionError) as error:
+            manager.conversion_plan(session, spec)
+
+        assert 'usage_aggregates_ibfk_1 (usage_aggregates -> subscriptions)' in str(error.value)
+        assert 'ALTER TABLE usage_aggregates DROP FOREIGN KEY usage_aggregates_ibfk_1' in str(error.value)
@@ -0,0 +1,87 @@
+"""
+HaroonNet ISP Platform - Task Payload Unit Tests
+Tests for the msgpack serializer and reference passing
+"""
+
+import datetime
+import decimal
+import json
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('msgpack')
+
+from app import payloads
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def get(self, key):
+        return self.data.get(key)
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params):
+        data = self.rows.get(params[0])
+
+        class Result:
+            def fetchone(self):
+                return type('Row', (), {'data': data}) if data else None
+
+        return Result()
+
+
+def test_msgpack_round_trip_keeps_types():
+    context = {
+        'amount': decimal.Decimal('1499.50'),
+        'due_date': datetime.date(2024, 6, 30),
+        'sent_at': datetime.datetime(2024, 6, 1, 10, 30),
+        'items': [1, 'two', None],
+    }
+    packed = payloads.pack(context)
+
+    assert payloads.unpack(packed) == context
+    assert len(packed) < len(json.dumps(context, default=str))
+
+
+def test_large_values_passed_by_reference():
+    client = FakeRedis()
+    small = {'customer_name': 'Ahmad'}
+    large = {'rows': [{'username': f'user{i}', 'octets': i * 1000} for i in range(500)]}
+
+    assert payloads.offload(small, limit=1024, client=client) is small
+    ref = payloads.offload(large, limit=1024, client=client)
+
+    assert list(ref) == ['$payload']
+    context = payloads.resolve({'report_date': '2024-06-01', 'health_data': ref}, client=client)
+    assert context == {'report_date': '2024-06-01', 'health_data': large}
+
+
+def test_expired_payload_raises():
+    with pytest.raises(payloads.PayloadExpired):
+        payloads.resolve({'$payload': 'haroonnet:payload:gone'}, client=FakeRedis())
+
+
+def test_report_reference_loads_saved_report():
+    db = FakeSession({42: json.dumps({'revenue': {'total': 1000}})})
+    context = payloads.resolve({'report_date': '2024-06-01', 'reports': payloads.report_ref(42)}, db=db)
+
+    assert context['reports'] == {'revenue': {'total': 1000}}
+
+
+def test_msgpack_profile_annotates_fanout_tasks(monkeypatch):
+    monkeypatch.setattr(payloads.settings, 'TASK_SERIALIZER_PROFILE', 'msgpack')
+    options = payloads.celery_options()
+
+    assert payloads.SERIALIZER in options['accept_content']
+    assert options['task_annotations']['app.tasks.notifications.send_email_notification'] == {
+        'serializer': payloads.SERIALIZER
+    }
@@ -0,0 +1,106 @@
+"""
+HaroonNet ISP Platform - SQL Profiler Unit Tests
+Tests for statement fingerprints, per-task statistics and N+1 detection
+"""
+
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('prometheus_client')
+pytest.importorskip('celery')
+
+from sqlalchemy import create_engine, text
+
+from app import metrics
+from app.profiler import SQLProfiler, StatementStats, fingerprint, load_profiles, report
+
+
+def test_fingerprint_normalises_literals():
+    assert fingerprint("SELECT * FROM radacct WHERE username = 'ali' AND radacctid > 42") == \
+        fingerprint("SELECT *\n  FROM radacct WHERE username = %s AND radacctid > %s") == \
+        "SELECT * FROM radacct WHERE username = ? AND radacctid > ?"
+    assert fingerprint("SELECT 1 FROM t WHERE id IN (1, 2, 3)") == "SELECT ? FROM t WHERE id IN (...)"
+    assert fingerprint("INSERT INTO t VALUES (%s, %s), (%s, %s)") == "INSERT INTO t VALUES (?, ?), ..."
+
+
+def test_percentile_from_buckets():
+    stats = StatementStats()
+    for _ in range(99):
+        stats.add(0.001, 1)
+    stats.add(0.5, 1)
+
+    assert 0.001 <= stats.percentile(0.99) < 0.0013
+    assert stats.percentile(1.0) == 0.5
+
+
+def test_n_plus_one_detected_per_task_run(tmp_path):
+    profiler = SQLProfiler(n_plus_one_threshold=5, profile_dir=str(tmp_path))
+    profiler.start_task('t1')
+    for customer_id in range(10):
+        profiler.record('app', f"SELECT * FROM customers WHERE id = {customer_id}", 0.002, 1,
+                        task_name='app.tasks.billing.generate_monthly_invoices', task_id='t1')
+    profiler.record('app', 'SELECT COUNT(*) FROM customers', 0.01, 1,
+                    task_name='app.tasks.billing.generate_monthly_invoices', task_id='t1')
+    findings = profiler.finish_task('t1')
+
+    assert len(findings) == 1
+    assert findings[0]['executions'] == 10
+    assert findings[0]['statement'] == 'SELECT * FROM customers WHERE id = ?'
+
+
+def test_engine_statements_recorded(tmp_path):
+    profiler = SQLProfiler(profile_dir=str(tmp_path))
+    engine = create_engine('sqlite://')
+    profiler.instrument(engine, 'app')
+
+    with engine.connect() as conn:
+        for value in range(3):
+            conn.execute(text(f'SELECT {value}'))
+
+    assert profiler.stats[('none', 'app', 'SELECT ?')].count == 3
+
+
+def test_profiler_and_metrics_share_one_listener_pair(tmp_path):
+    profiler = SQLProfiler(profile_dir=str(tmp_path))
+    engine = create_engine('sqlite://')
+    metrics.instrument_engine(engine, 'app')
+    profiler.instrument(engine, 'app')
+
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        with pytest.raises(Exception):
+            conn.execute(text('SELECT * FROM missing_table'))
+
+    assert len(engine.dispatch.before_cursor_execute) == 1
+    assert len(engine.dispatch.after_cursor_execute) == 1
+    assert profiler.stats[('none', 'app', 'SELECT ?')].count == 1
+    assert len(profiler.stats) == 1
+
+
+def test_n_plus_one_findings_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr('app.profiler.N_PLUS_ONE_KEPT', 3)
+    profiler = SQLProfiler(n_plus_one_threshold=1, profile_dir=str(tmp_path))
+    for run in range(5):
+        task_id = f't{run}'
+        profiler.start_task(task_id)
+        for _ in range(2):
+            profiler.record('app', 'SELECT * FROM customers WHERE id = 1', 0.001, 1,
+                            task_name='task', task_id=task_id)
+        profiler.finish_task(task_id)
+
+    assert [finding['task_id'] for finding in profiler.snapshot()['n_plus_one']] == ['t2', 't3', 't4']
+
+
+def test_flush_and_merge_profiles(tmp_path, monkeypatch):
+    for pid in (101, 102):
+        monkeypatch.setattr('os.getpid', lambda: pid)
+        profiler = SQLProfiler(profile_dir=str(tmp_path))
+        profiler.record('radius', 'SELECT * FROM radacct WHERE id = 1', 0.004, 3, task_name='task')
+        profiler.flush()
+
+    stats, _ = load_profiles(str(tmp_path))
+    rows = report(stats)
+
+    assert len(rows) == 1
+    assert rows[0]['count'] == 2
+    assert rows[0]['rows'] == 6
@@ -0,0 +1,172 @@
+"""
+HaroonNet ISP Platform - Purge Engine Unit Tests
+Tests for batched, checkpointed retention deletes
+"""
+
+import sqlite3
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip('pydantic_settings')
+
+from app.config import settings
+from app.purge import PurgeCheckpoints, PurgeEngine, PurgeJob, PurgeThrottle
+
+
+class SQLiteSession:
+    """Minimal session running the engine's %s-style SQL against SQLite"""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES)
+        self.conn.row_factory = sqlite3.Row
+        self.commits = 0
+
+    def execute(self, query, params=()):
+        cursor = self.conn.execute(query.replace('%s', '?'), params)
+
+        class Result:
+            rowcount = cursor.rowcount
+
+            def fetchone(self):
+                row = cursor.fetchone()
+                return type('Row', (), dict(row)) if row else None
+
+        return Result()
+
+    def commit(self):
+        self.commits += 1
+        self.conn.commit()
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class NoPressureThrottle(PurgeThrottle):
+    def __init__(self):
+        super().__init__(batch_sleep=0, sleep=lambda seconds: None)
+
+    def pressure(self, db, replica_url=None):
+        return None
+
+
+@pytest.fixture
+def db():
+    session = SQLiteSession()
+    session.conn.execute('CREATE TABLE audit_logs (id INTEGER PRIMARY KEY, created_at TIMESTAMP)')
+    now = datetime(2024, 6, 1)
+    rows = [(i, now - timedelta(days=400 if i % 4 else 10)) for i in range(1, 101)]
+    session.conn.executemany('INSERT INTO audit_logs VALUES (?, ?)', rows)
+    return session
+
+
+@pytest.fixture
+def job():
+    return PurgeJob('audit_logs', 'audit_logs', 'id', 'created_at', datetime(2024, 6, 1) - timedelta(days=365))
+
+
+def remaining(db):
+    return db.conn.execute('SELECT COUNT(*) FROM audit_logs').fetchone()[0]
+
+
+class TestPurgeEngine:
+    """Test the batched purge loop"""
+
+    def test_deletes_expired_rows_in_batches(self, db, job):
+        checkpoints = PurgeCheckpoints(FakeRedis())
+        engine = PurgeEngine(batch_size=10, max_runtime=0, checkpoints=checkpoints, throttle=NoPressureThrottle())
+
+        result = engine.run(db, job)
+
+        assert result.completed
+        assert result.deleted == 75
+        assert result.batches == 8
+        assert db.commits == 8
+        assert remaining(db) == 25
+        assert checkpoints.load('audit_logs') is None
+
+    def test_interrupted_purge_resumes_from_checkpoint(self, db, job):
+        checkpoints = PurgeCheckpoints(FakeRedis())
+        engine = PurgeEngine(batch_size=10, max_runtime=0, checkpoints=checkpoints, throttle=NoPressureThrottle())
+        checkpoints.save('audit_logs', job.cutoff, 50)
+
+        result = engine.run(db, job)
+
+        assert result.resumed
+        assert result.deleted == 37
+        # Rows at or below the checkpoint were left for a fresh run
+        assert remaining(db) == 63
+
+    def test_throttle_backs_off_under_pressure(self):
+        slept = []
+        pressure = iter(['lock waits', 'lock waits', None])
+        throttle = PurgeThrottle(batch_sleep=0.5, sleep=slept.append)
+        throttle.pressure = lambda db, replica_url=None: next(pressure)
+
+        total, ready = throttle.wait(None)
+
+        assert slept == [0.5, 1.0, 2.0]
+        assert (total, ready) == (3.5, True)
+
+    def test_throttle_gives_up_at_the_deadline(self):
+        """A stopped replica cannot keep the run sleeping past its budget"""
+        now = [0.0]
+        throttle = PurgeThrottle(batch_sleep=0.5, sleep=lambda seconds: now.__setitem__(0, now[0] + seconds),
+                                 clock=lambda: now[0])
+        throttle.pressure = lambda db, replica_url=None: 'replication lag 31s'
+
+        total, ready = throttle.wait(None, deadline=10.0)
+
+        assert not ready
+        assert total == now[0] == 10.0
+
+    def test_run_stops_when_throttled_past_the_budget(self, db, job):
+        checkpoints = PurgeCheckpoints(FakeRedis())
+        throttle = PurgeThrottle(batch_sleep=0, sleep=lambda seconds: None)
+        throttle.pressure = lambda db, replica_url=None: '6 transactions waiting on locks'
+        throttle.clock = lambda: float('inf')
+        engine = PurgeEngine(batch_size=10, max_runtime=60, checkpoints=checkpoints, throttle=throttle)
+
+        result = engine.run(db, job)
+
+        assert not result.completed
+        assert result.batches == 1
+        assert checkpoints.load('audit_logs')['last_key'] == result.last_key
+
+    def test_batches_stop_at_the_last_expired_key(self, db, job):
+        """The final probe does not scan rows past the newest expired one"""
+        queries = []
+        execute = db.execute
+        db.execute = lambda query, params=(): queries.append(query) or execute(query, params)
+        engine = PurgeEngine(batch_size=100, max_runtime=0, checkpoints=PurgeCheckpoints(FakeRedis()),
+                             throttle=NoPressureThrottle())
+
+        result = engine.run(db, job)
+
+        assert result.completed and result.deleted == 75
+        # One probe for the single batch; the cutoff key ends the loop without another
+        assert sum('LIMIT' in query for query in queries) == 1
+
+    def test_radius_jobs_wait_on_the_radius_replica(self, db, job, monkeypatch):
+        monkeypatch.setattr(settings, 'DB_REPLICA_URL', 'mysql://app-replica/haroonnet')
+        monkeypatch.setattr(settings, 'RADIUS_DB_REPLICA_URL', 'mysql://radius-replica/radius')
+        checked = []
+        throttle = PurgeThrottle(batch_sleep=0, sleep=lambda seconds: None)
+        throttle.lock_waits = lambda db: 0
+        throttle.replication_lag = lambda replica_url: checked.append(replica_url)
+        engine = PurgeEngine(batch_size=50, max_runtime=0, checkpoints=PurgeCheckpoints(FakeRedis()), throttle=throttle)
+
+        engine.run(db, PurgeJob('radacct', 'audit_logs', 'id', 'created_at', job.cutoff, database='radius'))
+
+        assert checked == ['mysql://radius-replica/radius'] * 2
+        assert job.replica_url == 'mysql://app-replica/haroonnet'
@@ -0,0 +1,66 @@
+"""
+HaroonNet ISP Platform - Session Management Unit Tests
+Tests for task-scoped session reuse and read-replica routing
+"""
+
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('prometheus_client')
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from app import sessions
+
+
+@pytest.fixture
+def engines(monkeypatch, tmp_path):
+    primary = {
+        'app': create_engine(f"sqlite:///{tmp_path / 'app.db'}", poolclass=QueuePool),
+        'radius': create_engine('sqlite://'),
+    }
+    replicas = {'app': create_engine('sqlite://'), 'radius': None}
+    monkeypatch.setattr(sessions, 'PRIMARY_ENGINES', primary)
+    monkeypatch.setattr(sessions, 'REPLICA_ENGINES', replicas)
+    return primary, replicas
+
+
+def test_sessions_reused_within_task_scope(engines):
+    with sessions.task_scope() as scope:
+        first = sessions.app_session()
+        assert sessions.app_session() is first
+
+        # A nested scope (e.g. a helper) shares the task's sessions
+        with sessions.task_scope():
+            assert sessions.app_session() is first
+
+        assert sessions.radius_session() is not first
+        assert len(scope) == 2
+
+    with sessions.task_scope():
+        assert sessions.app_session() is not first
+
+
+def test_reads_routed_to_replica_when_configured(engines):
+    primary, replicas = engines
+    with sessions.task_scope():
+        assert sessions.read_session('app').get_bind() is replicas['app']
+        assert sessions.read_session('app') is not sessions.app_session()
+        # No RADIUS replica: reads share the primary session
+        assert sessions.read_session('radius') is sessions.radius_session()
+        assert sessions.radius_session().get_bind() is primary['radius']
+
+
+def test_sessions_closed_and_connections_returned(engines):
+    primary, _ = engines
+    pool = primary['app'].pool
+    with sessions.task_scope():
+        sessions.app_session()
+        assert pool.checkedout() == 1
+    assert pool.checkedout() == 0
+
+
+def test_session_requires_scope(engines):
+    with pytest.raises(RuntimeError):
+        sessions.app_session()
@@ -0,0 +1,90 @@
+"""
+HaroonNet ISP Platform - Task Helper Unit Tests
+Tests for the module-level helpers the billing, report and quota tasks call
+"""
+
+from datetime import date
+from decimal import Decimal
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('celery')
+
+from app.tasks import billing, notifications, radius, reports
+
+
+class RecordingSession:
+    def __init__(self):
+        self.saved = []
+        self.commits = 0
+
+    def execute(self, query, params):
+        self.saved.append(params)
+        return type('Result', (), {'lastrowid': 42, 'fetchone': lambda self: type('Row', (), {'next_num': 7})})()
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_quota_notifications_format_bytes():
+    assert radius._format_bytes(None) == '0 B'
+    assert radius._format_bytes(1536) == '1.5 KB'
+    assert radius._format_bytes(50 * 1024 ** 3) == '50.0 GB'
+
+
+def test_monthly_key_metrics_tolerate_empty_sums():
+    metrics = reports._calculate_key_metrics({
+        'customer_metrics': {'active_customers': 10},
+        'financial_summary': {'total_collected': None, 'total_invoiced': None},
+        'usage_statistics': {'active_users': 4, 'total_data_usage': Decimal(8 * 1024 ** 3)},
+        'network_summary': {'total_sessions': 0},
+    })
+
+    assert metrics == {'arpu': 0, 'collection_efficiency': 0, 'avg_data_usage_gb': 2, 'session_success_rate': 0}
+
+
+def test_reports_are_saved_without_a_task_instance():
+    db = RecordingSession()
+
+    assert reports._save_report(db, 'daily', None, {'usage': {'total_octets': Decimal(5)}}) == 42
+    assert db.commits == 1
+    assert db.saved[0][0] == 'daily'
+
+
+def test_invoices_are_created_without_a_task_instance():
+    db = RecordingSession()
+    subscription = type('Subscription', (), {'id': 3, 'customer_id': 9, 'monthly_fee': Decimal('25.00'),
+                                             'plan_name': 'Home 50'})
+    billing_month = date(2024, 6, 1)
+
+    assert billing._create_invoice(db, subscription, billing_month, date(2024, 7, 1)) == 42
+    invoice, item = db.saved[1], db.saved[2]
+    assert invoice[0].endswith('-0007') and invoice[1] == 9
+    assert item[:2] == (42, 3) and item[6:8] == (billing_month, date(2024, 6, 30))
+
+
+def test_sms_templates_render_without_a_task_instance():
+    message = notifications._get_default_sms_template('quota_warning', {'percentage': 80, 'plan_name': 'Home 50'})
+
+    assert message.startswith('Data usage warning: 80% used. Plan: Home 50.')
+
+
+def test_quota_actions_are_sent_once_per_quota_month(redis_client, monkeypatch):
+    from app import accounting
+
+    sent = []
+    monkeypatch.setattr(accounting, '_redis_client', redis_client)
+    monkeypatch.setattr(radius, 'notify', lambda db, channel, recipient, template, context: sent.append(template))
+    monkeypatch.setattr(radius.send_coa_rate_limit, 'delay', lambda username, rate: sent.append(f'coa {rate}'))
+    plan = {'plan_name': 'Home 50', 'fup_limit': 1, 'fup_speed_down': 2, 'fup_speed_up': 1,
+            'email': 'user@example.com', 'first_name': 'User', 'monthly_quota': 100}
+    warned = type('Subscription', (), {**plan, 'id': 1, 'username': 'user1', 'used_quota': 85, 'fup_enabled': True})
+    throttled = type('Subscription', (), {**plan, 'id': 2, 'username': 'user2', 'used_quota': 120, 'fup_enabled': True})
+
+    first = radius._enforce_quotas(RecordingSession(), [warned, throttled])
+    # The half-hourly scan and a crossing from the next accounting batch find them again
+    again = radius._enforce_quotas(RecordingSession(), [warned, throttled])
+
+    assert first == {'quota_warnings': 1, 'quota_exceeded': 1, 'fup_applied': 1}
+    assert again == {'quota_warnings': 0, 'quota_exceeded': 1, 'fup_applied': 0}
+    assert sent == ['quota_warning', 'coa 2M/1M', 'fup_applied']
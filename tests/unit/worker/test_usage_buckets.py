@@ -0,0 +1,62 @@
+"""
+HaroonNet ISP Platform - Hourly Usage Bucket Unit Tests
+Tests for hour numbering and the hourly to daily rollup
+"""
+
+import sqlite3
+from datetime import date, datetime
+import pytest
+
+pytest.importorskip('pydantic_settings')
+
+from app.usage_buckets import day_hours, hour_number, hour_start, rollup_daily
+
+
+def test_hour_numbers_round_trip_and_bound_days():
+    assert hour_number(datetime(1970, 1, 2, 1, 59)) == 25
+    assert hour_start(hour_number(datetime(2024, 6, 1, 13, 45))) == datetime(2024, 6, 1, 13)
+
+    first, end = day_hours(date(2024, 6, 1))
+    assert hour_start(first) == datetime(2024, 6, 1)
+    assert hour_start(end) == datetime(2024, 6, 2)
+
+
+def test_daily_rows_are_rolled_up_from_the_days_hours():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+    CREATE TABLE subscriptions (id INTEGER PRIMARY KEY, customer_id INTEGER);
+    CREATE TABLE usage_hourly (hour INTEGER, subscription_id INTEGER, input_octets INTEGER,
+                               output_octets INTEGER, session_time INTEGER, session_count INTEGER,
+                               PRIMARY KEY (hour, subscription_id));
+    CREATE TABLE usage_aggregates (customer_id INTEGER, subscription_id INTEGER, date TEXT,
+                                   input_octets INTEGER, output_octets INTEGER, total_octets INTEGER,
+                                   session_time INTEGER, session_count INTEGER, created_at TEXT,
+                                   UNIQUE (subscription_id, date));
+    INSERT INTO subscriptions VALUES (1, 10), (2, 20);
+    """)
+    first, end = day_hours(date(2024, 6, 1))
+    conn.executemany('INSERT INTO usage_hourly VALUES (?, ?, ?, ?, ?, ?)', [
+        (first - 1, 1, 999, 999, 999, 9),  # The day before
+        (first, 1, 100, 1000, 3600, 0),
+        (first + 20, 1, 50, 500, 1800, 1),
+        (first + 20, 2, 7, 70, 60, 1),
+        (end, 2, 999, 999, 999, 9),  # The day after
+    ])
+
+    class Session:
+        """Runs the rollup in SQLite's upsert dialect"""
+
+        def execute(self, query, params):
+            query = query.replace('%s', '?').replace('ON DUPLICATE KEY UPDATE',
+                                                     'ON CONFLICT (subscription_id, date) DO UPDATE SET')
+            for column in ('input_octets', 'output_octets', 'total_octets', 'session_time', 'session_count'):
+                query = query.replace(f'VALUES({column})', f'excluded.{column}')
+            return conn.execute(query, [str(param) if isinstance(param, (date, datetime)) else param
+                                        for param in params])
+
+    rollup_daily(Session(), date(2024, 6, 1))
+    rollup_daily(Session(), date(2024, 6, 1))  # Replaces, never adds twice
+
+    rows = conn.execute('SELECT customer_id, subscription_id, date, input_octets, output_octets, total_octets, '
+                        'session_time, session_count FROM usage_aggregates ORDER BY subscription_id').fetchall()
+    assert rows == [(10, 1, '2024-06-01', 150, 1500, 1650, 5400, 1), (20, 2, '2024-06-01', 7, 70, 77, 60, 1)]
@@ -0,0 +1,54 @@
+"""
+HaroonNet ISP Platform - Worker Warmup Unit Tests
+Tests for queue-aware warmup and lazy imports
+"""
+
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('celery')
+
+from app import warmup
+
+
+def test_warm_runs_only_the_queue_warmers(monkeypatch):
+    calls = []
+    monkeypatch.setattr(warmup, 'QUEUE_WARMERS', {
+        'radius': [lambda: calls.append('radius')],
+        'reports': [lambda: calls.append('reports')],
+    })
+
+    timings = warmup.warm(['radius'], pools=False)
+
+    assert calls == ['radius']
+    assert len(timings) == 1
+
+
+def test_failing_warmer_does_not_raise(monkeypatch):
+    def broken():
+        raise ConnectionError('database unavailable')
+
+    monkeypatch.setattr(warmup, 'QUEUE_WARMERS', {'notifications': [broken]})
+
+    assert 'broken' in warmup.warm(['notifications'], pools=False)
+
+
+def test_consumed_queues_defaults_to_routed_queues():
+    from app.celery import celery
+
+    assert {'billing', 'radius', 'reports', 'system', 'notifications'} <= set(warmup.consumed_queues(celery))
+
+
+def test_task_modules_do_not_import_heavy_clients():
+    code = (
+        "import sys; from app.celery import celery; import importlib; "
+        "[importlib.import_module(m) for m in celery.conf.include]; "
+        "print(','.join(m for m in ('pyrad', 'twilio', 'jinja2', 'psutil', 'numpy', 'pandas') if m in sys.modules))"
+    )
+    worker_dir = warmup.__file__.rsplit('/app/', 1)[0]
+    output = subprocess.run([sys.executable, '-c', code], cwd=worker_dir,
+                            capture_output=True, text=True, check=True).stdout
+
+    assert output.strip() == ''
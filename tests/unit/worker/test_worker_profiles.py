@@ -0,0 +1,69 @@
+"""
+HaroonNet ISP Platform - Worker Profile Unit Tests
+Tests for per-queue pool, prefetch and acknowledgement settings
+"""
+
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip('pydantic_settings')
+pytest.importorskip('celery')
+
+from app import worker_profiles
+
+
+def test_profiles_cover_every_routed_queue():
+    from app.celery import celery
+
+    routed = {route['queue'] for route in celery.conf.task_routes.values()}
+    consumed = [queue for profile in worker_profiles.worker_profiles().values() for queue in profile.queues]
+
+    assert routed | {'default'} == set(consumed)
+    assert len(consumed) == len(set(consumed))
+
+
+def test_io_profile_uses_concurrent_pool_and_larger_db_pools():
+    profile = worker_profiles.worker_profiles()['io']
+
+    assert profile.pool in ('threads', 'gevent')
+    assert profile.concurrency >= 50
+    # Every thread can hold an app and a radius connection at once
+    for prefix in ('DB', 'RADIUS_DB'):
+        assert int(profile.env[f'{prefix}_POOL_SIZE']) + int(profile.env[f'{prefix}_MAX_OVERFLOW']) \
+            >= profile.concurrency
+    assert ['-Q', 'notifications,radius'] == profile.argv()[1:3]
+
+
+def test_unknown_profile_rejected(monkeypatch):
+    monkeypatch.setenv(worker_profiles.PROFILE_ENV, 'gpu')
+
+    with pytest.raises(ValueError):
+        worker_profiles.active_profile()
+
+
+def test_profile_applied_to_celery_conf():
+    code = (
+        "from app.celery import celery; c = celery.conf; "
+        "print(c.worker_pool, c.worker_concurrency, c.worker_prefetch_multiplier, c.task_acks_late)"
+    )
+    worker_dir = worker_profiles.__file__.rsplit('/app/', 1)[0]
+    output = subprocess.run([sys.executable, '-c', code], cwd=worker_dir, capture_output=True, text=True,
+                            check=True, env=dict(os.environ, WORKER_PROFILE='system')).stdout
+
+    assert output.split() == ['prefork', '2', '1', 'False']
+
+
+def test_profile_pool_sizes_reach_the_engines():
+    code = (
+        "from app import worker_profiles as w; w.apply_profile_env(w.worker_profiles()['io']); "
+        "from app.database import app_engine as a, radius_engine as r; "
+        "print(a.pool.size(), a.pool._max_overflow, r.pool.size(), r.pool._max_overflow)"
+    )
+    worker_dir = worker_profiles.__file__.rsplit('/app/', 1)[0]
+    env = {key: value for key, value in os.environ.items() if 'POOL_SIZE' not in key and 'OVERFLOW' not in key}
+    output = subprocess.run([sys.executable, '-c', code], cwd=worker_dir, capture_output=True, text=True,
+                            check=True, env=dict(env, WORKER_IO_CONCURRENCY='100')).stdout
+
+    assert output.split() == ['25', '75', '25', '75']